@@ -6,6 +6,8 @@ CONN_ID="${CONN_ID:-pg-docker}"
 SCHEMA="${SCHEMA:-reap}"
 LANDING_TABLE="${LANDING_TABLE:-properties_landing}"
 CLEAN_TABLE="${CLEAN_TABLE:-properties_clean}"
+STATS_TABLE="${STATS_TABLE:-market_daily_stats}"
+LANDING_RETENTION_MONTHS="${LANDING_RETENTION_MONTHS:-24}"
 
 set_variable () {
     var_name="$1"
@@ -18,3 +20,5 @@ set_variable "reap_web_scraper.rdbms.connection_id" "$CONN_ID"
 set_variable "reap_web_scraper.rdbms.schema" "$SCHEMA"
 set_variable "reap_web_scraper.rdbms.landing_table" "$LANDING_TABLE"
 set_variable "reap_web_scraper.rdbms.clean_table" "$CLEAN_TABLE"
+set_variable "reap_web_scraper.rdbms.stats_table" "$STATS_TABLE"
+set_variable "reap_web_scraper.rdbms.landing_retention_months" "$LANDING_RETENTION_MONTHS"
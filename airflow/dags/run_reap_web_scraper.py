@@ -23,15 +23,22 @@ with DAG(
     schema = Variable.get("reap_web_scraper.rdbms.schema")
     landing_table = Variable.get("reap_web_scraper.rdbms.landing_table")
     clean_table = Variable.get("reap_web_scraper.rdbms.clean_table")
+    stats_table = Variable.get("reap_web_scraper.rdbms.stats_table", default_var="market_daily_stats")
+    landing_retention_months = int(Variable.get("reap_web_scraper.rdbms.landing_retention_months", default_var=24))
 
     
+    # Retries reuse the batch of the failed attempt through the crawl journal, keyed by the run ID
     scrape_data = BashOperator(
         task_id="scrape_data",
+        retries=2,
+        retry_delay=pendulum.duration(minutes=5),
         bash_command=(
             "docker run --rm " +
             "--name reap-web-scraper " +
             "-v reap-data:/web-scraper/data " +
-            "reap-web-scraper-image python ./web_scraper.py  "
+            "reap-web-scraper-image python ./web_scraper.py " +
+            "--incremental " +
+            "--run-key '{{ run_id }}'"
         )
     )
 
@@ -53,10 +60,28 @@ with DAG(
         )
     )
 
+    # Only the extraction dates queued by the landing triggers since the last run are rebuilt
     refresh_clean_table = SQLExecuteQueryOperator(
         task_id="refresh_clean_table",
         conn_id=conn_id,
-        sql=f"REFRESH MATERIALIZED VIEW {schema}.{clean_table};",
+        sql=f"SELECT {schema}.refresh_{clean_table}();",
     )
 
-    scrape_data >> load_to_db >> refresh_clean_table
+    # The rollup rebuilds the dates whose clean rows were replaced by the previous task
+    refresh_market_stats = SQLExecuteQueryOperator(
+        task_id="refresh_market_stats",
+        conn_id=conn_id,
+        sql=f"SELECT {schema}.refresh_{stats_table}();",
+    )
+
+    # Landing partitions past the retention are detached, not dropped, so they can be archived first
+    detach_old_partitions = SQLExecuteQueryOperator(
+        task_id="detach_old_partitions",
+        conn_id=conn_id,
+        sql=(
+            f"SELECT {schema}.detach_{landing_table}_partitions("
+            f"(CURRENT_DATE - INTERVAL '{landing_retention_months} months')::DATE);"
+        ),
+    )
+
+    scrape_data >> load_to_db >> refresh_clean_table >> refresh_market_stats >> detach_old_partitions
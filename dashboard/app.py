@@ -1,7 +1,6 @@
 import os
 import streamlit as st
 import pandas as pd
-import psycopg2
 import numpy as np
 import matplotlib.pyplot as plt
 from jinja2 import Template
@@ -10,11 +9,25 @@ from utils.queries import (
     GET_CITIES_TEMPLATE,
     GET_DISTRICTS_TEMPLATE,
     GET_PRICE_TYPES_TEMPLATE,
-    GET_FILTERED_PROPERTIES_TEMPLATE
+    GET_FILTERED_PROPERTIES_TEMPLATE,
+    GET_MARKET_STATS_TEMPLATE
 )
+from utils.db import ConnectionPool
 from typing import Optional, Dict
 
 
+@st.cache_resource
+def get_connection_pool(
+    host: str, port: str, dbname: str, user: str, password: str, minconn: int, maxconn: int
+) -> ConnectionPool:
+    """
+    Returns the connection pool shared by every session of the dashboard, created on first use.
+    """
+    return ConnectionPool(
+        minconn=minconn, maxconn=maxconn, host=host, port=port, dbname=dbname, user=user, password=password, connect_timeout=5
+    )
+
+
 def main() -> None:
     """
     Main function to run the Streamlit dashboard for real estate data visualization.
@@ -36,8 +49,11 @@ def main() -> None:
     DB_SCHEMA: str = os.getenv("DB_SCHEMA", "reap")
     DB_LANDING_TABLE: str = os.getenv("DB_LANDING_TABLE", "properties_landing")
     DB_CLEAN_TABLE: str = os.getenv("DB_CLEAN_TABLE", "properties_clean")
+    DB_STATS_TABLE: str = os.getenv("DB_STATS_TABLE", "market_daily_stats")
     DB_LANDING_DIM: str = os.getenv("DB_LANDING_DIM", "locations_landing")
     DB_CLEAN_DIM: str = os.getenv("DB_CLEAN_DIM", "locations_clean")
+    DB_POOL_MIN_CONNECTIONS: int = int(os.getenv("DB_POOL_MIN_CONNECTIONS", "2"))
+    DB_POOL_MAX_CONNECTIONS: int = int(os.getenv("DB_POOL_MAX_CONNECTIONS", "10"))
 
     @st.cache_data
     def fetch_data(query: str, params: Optional[list] = None) -> pd.DataFrame:
@@ -52,16 +68,13 @@ def main() -> None:
             pd.DataFrame: The resulting data as a Pandas DataFrame.
         """
         try:
-            conn = psycopg2.connect(
-                host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
+            pool = get_connection_pool(
+                DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_POOL_MIN_CONNECTIONS, DB_POOL_MAX_CONNECTIONS
             )
-            df = pd.read_sql_query(query, conn, params=params)
+            return pool.run(lambda conn: pd.read_sql_query(query, conn, params=params))
         except Exception as e:
             st.error(f"Error fetching data: {e}")
             return pd.DataFrame()
-        finally:
-            conn.close()
-        return df
 
     # Render queries dynamically using Jinja2 templates
     def render_query(template: Template, context: Dict[str, str]) -> str:
@@ -123,17 +136,23 @@ def main() -> None:
     # Handle case where no data is returned
     if data.empty:
         st.warning("No data available for the selected date.")
-        data_filtered_for_table = pd.DataFrame(columns=[
-            "size_range", "region", "city", "district", "price_per_size", "total_size", "covered_size"
-        ])
-    else:
-        data_filtered_for_table = data
+
+    # The KPIs and the histogram read the pre-aggregated row of the selected market and day
+    stats_query = render_query(GET_MARKET_STATS_TEMPLATE, {"schema": DB_SCHEMA, "table": DB_STATS_TABLE})
+    stats = fetch_data(
+        stats_query, params=[region_filter, city_filter, district_filter, price_type_filter, day_filter]
+    )
+    stats = stats.iloc[0] if not stats.empty else None
 
     # Calculate KPIs
-    avg_price_per_size = f"{data['price_per_size'].mean():.2f}"
-    var_price_per_size = f"{data['price_per_size'].var():.2f}"
-    max_price_per_size = f"{data['price_per_size'].max():.2f}"
-    min_price_per_size = f"{data['price_per_size'].min():.2f}"
+    def format_stat(name: str) -> str:
+        value = stats[name] if stats is not None else None
+        return f"{float(value):.2f}" if value is not None and not pd.isna(value) else f"{np.nan:.2f}"
+
+    avg_price_per_size = format_stat("mean")
+    var_price_per_size = format_stat("variance")
+    max_price_per_size = format_stat("max")
+    min_price_per_size = format_stat("min")
 
     # KPIs
     st.title("Real Estate Marketplace Dashboard")
@@ -182,12 +201,14 @@ def main() -> None:
     with col2:
         st.write("Histogram: Price per Squared Meter (PEN/m²)")
 
-        if data_filtered_for_table.empty or data_filtered_for_table["price_per_size"].dropna().empty:
+        if stats is None or not stats["listings"]:
             st.warning("No data available to display the histogram.")
         else:
+            counts = stats["histogram_counts"]
+            edges = np.linspace(float(stats["histogram_lower"]), float(stats["histogram_upper"]), len(counts) + 1)
             plt.style.use('dark_background')
             fig, ax = plt.subplots(figsize=(8, 6))
-            ax.hist(data_filtered_for_table["price_per_size"], bins=20, color="dodgerblue", edgecolor="black", alpha=0.8)
+            ax.bar(edges[:-1], counts, width=np.diff(edges), align="edge", color="dodgerblue", edgecolor="black", alpha=0.8)
             ax.set_xlabel("Price per Squared Meter (PEN/m²)")
             ax.set_ylabel("Frequency")
             ax.set_title("Distribution of Price per Squared Meter")
@@ -10,8 +10,11 @@ def main():
     os.environ["DB_SCHEMA"] = os.getenv("DB_SCHEMA", "reap")
     os.environ["DB_LANDING_TABLE"] = os.getenv("DB_LANDING_TABLE", "properties_landing")
     os.environ["DB_CLEAN_TABLE"] = os.getenv("DB_CLEAN_TABLE", "properties_clean")
+    os.environ["DB_STATS_TABLE"] = os.getenv("DB_STATS_TABLE", "market_daily_stats")
     os.environ["DB_LANDING_DIM"] = os.getenv("DB_LANDING_DIM", "locations_landing")
     os.environ["DB_CLEAN_DIM"] = os.getenv("DB_CLEAN_DIM", "locations_clean")
+    os.environ["DB_POOL_MIN_CONNECTIONS"] = os.getenv("DB_POOL_MIN_CONNECTIONS", "2")
+    os.environ["DB_POOL_MAX_CONNECTIONS"] = os.getenv("DB_POOL_MAX_CONNECTIONS", "10")
 
     subprocess.run(["streamlit", "run", "app.py"])
 
@@ -0,0 +1,124 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import psycopg2
+
+
+class ConnectionPool:
+    """
+    A pool of database connections shared by every session and rerun of the dashboard.
+
+    Connections are checked out for one query at a time and returned warm, so a rerun does not pay
+    a TCP and authentication handshake per query. `minconn` connections are opened up front, more
+    are opened under load, and every connection returned is kept open for reuse, up to `maxconn`.
+    When all `maxconn` connections are in use, callers wait for one to be returned instead of failing.
+    A connection idle for longer than `health_check_interval` is pinged before it is reused, and a
+    connection found broken is discarded and replaced.
+    """
+    def __init__(self, minconn: int = 2, maxconn: int = 10, health_check_interval: float = 30.0, **connect_kwargs: Any):
+        """
+        Initializes the ConnectionPool.
+
+        Args:
+            minconn (int, optional): Number of connections opened up front. Defaults to 2.
+            maxconn (int, optional): Maximum number of open connections. Defaults to 10.
+            health_check_interval (float, optional): Seconds of idleness after which a connection is
+                pinged before reuse. Defaults to 30.0.
+            **connect_kwargs (Any): Arguments of `psycopg2.connect`.
+        """
+        self._connect_kwargs = connect_kwargs
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._health_check_interval = health_check_interval
+        # Guards the idle connections and their last use, shared by the threads of every session
+        self._lock = threading.Lock()
+        self._idle: List['psycopg2.extensions.connection'] = []
+        self._last_used: Dict[int, float] = {}
+        for _ in range(min(minconn, maxconn)):
+            self._putconn(psycopg2.connect(**connect_kwargs))
+
+    def _is_healthy(self, conn: 'psycopg2.extensions.connection') -> bool:
+        if conn.closed:
+            return False
+        with self._lock:
+            last_used = self._last_used.get(id(conn), 0.0)
+        if time.monotonic() - last_used < self._health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn: 'psycopg2.extensions.connection') -> None:
+        with self._lock:
+            self._last_used.pop(id(conn), None)
+        conn.close()
+
+    def _putconn(self, conn: 'psycopg2.extensions.connection') -> None:
+        if conn.closed:
+            self._discard(conn)
+            return
+        with self._lock:
+            self._last_used[id(conn)] = time.monotonic()
+            self._idle.append(conn)
+
+    def _getconn(self) -> 'psycopg2.extensions.connection':
+        # The most recently used connection is the least likely to have gone stale
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = psycopg2.connect(**self._connect_kwargs)
+        if not conn.closed and not conn.autocommit:
+            # Queries are read-only; autocommit keeps pooled connections from idling in a transaction
+            conn.autocommit = True
+        return conn
+
+    def _discard_idle(self) -> None:
+        """
+        Closes every idle connection, e.g. once a broken connection suggests a database restart.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def _checkout(self) -> 'psycopg2.extensions.connection':
+        conn = self._getconn()
+        while not self._is_healthy(conn):
+            # Ends with a fresh connection at the latest, or with the error of connecting
+            self._discard(conn)
+            conn = self._getconn()
+        return conn
+
+    def run(self, fn: Callable[['psycopg2.extensions.connection'], Any]) -> Any:
+        """
+        Calls `fn` with a pooled connection and returns its result.
+
+        If the connection turns out to be broken (e.g. after a database restart), it is replaced and
+        `fn` is retried once on a fresh connection.
+
+        Args:
+            fn (Callable[[psycopg2.extensions.connection], Any]): The function running the query.
+
+        Returns:
+            Any: The value returned by `fn`.
+        """
+        with self._slots:
+            for attempt in range(2):
+                conn = self._checkout()
+                try:
+                    result = fn(conn)
+                except Exception:
+                    if conn.closed:
+                        self._discard(conn)
+                        # A restart breaks the idle connections too, so the retry opens a fresh one
+                        self._discard_idle()
+                        if attempt == 0:
+                            continue
+                    else:
+                        self._putconn(conn)
+                    raise
+                self._putconn(conn)
+                return result
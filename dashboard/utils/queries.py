@@ -47,3 +47,19 @@ AND COALESCE(NULLIF(total_size, 0), covered_size) >= 10
 AND COALESCE(NULLIF(total_size, 0), covered_size) <= 200
 AND {{ filters }}
 """)
+
+GET_MARKET_STATS_TEMPLATE = Template("""
+SELECT
+    listings,
+    price_per_size_sum / listings AS mean,
+    CASE WHEN listings > 1
+        THEN (price_per_size_sum_squares - price_per_size_sum * price_per_size_sum / listings) / (listings - 1)
+    END AS variance,
+    price_per_size_min AS min,
+    price_per_size_max AS max,
+    histogram_lower,
+    histogram_upper,
+    histogram_counts
+FROM {{ schema }}.{{ table }}
+WHERE region = %s AND city = %s AND district = %s AND price_type = %s AND date = %s
+""")
@@ -10,6 +10,9 @@ export LANDING_TABLE="${LANDING_TABLE:-properties_landing}"
 export CLEAN_TABLE="${CLEAN_TABLE:-properties_clean}"
 export LANDING_DIM="${LANDING_DIM:-locations_landing}"
 export CLEAN_DIM="${CLEAN_DIM:-locations_clean}"
+export RAW_TABLE="${RAW_TABLE:-properties_raw}"
+export PARTITION_MONTHS_AHEAD="${PARTITION_MONTHS_AHEAD:-2}"
+export STATS_TABLE="${STATS_TABLE:-market_daily_stats}"
 
 for file in sql/*.sql; do
   [[ -e "$file" ]] || { echo "No .sql files found"; exit 0; }
@@ -34,8 +37,14 @@ docker exec -i "$CONTAINER_NAME" psql -p "$PORT" -U "$DB_USER" -d "$DB" -c  \
 
 echo "Downloading and inserting locations dim table"
 
-wget -O "locations_raw.csv" \
-  "https://raw.githubusercontent.com/jmcastagnetto/ubigeo-peru-aumentado/refs/heads/main/ubigeo_distrito.csv"
+# Reuse the copy cached by the scraper when there is one
+LOCATIONS_CSV="${LOCATIONS_CSV:-../web-scraper/data/locations/ubigeo_distrito.csv}"
+if [[ -f "$LOCATIONS_CSV" ]]; then
+  cp "$LOCATIONS_CSV" "locations_raw.csv"
+else
+  wget -O "locations_raw.csv" \
+    "https://raw.githubusercontent.com/jmcastagnetto/ubigeo-peru-aumentado/refs/heads/main/ubigeo_distrito.csv"
+fi
 (head -n1 "locations_raw.csv" && awk -F',' '$1 != "NA" && $2 != "NA"' "locations_raw.csv" | tail -n +2) > filtered_locations.csv
 
 docker cp filtered_locations.csv "$CONTAINER_NAME":/tmp/filtered_locations.csv
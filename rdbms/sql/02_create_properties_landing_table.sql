@@ -1,3 +1,24 @@
+-- An existing unpartitioned landing table is moved aside, and its rows are copied into the partitions below
+DO $$
+BEGIN
+	IF EXISTS (
+		SELECT 1 FROM pg_class c
+		INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+		WHERE n.nspname = '${SCHEMA}' AND c.relname = '${LANDING_TABLE}' AND c.relkind = 'r'
+	) THEN
+		-- The materialized view of older installs depends on the landing table; 03 rebuilds it as a table
+		IF EXISTS (
+			SELECT 1 FROM pg_matviews
+			WHERE schemaname = '${SCHEMA}' AND matviewname = '${CLEAN_TABLE}'
+		) THEN
+			DROP MATERIALIZED VIEW ${SCHEMA}.${CLEAN_TABLE};
+		END IF;
+		ALTER TABLE ${SCHEMA}.${LANDING_TABLE} RENAME TO ${LANDING_TABLE}_unpartitioned;
+		ALTER INDEX ${SCHEMA}.${LANDING_TABLE}_pkey RENAME TO ${LANDING_TABLE}_unpartitioned_pkey;
+		DROP INDEX IF EXISTS ${SCHEMA}.${LANDING_TABLE}_batch_extraction_start_idx;
+	END IF;
+END $$;
+
 CREATE TABLE IF NOT EXISTS ${SCHEMA}.${LANDING_TABLE} (
     batch_id UUID NOT NULL,
     batch_extraction_start TIMESTAMP NOT NULL,
@@ -22,5 +43,65 @@ CREATE TABLE IF NOT EXISTS ${SCHEMA}.${LANDING_TABLE} (
     link VARCHAR,
 	created_at TIMESTAMP  NOT NULL DEFAULT NOW(),
 	created_by VARCHAR NOT NULL DEFAULT CURRENT_USER,
-	PRIMARY KEY (batch_id, property_id)
-);
\ No newline at end of file
+	-- A unique key on a partitioned table must include the partition key
+	PRIMARY KEY (batch_id, property_id, batch_extraction_start)
+) PARTITION BY RANGE (batch_extraction_start);
+
+-- Indexes on the parent are created on every partition; the primary key serves lookups by batch_id
+CREATE INDEX IF NOT EXISTS ${LANDING_TABLE}_batch_extraction_start_idx ON ${SCHEMA}.${LANDING_TABLE} (batch_extraction_start);
+
+-- Creates the monthly partitions covering from_date to to_date, and returns how many were created
+CREATE OR REPLACE FUNCTION ${SCHEMA}.create_${LANDING_TABLE}_partitions(from_date DATE, to_date DATE) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+	partition_start DATE := date_trunc('month', from_date);
+	partition_name TEXT;
+	created INT := 0;
+BEGIN
+	WHILE partition_start <= to_date LOOP
+		partition_name := '${LANDING_TABLE}_p' || to_char(partition_start, 'YYYYMM');
+		IF to_regclass(format('%I.%I', '${SCHEMA}', partition_name)) IS NULL THEN
+			EXECUTE format(
+				'CREATE TABLE %I.%I PARTITION OF ${SCHEMA}.${LANDING_TABLE} FOR VALUES FROM (%L) TO (%L)',
+				'${SCHEMA}', partition_name, partition_start, (partition_start + INTERVAL '1 month')::DATE
+			);
+			created := created + 1;
+		END IF;
+		partition_start := (partition_start + INTERVAL '1 month')::DATE;
+	END LOOP;
+	RETURN created;
+END $$;
+
+-- Detaches the monthly partitions that end on or before the month of older_than, and returns their names.
+-- Detached partitions stay in the schema as plain tables, to be archived (e.g. with pg_dump) and dropped.
+CREATE OR REPLACE FUNCTION ${SCHEMA}.detach_${LANDING_TABLE}_partitions(older_than DATE) RETURNS SETOF TEXT
+LANGUAGE plpgsql AS $$
+DECLARE
+	partition_name TEXT;
+BEGIN
+	FOR partition_name IN
+		SELECT c.relname
+		FROM pg_inherits i
+		INNER JOIN pg_class c ON c.oid = i.inhrelid
+		WHERE i.inhparent = '${SCHEMA}.${LANDING_TABLE}'::regclass
+		AND c.relname ~ '^${LANDING_TABLE}_p[0-9]{6}$'
+		AND to_date(right(c.relname, 6), 'YYYYMM') < date_trunc('month', older_than)
+		ORDER BY c.relname
+	LOOP
+		EXECUTE format('ALTER TABLE ${SCHEMA}.${LANDING_TABLE} DETACH PARTITION %I.%I', '${SCHEMA}', partition_name);
+		RETURN NEXT partition_name;
+	END LOOP;
+END $$;
+
+SELECT ${SCHEMA}.create_${LANDING_TABLE}_partitions(CURRENT_DATE, (CURRENT_DATE + INTERVAL '${PARTITION_MONTHS_AHEAD} months')::DATE);
+
+DO $$
+BEGIN
+	IF to_regclass('${SCHEMA}.${LANDING_TABLE}_unpartitioned') IS NOT NULL THEN
+		PERFORM ${SCHEMA}.create_${LANDING_TABLE}_partitions(MIN(batch_extraction_start)::DATE, MAX(batch_extraction_start)::DATE)
+		FROM ${SCHEMA}.${LANDING_TABLE}_unpartitioned;
+
+		INSERT INTO ${SCHEMA}.${LANDING_TABLE} SELECT * FROM ${SCHEMA}.${LANDING_TABLE}_unpartitioned;
+		DROP TABLE ${SCHEMA}.${LANDING_TABLE}_unpartitioned;
+	END IF;
+END $$;
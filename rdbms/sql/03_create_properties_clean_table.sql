@@ -1,16 +1,107 @@
-CREATE MATERIALIZED VIEW IF NOT EXISTS ${SCHEMA}.${CLEAN_TABLE} AS
+-- properties_clean used to be a materialized view that recomputed all history on every refresh
+DO $$
+BEGIN
+	IF EXISTS (
+		SELECT 1 FROM pg_matviews
+		WHERE schemaname = '${SCHEMA}' AND matviewname = '${CLEAN_TABLE}'
+	) THEN
+		DROP MATERIALIZED VIEW ${SCHEMA}.${CLEAN_TABLE};
+	END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS ${SCHEMA}.${CLEAN_TABLE} (
+	date DATE NOT NULL,
+	property_id UUID NOT NULL,
+	property_type VARCHAR,
+	price_type VARCHAR,
+	price DECIMAL(19, 2),
+	additional_expense DECIMAL(19, 2),
+	address VARCHAR,
+	region VARCHAR,
+	city VARCHAR,
+	district VARCHAR,
+	total_size INT,
+	covered_size INT,
+	bedrooms INT,
+	bathrooms INT,
+	half_bathrooms INT,
+	parking_spaces INT,
+	age INT
+);
+
+-- Indexes are built CONCURRENTLY so that adding them to a populated table does not block the dashboard
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ${CLEAN_TABLE}_date_property_id_idx
+	ON ${SCHEMA}.${CLEAN_TABLE} (date, property_id);
+
+-- Matches the dashboard filters, and covers the columns it reads so they are served from the index
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ${CLEAN_TABLE}_filter_idx
+	ON ${SCHEMA}.${CLEAN_TABLE} (region, city, district, price_type, date)
+	INCLUDE (price, total_size, covered_size);
+
+DROP INDEX CONCURRENTLY IF EXISTS ${SCHEMA}.${CLEAN_TABLE}_date_idx;
+
+-- Extraction dates whose landing rows changed since the last refresh
+CREATE TABLE IF NOT EXISTS ${SCHEMA}.${CLEAN_TABLE}_pending (
+	date DATE PRIMARY KEY,
+	queued_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION ${SCHEMA}.queue_${CLEAN_TABLE}() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+	INSERT INTO ${SCHEMA}.${CLEAN_TABLE}_pending (date)
+	SELECT DISTINCT DATE(batch_extraction_start) FROM changed_rows
+	ON CONFLICT (date) DO NOTHING;
+
+	IF TG_OP = 'UPDATE' THEN
+		INSERT INTO ${SCHEMA}.${CLEAN_TABLE}_pending (date)
+		SELECT DISTINCT DATE(batch_extraction_start) FROM previous_rows
+		ON CONFLICT (date) DO NOTHING;
+	END IF;
+	RETURN NULL;
+END $$;
+
+-- Statement-level triggers see every row of a COPY or merge at once; transition tables allow one event per trigger
+DROP TRIGGER IF EXISTS queue_${CLEAN_TABLE}_insert ON ${SCHEMA}.${LANDING_TABLE};
+CREATE TRIGGER queue_${CLEAN_TABLE}_insert
+	AFTER INSERT ON ${SCHEMA}.${LANDING_TABLE}
+	REFERENCING NEW TABLE AS changed_rows
+	FOR EACH STATEMENT EXECUTE FUNCTION ${SCHEMA}.queue_${CLEAN_TABLE}();
+
+DROP TRIGGER IF EXISTS queue_${CLEAN_TABLE}_update ON ${SCHEMA}.${LANDING_TABLE};
+CREATE TRIGGER queue_${CLEAN_TABLE}_update
+	AFTER UPDATE ON ${SCHEMA}.${LANDING_TABLE}
+	REFERENCING OLD TABLE AS previous_rows NEW TABLE AS changed_rows
+	FOR EACH STATEMENT EXECUTE FUNCTION ${SCHEMA}.queue_${CLEAN_TABLE}();
+
+DROP TRIGGER IF EXISTS queue_${CLEAN_TABLE}_delete ON ${SCHEMA}.${LANDING_TABLE};
+CREATE TRIGGER queue_${CLEAN_TABLE}_delete
+	AFTER DELETE ON ${SCHEMA}.${LANDING_TABLE}
+	REFERENCING OLD TABLE AS changed_rows
+	FOR EACH STATEMENT EXECUTE FUNCTION ${SCHEMA}.queue_${CLEAN_TABLE}();
+
+-- Replaces the clean rows of the given extraction dates with the latest batch of each date.
+-- The delete and insert commit together, and neither blocks readers: they see the previous rows until the commit.
+CREATE OR REPLACE FUNCTION ${SCHEMA}.refresh_${CLEAN_TABLE}_dates(refresh_dates DATE[]) RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+	inserted BIGINT;
+BEGIN
+	DELETE FROM ${SCHEMA}.${CLEAN_TABLE} WHERE date = ANY(refresh_dates);
+
+	INSERT INTO ${SCHEMA}.${CLEAN_TABLE}
 	WITH latest_batches_per_day AS (
-		SELECT DISTINCT
-			DATE(batch_extraction_start) AS batch_extraction_date,
-			LAST_VALUE(batch_id) OVER (
-				PARTITION BY DATE(batch_extraction_start) 
-				ORDER BY batch_extraction_start ASC
-				ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
-				) AS latest_batch_id
-		FROM ${SCHEMA}.${LANDING_TABLE}
+		SELECT DISTINCT ON (d.date)
+			d.date AS batch_extraction_date,
+			l.batch_id AS latest_batch_id
+		FROM unnest(refresh_dates) AS d(date)
+		INNER JOIN ${SCHEMA}.${LANDING_TABLE} l
+			ON l.batch_extraction_start >= d.date
+			AND l.batch_extraction_start < d.date + 1
+		ORDER BY d.date, l.batch_extraction_start DESC
 	)
-	
-	SELECT 
+
+	SELECT
 		DATE(batch_extraction_start) AS date,
 		property_id,
 		property_type,
@@ -30,5 +121,43 @@ CREATE MATERIALIZED VIEW IF NOT EXISTS ${SCHEMA}.${CLEAN_TABLE} AS
 		age
 	FROM ${SCHEMA}.${LANDING_TABLE} a
 	INNER JOIN latest_batches_per_day b
-		ON DATE(a.batch_extraction_start) = b.batch_extraction_date
-		AND a.batch_id = b.latest_batch_id;
\ No newline at end of file
+		ON a.batch_id = b.latest_batch_id
+		AND DATE(a.batch_extraction_start) = b.batch_extraction_date;
+
+	GET DIAGNOSTICS inserted = ROW_COUNT;
+	RETURN inserted;
+END $$;
+
+-- Refreshes the dates queued by the landing triggers and returns how many were refreshed
+CREATE OR REPLACE FUNCTION ${SCHEMA}.refresh_${CLEAN_TABLE}() RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+	refresh_dates DATE[];
+BEGIN
+	-- Serializes refreshes; unlike REFRESH MATERIALIZED VIEW, this lock does not conflict with SELECTs
+	LOCK TABLE ${SCHEMA}.${CLEAN_TABLE} IN SHARE ROW EXCLUSIVE MODE;
+
+	WITH claimed AS (
+		DELETE FROM ${SCHEMA}.${CLEAN_TABLE}_pending RETURNING date
+	)
+	SELECT array_agg(date) INTO refresh_dates FROM claimed;
+
+	IF refresh_dates IS NULL THEN
+		RETURN 0;
+	END IF;
+
+	PERFORM ${SCHEMA}.refresh_${CLEAN_TABLE}_dates(refresh_dates);
+	RETURN cardinality(refresh_dates);
+END $$;
+
+-- A new clean table is built from all the history already landed
+DO $$
+BEGIN
+	IF NOT EXISTS (SELECT 1 FROM ${SCHEMA}.${CLEAN_TABLE}) THEN
+		INSERT INTO ${SCHEMA}.${CLEAN_TABLE}_pending (date)
+		SELECT DISTINCT DATE(batch_extraction_start) FROM ${SCHEMA}.${LANDING_TABLE}
+		ON CONFLICT (date) DO NOTHING;
+	END IF;
+END $$;
+
+SELECT ${SCHEMA}.refresh_${CLEAN_TABLE}();
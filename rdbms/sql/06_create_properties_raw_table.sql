@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS ${SCHEMA}.${RAW_TABLE} (
+    source_file VARCHAR NOT NULL,
+    item_number INT NOT NULL,
+    batch_id VARCHAR,
+    property_id VARCHAR,
+    payload JSONB NOT NULL,
+	created_at TIMESTAMP  NOT NULL DEFAULT NOW(),
+	created_by VARCHAR NOT NULL DEFAULT CURRENT_USER,
+	PRIMARY KEY (source_file, item_number)
+);
+
+CREATE INDEX IF NOT EXISTS ${RAW_TABLE}_batch_id_idx ON ${SCHEMA}.${RAW_TABLE} (batch_id);
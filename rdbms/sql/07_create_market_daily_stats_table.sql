@@ -0,0 +1,170 @@
+-- Daily price per m2 statistics of the listings shown by the dashboard, one row per market segment
+CREATE TABLE IF NOT EXISTS ${SCHEMA}.${STATS_TABLE} (
+	date DATE NOT NULL,
+	region VARCHAR NOT NULL,
+	city VARCHAR NOT NULL,
+	district VARCHAR NOT NULL,
+	price_type VARCHAR NOT NULL,
+	listings INT NOT NULL,
+	price_per_size_sum NUMERIC NOT NULL,
+	price_per_size_sum_squares NUMERIC NOT NULL,
+	price_per_size_min NUMERIC NOT NULL,
+	price_per_size_max NUMERIC NOT NULL,
+	price_per_size_p10 DOUBLE PRECISION,
+	price_per_size_p25 DOUBLE PRECISION,
+	price_per_size_p50 DOUBLE PRECISION,
+	price_per_size_p75 DOUBLE PRECISION,
+	price_per_size_p90 DOUBLE PRECISION,
+	-- Counts of equal-width buckets between histogram_lower and histogram_upper
+	histogram_lower NUMERIC NOT NULL,
+	histogram_upper NUMERIC NOT NULL,
+	histogram_counts INT[] NOT NULL,
+	refreshed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+	PRIMARY KEY (region, city, district, price_type, date)
+);
+
+-- Clean dates whose rows changed since the last rollup
+CREATE TABLE IF NOT EXISTS ${SCHEMA}.${STATS_TABLE}_pending (
+	date DATE PRIMARY KEY,
+	queued_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION ${SCHEMA}.queue_${STATS_TABLE}() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+	INSERT INTO ${SCHEMA}.${STATS_TABLE}_pending (date)
+	SELECT DISTINCT date FROM changed_rows
+	ON CONFLICT (date) DO NOTHING;
+	RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS queue_${STATS_TABLE}_insert ON ${SCHEMA}.${CLEAN_TABLE};
+CREATE TRIGGER queue_${STATS_TABLE}_insert
+	AFTER INSERT ON ${SCHEMA}.${CLEAN_TABLE}
+	REFERENCING NEW TABLE AS changed_rows
+	FOR EACH STATEMENT EXECUTE FUNCTION ${SCHEMA}.queue_${STATS_TABLE}();
+
+DROP TRIGGER IF EXISTS queue_${STATS_TABLE}_delete ON ${SCHEMA}.${CLEAN_TABLE};
+CREATE TRIGGER queue_${STATS_TABLE}_delete
+	AFTER DELETE ON ${SCHEMA}.${CLEAN_TABLE}
+	REFERENCING OLD TABLE AS changed_rows
+	FOR EACH STATEMENT EXECUTE FUNCTION ${SCHEMA}.queue_${STATS_TABLE}();
+
+-- Rebuilds the statistics of the given dates from the clean table, with the filters of the dashboard:
+-- sizes between 10 and 200 m2 and prices between 10 and 100 per m2, split in 20 histogram buckets
+CREATE OR REPLACE FUNCTION ${SCHEMA}.refresh_${STATS_TABLE}_dates(refresh_dates DATE[]) RETURNS BIGINT
+LANGUAGE plpgsql AS $$
+DECLARE
+	histogram_lower CONSTANT NUMERIC := 10;
+	histogram_upper CONSTANT NUMERIC := 100;
+	histogram_buckets CONSTANT INT := 20;
+	inserted BIGINT;
+BEGIN
+	DELETE FROM ${SCHEMA}.${STATS_TABLE} WHERE date = ANY(refresh_dates);
+
+	INSERT INTO ${SCHEMA}.${STATS_TABLE} (
+		date, region, city, district, price_type, listings,
+		price_per_size_sum, price_per_size_sum_squares, price_per_size_min, price_per_size_max,
+		price_per_size_p10, price_per_size_p25, price_per_size_p50, price_per_size_p75, price_per_size_p90,
+		histogram_lower, histogram_upper, histogram_counts
+	)
+	WITH listings AS (
+		SELECT
+			date,
+			region,
+			city,
+			district,
+			price_type,
+			price / COALESCE(NULLIF(total_size, 0), covered_size) AS price_per_size
+		FROM ${SCHEMA}.${CLEAN_TABLE}
+		WHERE date = ANY(refresh_dates)
+		AND region IS NOT NULL AND city IS NOT NULL AND district IS NOT NULL AND price_type IS NOT NULL
+		AND COALESCE(NULLIF(total_size, 0), covered_size) >= 10
+		AND COALESCE(NULLIF(total_size, 0), covered_size) <= 200
+	),
+
+	filtered AS (
+		SELECT * FROM listings
+		WHERE price_per_size > histogram_lower AND price_per_size < histogram_upper
+	),
+
+	buckets AS (
+		SELECT
+			date, region, city, district, price_type,
+			width_bucket(price_per_size, histogram_lower, histogram_upper, histogram_buckets) AS bucket,
+			count(*) AS listings
+		FROM filtered
+		GROUP BY 1, 2, 3, 4, 5, 6
+	),
+
+	histograms AS (
+		SELECT
+			s.date, s.region, s.city, s.district, s.price_type,
+			array_agg(COALESCE(b.listings, 0)::INT ORDER BY g.bucket) AS histogram_counts
+		FROM (SELECT DISTINCT date, region, city, district, price_type FROM buckets) s
+		CROSS JOIN generate_series(1, histogram_buckets) AS g(bucket)
+		LEFT JOIN buckets b
+			ON b.date = s.date AND b.region = s.region AND b.city = s.city
+			AND b.district = s.district AND b.price_type = s.price_type AND b.bucket = g.bucket
+		GROUP BY 1, 2, 3, 4, 5
+	),
+
+	stats AS (
+		SELECT
+			date, region, city, district, price_type,
+			count(*) AS listings,
+			sum(price_per_size) AS price_per_size_sum,
+			sum(price_per_size * price_per_size) AS price_per_size_sum_squares,
+			min(price_per_size) AS price_per_size_min,
+			max(price_per_size) AS price_per_size_max,
+			percentile_cont(ARRAY[0.1, 0.25, 0.5, 0.75, 0.9]) WITHIN GROUP (ORDER BY price_per_size) AS quantiles
+		FROM filtered
+		GROUP BY 1, 2, 3, 4, 5
+	)
+
+	SELECT
+		s.date, s.region, s.city, s.district, s.price_type, s.listings,
+		s.price_per_size_sum, s.price_per_size_sum_squares, s.price_per_size_min, s.price_per_size_max,
+		s.quantiles[1], s.quantiles[2], s.quantiles[3], s.quantiles[4], s.quantiles[5],
+		histogram_lower, histogram_upper, h.histogram_counts
+	FROM stats s
+	INNER JOIN histograms h
+		ON h.date = s.date AND h.region = s.region AND h.city = s.city
+		AND h.district = s.district AND h.price_type = s.price_type;
+
+	GET DIAGNOSTICS inserted = ROW_COUNT;
+	RETURN inserted;
+END $$;
+
+-- Rebuilds the dates queued by the clean table triggers and returns how many were rebuilt
+CREATE OR REPLACE FUNCTION ${SCHEMA}.refresh_${STATS_TABLE}() RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+	refresh_dates DATE[];
+BEGIN
+	LOCK TABLE ${SCHEMA}.${STATS_TABLE} IN SHARE ROW EXCLUSIVE MODE;
+
+	WITH claimed AS (
+		DELETE FROM ${SCHEMA}.${STATS_TABLE}_pending RETURNING date
+	)
+	SELECT array_agg(date) INTO refresh_dates FROM claimed;
+
+	IF refresh_dates IS NULL THEN
+		RETURN 0;
+	END IF;
+
+	PERFORM ${SCHEMA}.refresh_${STATS_TABLE}_dates(refresh_dates);
+	RETURN cardinality(refresh_dates);
+END $$;
+
+-- A new rollup is built from all the clean history
+DO $$
+BEGIN
+	IF NOT EXISTS (SELECT 1 FROM ${SCHEMA}.${STATS_TABLE}) THEN
+		INSERT INTO ${SCHEMA}.${STATS_TABLE}_pending (date)
+		SELECT DISTINCT date FROM ${SCHEMA}.${CLEAN_TABLE}
+		ON CONFLICT (date) DO NOTHING;
+	END IF;
+END $$;
+
+SELECT ${SCHEMA}.refresh_${STATS_TABLE}();
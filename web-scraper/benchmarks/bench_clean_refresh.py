@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parsers import get_commit, summarize
+from scraper.loader import connect_db
+from scraper.utils import CONFIG
+
+
+SQL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'rdbms', 'sql')
+
+# The scripts that create the schema, the partitioned landing table and the clean table
+SQL_FILES = ('01_create_schema.sql', '02_create_properties_landing_table.sql', '03_create_properties_clean_table.sql')
+
+DISTRICTS = ('MIRAFLORES', 'SAN ISIDRO', 'BARRANCO', 'SURCO', 'LA MOLINA', 'SAN BORJA', 'LINCE', 'JESUS MARIA')
+PRICE_TYPES = ('Venta', 'Alquiler')
+
+# The filtered query of the dashboard
+FILTER_QUERY = """
+SELECT region, city, district, price / COALESCE(NULLIF(total_size, 0), covered_size) AS price_per_size,
+    price, total_size, covered_size, price_type, date
+FROM {schema}.{clean_table}
+WHERE price / COALESCE(NULLIF(total_size, 0), covered_size) < 100
+AND price / COALESCE(NULLIF(total_size, 0), covered_size) > 10
+AND COALESCE(NULLIF(total_size, 0), covered_size) >= 10
+AND COALESCE(NULLIF(total_size, 0), covered_size) <= 200
+AND region = %s AND city = %s AND district = %s AND price_type = %s AND date = %s
+"""
+
+
+def render_sql(path: str, variables: Dict[str, str]) -> str:
+    """
+    Substitutes the `${VAR}` placeholders of a script like `init.sh` does with envsubst.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return re.sub(r'\$\{(\w+)\}', lambda match: variables.get(match.group(1), ''), f.read())
+
+
+def split_statements(sql: str) -> List[str]:
+    """
+    Splits a script into statements on the semicolons outside of dollar-quoted bodies and comments.
+    """
+    statements: List[str] = []
+    current: List[str] = []
+    in_body = False
+    for line in sql.splitlines():
+        if line.lstrip().startswith('--') and not in_body:
+            continue
+        current.append(line)
+        if line.count('$$') % 2:
+            in_body = not in_body
+        if not in_body and line.rstrip().endswith(';'):
+            statements.append('\n'.join(current))
+            current = []
+    if '\n'.join(current).strip():
+        statements.append('\n'.join(current))
+    return statements
+
+
+def timed(cur, query: str, params: Any = None) -> float:
+    start = time.perf_counter()
+    cur.execute(query, params)
+    if cur.description is not None:
+        cur.fetchall()
+    return time.perf_counter() - start
+
+
+def seed_batches(cur, schema: str, landing_table: str, first_day: str, last_day: str, rows_per_day: int) -> None:
+    """
+    Inserts one synthetic batch per day, extracted at 02:30 like the nightly run.
+    """
+    cur.execute(
+        f"SELECT {schema}.create_{landing_table}_partitions(%s::DATE, %s::DATE)",
+        (first_day, last_day)
+    )
+    cur.execute(
+        f"""
+        INSERT INTO {schema}.{landing_table} (
+            batch_id, batch_extraction_start, property_id, property_extraction_start, property_type, price_type,
+            price_pen, region, city, district, total_size, covered_size, bedrooms, bathrooms, link
+        )
+        SELECT
+            b.batch_id, b.batch_extraction_start, gen_random_uuid(), b.batch_extraction_start, 'Departamento',
+            (%s::TEXT[])[1 + i %% %s], 100000 + (i * 7919) %% 900000, 'LIMA', 'LIMA', (%s::TEXT[])[1 + i %% %s],
+            30 + i %% 170, 30 + i %% 160, 1 + i %% 4, 1 + i %% 3, 'https://example.com/' || i
+        FROM (
+            SELECT gen_random_uuid() AS batch_id, day::DATE + TIME '02:30' AS batch_extraction_start
+            FROM generate_series(%s::DATE, %s::DATE, INTERVAL '1 day') AS day
+        ) b
+        CROSS JOIN generate_series(1, %s) AS i
+        """,
+        (list(PRICE_TYPES), len(PRICE_TYPES), list(DISTRICTS), len(DISTRICTS), first_day, last_day, rows_per_day)
+    )
+
+
+def measure_reads_during(conn_factory, reader_query: Tuple[str, tuple], writer_query: str, readers_for: float) -> Dict[str, Any]:
+    """
+    Runs the dashboard query in a loop while another connection runs `writer_query` in an open transaction.
+
+    Returns:
+        Dict[str, Any]: The duration of the write and the latencies of the reads that overlapped it.
+    """
+    writer = conn_factory()
+    reader = conn_factory()
+    reader.autocommit = True
+    done = threading.Event()
+    write_seconds: List[float] = []
+
+    def write() -> None:
+        with writer, writer.cursor() as cur:
+            write_seconds.append(timed(cur, writer_query))
+            # Holds the transaction open, like a slow commit, while the reads go on
+            time.sleep(readers_for)
+        done.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    latencies: List[float] = []
+    with reader.cursor() as cur:
+        while not done.is_set():
+            latencies.append(timed(cur, *reader_query))
+    thread.join()
+    writer.close()
+    reader.close()
+    return {'write_seconds': round(write_seconds[0], 4), 'reads': len(latencies), 'read_latency': summarize(latencies)}
+
+
+def main() -> None:
+    """
+    Benchmarks the maintenance of the clean table on synthetic data in a scratch schema and prints the results as JSON.
+
+    The landing and clean tables are created from the `rdbms/sql` scripts and seeded with one batch per day.
+    The script compares a full rebuild of every date (what `REFRESH MATERIALIZED VIEW` used to do) with the
+    incremental refresh of one new batch. It also measures the latency of the dashboard query, and its plan,
+    while a refresh transaction is open.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the refresh of the clean table on synthetic data.')
+    parser.add_argument('--schema', default='reap_bench', help='Scratch schema, dropped and recreated (default: reap_bench)')
+    parser.add_argument('--days', type=int, default=90, help='Days of history to seed (default: 90)')
+    parser.add_argument('--rows-per-day', type=int, default=5000, help='Listings per daily batch (default: 5000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of every timed refresh (default: 3)')
+    parser.add_argument('--hold', type=float, default=1.0, help='Seconds a refresh transaction is held open while reading (default: 1.0)')
+    parser.add_argument('--keep', action='store_true', help='Keep the scratch schema afterwards')
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    args = parser.parse_args()
+
+    db_config = dict(CONFIG['db'])
+    schema = args.schema
+    landing_table = db_config['table']
+    clean_table = 'properties_clean'
+    variables = {
+        'SCHEMA': schema,
+        'LANDING_TABLE': landing_table,
+        'CLEAN_TABLE': clean_table,
+        'PARTITION_MONTHS_AHEAD': '2',
+    }
+
+    conn = connect_db(db_config)
+    conn.autocommit = True
+    cur = conn.cursor()
+    results: Dict[str, Any] = {}
+    try:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        for name in SQL_FILES:
+            # Each statement runs on its own, as in psql, so CREATE INDEX CONCURRENTLY is allowed
+            for statement in split_statements(render_sql(os.path.join(SQL_DIR, name), variables)):
+                cur.execute(statement)
+
+        cur.execute("SELECT CURRENT_DATE - %s, CURRENT_DATE - 1", (args.days,))
+        first_day, last_day = cur.fetchone()
+        start = time.perf_counter()
+        seed_batches(cur, schema, landing_table, first_day, last_day, args.rows_per_day)
+        results['seed_seconds'] = round(time.perf_counter() - start, 4)
+        results['initial_refresh_seconds'] = round(timed(cur, f"SELECT {schema}.refresh_{clean_table}()"), 4)
+        cur.execute(f"VACUUM ANALYZE {schema}.{landing_table}")
+        cur.execute(f"VACUUM ANALYZE {schema}.{clean_table}")
+
+        all_dates = f"SELECT {schema}.refresh_{clean_table}_dates(ARRAY(SELECT DISTINCT date FROM {schema}.{clean_table}))"
+        results['full_rebuild'] = summarize([timed(cur, all_dates) for _ in range(args.repeat)])
+
+        # A new nightly batch, loaded and refreshed like the DAG does
+        incremental: List[float] = []
+        loads: List[float] = []
+        for _ in range(args.repeat):
+            cur.execute(f"SELECT COALESCE(MAX(date), CURRENT_DATE) + 1 FROM {schema}.{clean_table}")
+            (day,) = cur.fetchone()
+            start = time.perf_counter()
+            seed_batches(cur, schema, landing_table, day, day, args.rows_per_day)
+            loads.append(time.perf_counter() - start)
+            incremental.append(timed(cur, f"SELECT {schema}.refresh_{clean_table}()"))
+        results['batch_load'] = summarize(loads)
+        results['incremental_refresh'] = summarize(incremental)
+
+        cur.execute(f"SELECT MAX(date) FROM {schema}.{clean_table}")
+        (day,) = cur.fetchone()
+        reader_query = (FILTER_QUERY.format(schema=schema, clean_table=clean_table), ('LIMA', 'LIMA', DISTRICTS[0], PRICE_TYPES[0], day))
+        cur.execute(f"EXPLAIN (FORMAT JSON) {reader_query[0]}", reader_query[1])
+        plan = cur.fetchone()[0][0]['Plan']
+        results['dashboard_query_plan'] = {'node': plan['Node Type'], 'index': plan.get('Index Name')}
+        results['dashboard_query_idle'] = summarize([timed(cur, *reader_query) for _ in range(50)])
+        results['dashboard_query_during_full_rebuild'] = measure_reads_during(
+            lambda: connect_db(db_config), reader_query, all_dates, args.hold
+        )
+    finally:
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.close()
+        conn.close()
+
+    output = {
+        'commit': get_commit(),
+        'days': args.days,
+        'rows_per_day': args.rows_per_day,
+        'results': results,
+    }
+    print(json.dumps(output, indent=2, default=str))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
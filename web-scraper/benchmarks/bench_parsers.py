@@ -0,0 +1,268 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser_parity import collect_pages, read_page
+from scraper.parser import SearchPageParser, make_property_parser, make_soup
+
+
+# Small synthetic pages (1-16 KB) that mimic the markup the parsers read. They pin the extracted
+# fields, but real pages are several times larger, so their timings are not representative.
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+EXPECTED_PATH = os.path.join(FIXTURES_DIR, 'expected.json')
+
+# Benchmarked parsers per page kind, as (engine, scoped) pairs
+VARIANTS = {
+    'property': {
+        'bs4': ('bs4', False),
+        'bs4-scoped': ('bs4', True),
+        'lxml': ('lxml', False),
+    },
+    'search': {
+        'bs4': ('bs4', False),
+    },
+}
+
+
+def get_page_kind(path: str, content: str) -> str:
+    """
+    Returns whether a page is a property detail page or a search result page.
+
+    Fixtures are named `detail_*` or `search_*`; other pages (e.g. response cache entries) are
+    recognized by their search result markup.
+    """
+    name = os.path.basename(path)
+    if name.startswith('search_'):
+        return 'search'
+    if name.startswith('detail_'):
+        return 'property'
+    return 'search' if 'postingCard-module__posting-description' in content else 'property'
+
+
+def get_steps(kind: str, content: str, engine: str, scoped: bool) -> List[Tuple[str, Callable[[Any], Any]]]:
+    """
+    Returns the timed steps of a parse, in the order the scraper runs them.
+
+    The first step builds the parser from the page content, and every following step calls one parser
+    method on it. Property pages stop after `validate_link` and `get_property_type` like `scrape_property`
+    does for inactive listings and buildings.
+    """
+    if kind == 'search':
+        return [
+            ('parse', lambda _: SearchPageParser(make_soup(content))),
+            ('get_current_page_number', lambda parser: parser.get_current_page_number()),
+            ('validate_links', lambda parser: parser.validate_links()),
+            ('get_cards', lambda parser: parser.get_cards()),
+            ('get_total_pages', lambda parser: list(parser.get_total_pages())),
+        ]
+    return [
+        ('parse', lambda _: make_property_parser(content, engine, scoped=scoped)),
+        ('validate_link', lambda parser: parser.validate_link()),
+        ('get_property_type', lambda parser: parser.get_property_type()),
+        ('get_price', lambda parser: list(parser.get_price())),
+        ('get_additional_expense', lambda parser: parser.get_additional_expense()),
+        ('get_address', lambda parser: parser.get_address()),
+        ('get_main_features', lambda parser: list(parser.get_main_features())),
+    ]
+
+
+def run_steps(steps: List[Tuple[str, Callable[[Any], Any]]], timings: Dict[str, List[float]] = None) -> Dict[str, Any]:
+    """
+    Runs the steps of a parse and returns the extracted fields.
+
+    Exceptions are recorded as the value of the failing step instead of being raised.
+
+    Args:
+        steps (List[Tuple[str, Callable[[Any], Any]]]): The steps returned by `get_steps`.
+        timings (Dict[str, List[float]], optional): Per-step latencies in seconds to append to. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: The value returned by every method step.
+    """
+    fields: Dict[str, Any] = {}
+    parser = None
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            value = step(parser)
+        except Exception as e:
+            fields[name] = {'error': type(e).__name__}
+            break
+        finally:
+            if timings is not None:
+                timings.setdefault(name, []).append(time.perf_counter() - start)
+
+        if name == 'parse':
+            parser = value
+            continue
+        fields[name] = value
+        if (name == 'validate_link' and not value) or (name == 'get_property_type' and value == "Edificio"):
+            break
+    return fields
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """
+    Summarizes latencies in seconds as milliseconds.
+    """
+    ordered = sorted(latencies)
+    return {
+        'mean_ms': round(statistics.mean(ordered) * 1000, 4),
+        'p50_ms': round(ordered[len(ordered) // 2] * 1000, 4),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 4),
+        'max_ms': round(ordered[-1] * 1000, 4),
+    }
+
+
+def benchmark_variant(
+    pages: List[Tuple[str, str]],
+    kind: str,
+    engine: str,
+    scoped: bool,
+    iterations: int
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Benchmarks one parser variant over a set of pages.
+
+    Latencies are measured without tracemalloc, which would slow every allocation down; the peak memory
+    of a full parse is then measured once per page in a separate pass.
+
+    Args:
+        pages (List[Tuple[str, str]]): The (name, content) pairs of the pages.
+        kind (str): 'property' or 'search'.
+        engine (str): The extraction engine.
+        scoped (bool): Whether the BeautifulSoup tree is scoped to the parsed sections.
+        iterations (int): Number of times every page is parsed.
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]: The benchmark results, and the fields extracted
+            from every page.
+    """
+    timings: Dict[str, List[float]] = {}
+    extracted: Dict[str, Dict[str, Any]] = {}
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for name, content in pages:
+            extracted[name] = run_steps(get_steps(kind, content, engine, scoped), timings)
+    elapsed = time.perf_counter() - start
+
+    peak_bytes = 0
+    for name, content in pages:
+        tracemalloc.start()
+        run_steps(get_steps(kind, content, engine, scoped))
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    n_parsed = len(pages) * iterations
+    results = {
+        'pages': len(pages),
+        'iterations': iterations,
+        'pages_per_sec': round(n_parsed / elapsed, 2),
+        'total_ms_per_page': round(elapsed / n_parsed * 1000, 4),
+        'latency': {name: summarize(latencies) for name, latencies in timings.items()},
+        'peak_memory_kb': round(peak_bytes / 1024, 1),
+    }
+    return results, extracted
+
+
+def get_commit() -> str:
+    """
+    Returns the current git commit, or None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    """
+    Benchmarks the search and property page parsers offline and prints the results as JSON.
+
+    Pages are read from the synthetic fixtures by default. Fields extracted from the fixtures are checked
+    against `fixtures/expected.json`, so selector changes that alter the output show up as mismatches
+    and the script exits with status 1. The fixtures are much smaller than real pages, so their timings
+    only compare commits; pass recorded pages (e.g. the response cache) for representative numbers.
+    The output flags results measured on the fixtures as `synthetic`.
+    """
+    parser = argparse.ArgumentParser(description='Benchmark the page parsers on HTML pages.')
+    parser.add_argument('paths', nargs='*', default=[FIXTURES_DIR], help='HTML files or directories (default: the synthetic fixtures)')
+    parser.add_argument('--iterations', type=int, default=20, help='Number of times every page is parsed (default: 20)')
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    parser.add_argument('--expected', default=EXPECTED_PATH, help='Expected fields per page (default: fixtures/expected.json)')
+    parser.add_argument('--update-expected', action='store_true', help='Record the fields extracted by the full bs4 parse as expected')
+    args = parser.parse_args()
+
+    # The parsers log every method call; benchmark the parsing itself
+    logging.disable(logging.CRITICAL)
+
+    pages: Dict[str, List[Tuple[str, str]]] = {'property': [], 'search': []}
+    paths = collect_pages(args.paths)
+    for path in paths:
+        content = read_page(path)
+        pages[get_page_kind(path, content)].append((os.path.basename(path), content))
+
+    results: Dict[str, Dict[str, Any]] = {}
+    extracted: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for kind, variants in VARIANTS.items():
+        if not pages[kind]:
+            continue
+        results[kind] = {}
+        for variant, (engine, scoped) in variants.items():
+            results[kind][variant], extracted[f"{kind}/{variant}"] = benchmark_variant(
+                pages[kind], kind, engine, scoped, args.iterations
+            )
+
+    # The full bs4 parse is the reference output
+    reference = {name: fields for kind in VARIANTS for name, fields in extracted.get(f"{kind}/bs4", {}).items()}
+    if args.update_expected:
+        with open(args.expected, 'w', encoding='utf-8') as f:
+            json.dump(reference, f, indent=2, ensure_ascii=False, sort_keys=True)
+            f.write('\n')
+
+    expected = {}
+    if os.path.exists(args.expected):
+        with open(args.expected, 'r', encoding='utf-8') as f:
+            expected = json.load(f)
+
+    # Round-trip through JSON so tuples compare equal to the recorded lists
+    extracted = json.loads(json.dumps(extracted))
+    mismatches = []
+    for key, fields_by_page in extracted.items():
+        for name, fields in fields_by_page.items():
+            want = expected.get(name, reference.get(name))
+            if fields != want:
+                mismatches.append({'page': name, 'variant': key, 'expected': want, 'actual': fields})
+
+    output = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'synthetic': any(os.path.dirname(os.path.abspath(path)) == FIXTURES_DIR for path in paths),
+        'results': results,
+        'mismatches': mismatches,
+    }
+    print(json.dumps(output, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import glob
+import gzip
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scraper.cache import CACHE_DIR
+from scraper.parser import make_property_parser
+
+
+def read_page(path: str) -> str:
+    """
+    Reads an HTML page, transparently decompressing response cache entries.
+
+    Args:
+        path (str): The path of a `.html` file or a gzip-compressed `.gz` cache entry.
+
+    Returns:
+        str: The HTML content.
+    """
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return f.read()
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def collect_pages(paths: List[str]) -> List[str]:
+    """
+    Expands files and directories into the list of pages to check.
+    """
+    pages: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ('*.html', '*.gz'):
+                pages.extend(glob.glob(os.path.join(path, '**', pattern), recursive=True))
+        else:
+            pages.append(path)
+    return sorted(pages)
+
+
+# Variants compared against the full BeautifulSoup parse, as (engine, scoped) pairs
+VARIANTS = {
+    'bs4-scoped': ('bs4', True),
+    'lxml': ('lxml', False),
+}
+
+
+def extract(content: str, engine: str, scoped: bool = False) -> Dict[str, Any]:
+    """
+    Runs a parser over a page in the same order as `scrape_property`.
+
+    Exceptions are recorded instead of raised, so engines can also be compared on malformed pages.
+
+    Args:
+        content (str): The HTML content of the page.
+        engine (str): The extraction engine.
+        scoped (bool, optional): Whether the BeautifulSoup tree is scoped to the parsed sections. Defaults to False.
+
+    Returns:
+        Dict[str, Any]: The extracted fields.
+    """
+    fields: Dict[str, Any] = {}
+    try:
+        parser = make_property_parser(content, engine, scoped=scoped)
+        fields['valid'] = parser.validate_link()
+        if not fields['valid']:
+            return fields
+        fields['property_type'] = parser.get_property_type()
+        if fields['property_type'] == "Edificio":
+            return fields
+        fields['price'] = list(parser.get_price())
+        fields['additional_expense'] = parser.get_additional_expense()
+        fields['address'] = parser.get_address()
+        fields['main_features'] = list(parser.get_main_features())
+    except Exception as e:
+        fields['error'] = type(e).__name__
+    return fields
+
+
+def main() -> None:
+    """
+    Checks that the scoped bs4 parse and the lxml engine produce the same fields as the full bs4 parse
+    on recorded pages.
+
+    Pages are read from the given files or directories, or from the response cache by default.
+    Exits with status 1 if any page differs.
+    """
+    parser = argparse.ArgumentParser(description='Compare the property page parsers against the full bs4 parse.')
+    parser.add_argument('paths', nargs='*', default=[CACHE_DIR], help='HTML files or directories (default: the response cache)')
+    args = parser.parse_args()
+
+    pages = collect_pages(args.paths)
+    mismatches = []
+    for path in pages:
+        content = read_page(path)
+        expected = extract(content, 'bs4')
+        for variant, (engine, scoped) in VARIANTS.items():
+            actual = extract(content, engine, scoped)
+            if expected != actual:
+                mismatches.append({'page': path, 'variant': variant, 'bs4': expected, variant: actual})
+
+    print(json.dumps({'pages': len(pages), 'mismatches': mismatches}, indent=2, ensure_ascii=False))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
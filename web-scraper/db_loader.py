@@ -1,11 +1,19 @@
 import argparse
 import json
 import os
+import re
 import shutil
-from typing import Dict
+from typing import Dict, List
 
-from scraper.loader import load_csv_to_db
-from scraper.utils import get_logger, CONFIG_PATH
+from scraper.columnar import FORMAT_SUFFIXES
+from scraper.loader import CONFLICT_ACTIONS, LOAD_MODES, BulkLoader, load_json_to_db, load_locations_to_db
+from scraper.locations import LocationIndex
+from scraper.metrics import METRICS, emit_batch_metrics
+from scraper.utils import get_logger, CONFIG, CONFIG_PATH
+
+
+# Batch files are named properties_listing_<batch_id>_partNNNN.<csv|parquet|arrows>
+BATCH_FILE_PATTERN = re.compile(r"properties_listing_(.+?)(?:_part\d+)?\.(?:csv|parquet|arrows)")
 
 
 def parse_args(default_db_config: Dict[str, str]) -> Dict[str, str]:
@@ -26,6 +34,12 @@ def parse_args(default_db_config: Dict[str, str]) -> Dict[str, str]:
     parser.add_argument('--port', type=int, help='Database port')
     parser.add_argument('--schema', help='Database schema')
     parser.add_argument('--table', help='Database table')
+    parser.add_argument('--load-mode', choices=LOAD_MODES, help='Roll back all files of a batch on error (transaction) or only the failing file (savepoint)')
+    parser.add_argument('--load-workers', type=int, help='Number of parallel COPY streams, one connection each')
+    parser.add_argument('--on-conflict', choices=CONFLICT_ACTIONS, help='Keep (nothing) or overwrite (update) rows that were already loaded')
+    parser.add_argument('--locations', action='store_true', help='Reload the location dimension tables from the cached ubigeo CSV and exit')
+    parser.add_argument('--locations-csv', help='Load the location dimension from this ubigeo CSV instead of the cached download')
+    parser.add_argument('--raw-json', nargs='+', metavar='PATH', help='Stream raw JSON or NDJSON dumps into the raw table and exit')
     args = parser.parse_args()
 
     db_cfg = default_db_config.copy()
@@ -36,16 +50,32 @@ def parse_args(default_db_config: Dict[str, str]) -> Dict[str, str]:
     db_cfg['port'] = args.port or db_cfg.get('port')
     db_cfg['schema'] = args.schema or db_cfg.get('schema')
     db_cfg['table'] = args.table or db_cfg.get('table')
+    db_cfg['load_mode'] = args.load_mode or db_cfg.get('load_mode', 'transaction')
+    db_cfg['load_workers'] = args.load_workers or db_cfg.get('load_workers', 1)
+    db_cfg['on_conflict'] = args.on_conflict or db_cfg.get('on_conflict', 'nothing')
+    db_cfg['locations'] = args.locations
+    db_cfg['locations_csv'] = args.locations_csv
+    db_cfg['raw_json'] = args.raw_json
 
     return db_cfg
 
 
+def get_file_batch_id(entry: str) -> str:
+    """
+    Returns the batch ID encoded in the name of a batch file, or 'unknown' for other files.
+    """
+    match = BATCH_FILE_PATTERN.fullmatch(entry)
+    return match.group(1) if match is not None else 'unknown'
+
+
 def main() -> None:
     """
     Main function to load processed CSV files into a PostgreSQL database.
 
-    This function reads the database configuration, processes files in the `processed` directory,
-    and moves them to the `loaded` directory after successful loading.
+    This function reads the database configuration, loads the files in the `processed` directory
+    batch by batch over reused connections, and moves them to the `loaded` directory once their
+    transaction has committed. The load metrics of every batch are added to its JSON summary in
+    `data/metrics`.
     """
     logger = get_logger(__name__)
     logger.info("Starting the JSON to PostgreSQL loader...")
@@ -55,25 +85,57 @@ def main() -> None:
 
     db_cfg = parse_args(default_db_config)
 
+    if db_cfg['locations']:
+        load_locations_to_db(LocationIndex.load(db_cfg['locations_csv'], max_age_hours=0), db_cfg)
+        return
+
+    if db_cfg['raw_json']:
+        for path in db_cfg['raw_json']:
+            load_json_to_db(path, db_cfg, db_cfg.get('json_batch_rows', 1000))
+        return
+
     processed_dir = os.path.join(os.path.dirname(__file__), 'data', 'processed')
     loaded_dir = os.path.join(os.path.dirname(__file__), 'data', 'loaded')
     os.makedirs(processed_dir, exist_ok=True)
     os.makedirs(loaded_dir, exist_ok=True)
 
-    if not os.listdir(processed_dir):
+    # Only completed batch files end in a format suffix; partial shard files and temporary files are skipped
+    entries = [entry for entry in os.listdir(processed_dir) if entry.endswith(tuple(FORMAT_SUFFIXES.values()))]
+
+    if not entries:
         logger.error("No files found in the processed directory. Please run the scraper first.")
         return
 
-    logger.info(f"Found {len(os.listdir(processed_dir))} files in the processed directory.")
-
-    for entry in os.listdir(processed_dir):
-        full_path = os.path.join(processed_dir, entry)
-        if os.path.isfile(full_path):
-            logger.info(f"Loading file: {full_path}")
-            load_csv_to_db(full_path, db_cfg)
-            logger.info(f"File {full_path} loaded successfully into the database.")
-            shutil.move(full_path, loaded_dir)
-            logger.info(f"Moved {full_path} to {loaded_dir}")
+    logger.info(f"Found {len(entries)} files in the processed directory.")
+
+    batches: Dict[str, List[str]] = {}
+    for entry in sorted(entries):
+        batches.setdefault(get_file_batch_id(entry), []).append(entry)
+
+    failed_files = 0
+    with BulkLoader(db_cfg, mode=db_cfg['load_mode'], workers=db_cfg['load_workers'], on_conflict=db_cfg['on_conflict']) as loader:
+        for batch_id, batch_entries in batches.items():
+            METRICS.reset()
+            paths = [os.path.join(processed_dir, entry) for entry in batch_entries]
+            logger.info(f"Loading {len(paths)} files of batch {batch_id} ...")
+            loaded, failed, counts = loader.load(paths)
+
+            # Files are only moved once their rows are committed, so a failed load leaves them to be retried
+            for path in loaded:
+                shutil.move(path, loaded_dir)
+                logger.info(f"Moved {path} to {loaded_dir}")
+            for path in failed:
+                logger.error(f"File {path} was rolled back and stays in the processed directory.")
+            failed_files += len(failed)
+
+            metrics_path = emit_batch_metrics(batch_id, 'load', METRICS.summary(rows=counts['inserted']), CONFIG.get('metrics_textfile_dir'))
+            logger.info(
+                f"Batch {batch_id}: {counts['inserted']} rows inserted, {counts['duplicates']} duplicates skipped, "
+                f"{counts['conflicting']} already loaded ({counts['updated']} updated). Metrics saved to {metrics_path}."
+            )
+
+    if failed_files:
+        raise RuntimeError(f"{failed_files} files could not be loaded.")
 
     logger.info("File to PostgreSQL loader completed successfully.")
 
@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+from scraper.utils import get_logger
+
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'cache')
+
+CACHE_MODES = ('off', 'read-through', 'replay-only')
+
+
+class ResponseCache:
+    """
+    A content-addressed, gzip-compressed on-disk cache of fetched pages.
+
+    Entries are keyed by the URL and query parameters. In `read-through` mode, fresh entries are
+    served from disk and misses are fetched and stored; in `replay-only` mode, entries are served
+    regardless of their age and misses are never fetched, which allows fully offline reprocessing.
+    The cache is kept under `max_bytes` by evicting the least recently used entries.
+    """
+    def __init__(
+        self,
+        cache_dir: str = CACHE_DIR,
+        mode: str = 'read-through',
+        ttl_seconds: Optional[float] = None,
+        max_bytes: Optional[int] = None
+    ):
+        """
+        Initializes the ResponseCache.
+
+        Args:
+            cache_dir (str, optional): The directory of the cache. Defaults to `data/cache`.
+            mode (str, optional): 'read-through' or 'replay-only'. Defaults to 'read-through'.
+            ttl_seconds (Optional[float], optional): Age after which entries are stale in read-through mode.
+                None keeps entries forever. Defaults to None.
+            max_bytes (Optional[int], optional): Maximum total size of the cache on disk. None disables
+                eviction. Defaults to None.
+        """
+        if mode not in CACHE_MODES[1:]:
+            raise ValueError(f"Invalid cache mode '{mode}'. Expected one of {CACHE_MODES[1:]}.")
+
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.logger = get_logger(__name__)
+
+        self._lock = threading.Lock()
+        self._sizes: Dict[str, int] = {}
+        self._total_bytes = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.gz'):
+                    path = os.path.join(root, name)
+                    self._sizes[path] = os.path.getsize(path)
+        self._total_bytes = sum(self._sizes.values())
+
+    @property
+    def replay_only(self) -> bool:
+        return self.mode == 'replay-only'
+
+    def _path(self, url: str, params: Optional[dict]) -> str:
+        key = url
+        if params:
+            key += '?' + urlencode(sorted(params.items()))
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.gz')
+
+    def _is_fresh(self, path: str) -> Tuple[bool, bool]:
+        """
+        Returns whether an entry exists and whether it is fresh enough to be served.
+        """
+        try:
+            modified = os.path.getmtime(path)
+        except FileNotFoundError:
+            return False, False
+        if self.replay_only or self.ttl_seconds is None:
+            return True, True
+        return True, time.time() - modified <= self.ttl_seconds
+
+    def contains(self, url: str, params: Optional[dict] = None) -> bool:
+        """
+        Returns whether a servable entry exists for the URL and parameters.
+        """
+        return self._is_fresh(self._path(url, params))[1]
+
+    def get(self, url: str, params: Optional[dict] = None) -> Optional[str]:
+        """
+        Returns the cached page for the URL and parameters, or None on a miss.
+
+        Args:
+            url (str): The URL of the page.
+            params (Optional[dict], optional): The query parameters of the request. Defaults to None.
+
+        Returns:
+            Optional[str]: The cached content, or None if there is no servable entry.
+        """
+        path = self._path(url, params)
+        _, fresh = self._is_fresh(path)
+        if not fresh:
+            return None
+
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                content = f.read()
+        except (OSError, EOFError) as e:
+            self.logger.error(f"Discarding unreadable cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+        # Record the access time for LRU eviction while keeping the stored time for the TTL. The entry
+        # may have been evicted since it was read, by another thread or by another shard's process.
+        try:
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except FileNotFoundError:
+            pass
+        return content
+
+    def put(self, url: str, content: str, params: Optional[dict] = None) -> None:
+        """
+        Stores a fetched page and evicts the least recently used entries if the cache is too large.
+
+        Args:
+            url (str): The URL of the page.
+            content (str): The content of the page.
+            params (Optional[dict], optional): The query parameters of the request. Defaults to None.
+        """
+        path = self._path(url, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            # Evicted right after the write, e.g. by another shard sharing the cache directory
+            return
+        with self._lock:
+            self._total_bytes += size - self._sizes.get(path, 0)
+            self._sizes[path] = size
+        self._evict()
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._total_bytes -= self._sizes.pop(path, 0)
+
+    def _evict(self) -> None:
+        if self.max_bytes is None or self._total_bytes <= self.max_bytes:
+            return
+
+        with self._lock:
+            entries = []
+            for path in self._sizes:
+                try:
+                    entries.append((os.path.getatime(path), path))
+                except FileNotFoundError:
+                    entries.append((0.0, path))
+        entries.sort()
+
+        # Evict down to 90% of the limit so eviction does not run on every write
+        target = self.max_bytes * 0.9
+        n_evicted = 0
+        for _, path in entries:
+            if self._total_bytes <= target:
+                break
+            self._remove(path)
+            n_evicted += 1
+        self.logger.info(f"Evicted {n_evicted} cache entries. Cache size is now {self._total_bytes} bytes.")
@@ -0,0 +1,165 @@
+import io
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, List, Optional
+
+from scraper.record import PropertyRecord
+
+
+# Output formats of the processed batch files, and the suffix of their part files
+OUTPUT_FORMATS = ('csv', 'parquet', 'arrow')
+FORMAT_SUFFIXES = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'arrow': '.arrows',
+}
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+TIMESTAMP_FIELDS = ('batch_extraction_start', 'property_extraction_start')
+DECIMAL_FIELDS = ('price_pen', 'price_usd', 'additional_expense')
+INTEGER_FIELDS = ('total_size', 'covered_size', 'bedrooms', 'bathrooms', 'half_bathrooms', 'parking_spaces', 'age')
+
+
+def import_pyarrow():
+    """
+    Imports pyarrow, which is only needed for the Parquet and Arrow output formats.
+    """
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("The parquet and arrow output formats require pyarrow (pip install pyarrow).") from e
+    return pyarrow
+
+
+def get_landing_schema():
+    """
+    Returns the Arrow schema of the processed batch files, mirroring the `properties_landing` table.
+
+    UUIDs are stored as strings, timestamps without time zone at second precision and money amounts
+    as DECIMAL(19, 2). Region, city, district, price type and property type are dictionary-encoded.
+
+    Returns:
+        pyarrow.Schema: The schema.
+    """
+    pa = import_pyarrow()
+    # Low-cardinality columns store every distinct value once
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    money = pa.decimal128(19, 2)
+    return pa.schema([
+        pa.field('batch_id', pa.string(), nullable=False),
+        pa.field('batch_extraction_start', pa.timestamp('s'), nullable=False),
+        pa.field('property_id', pa.string(), nullable=False),
+        pa.field('property_extraction_start', pa.timestamp('s'), nullable=False),
+        pa.field('property_type', dictionary),
+        pa.field('price_type', dictionary),
+        pa.field('price_pen', money),
+        pa.field('price_usd', money),
+        pa.field('additional_expense', money),
+        pa.field('address', pa.string()),
+        pa.field('region', dictionary),
+        pa.field('city', dictionary),
+        pa.field('district', dictionary),
+        *(pa.field(name, pa.int32()) for name in INTEGER_FIELDS),
+        pa.field('link', pa.string()),
+    ])
+
+
+def _to_timestamp(value: Any) -> Optional[datetime]:
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def _to_decimal(value: Any) -> Optional[Decimal]:
+    if value is None or value == '':
+        return None
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if value is None or value == '':
+        return None
+    return int(value)
+
+
+def rows_to_table(rows: Iterable[PropertyRecord], schema=None):
+    """
+    Converts scraped records into an Arrow table of the landing schema.
+
+    Records carry timestamps as strings and amounts as numbers, like the CSV output; they are converted
+    column by column to the typed schema.
+
+    Args:
+        rows (Iterable[PropertyRecord]): The records to convert.
+        schema (pyarrow.Schema, optional): The schema. Defaults to `get_landing_schema()`.
+
+    Returns:
+        pyarrow.Table: The table.
+    """
+    pa = import_pyarrow()
+    schema = schema or get_landing_schema()
+    rows = list(rows)
+
+    arrays = []
+    for field in schema:
+        values: List[Any] = [getattr(row, field.name) for row in rows]
+        if field.name in TIMESTAMP_FIELDS:
+            values = [_to_timestamp(value) for value in values]
+        elif field.name in DECIMAL_FIELDS:
+            values = [_to_decimal(value) for value in values]
+        elif field.name in INTEGER_FIELDS:
+            values = [_to_int(value) for value in values]
+        else:
+            values = [None if value is None else str(value) for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def read_table(path: str):
+    """
+    Reads a Parquet or Arrow IPC stream batch file, depending on its suffix.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        pyarrow.Table: The table.
+    """
+    pa = import_pyarrow()
+    if path.endswith(FORMAT_SUFFIXES['parquet']):
+        import pyarrow.parquet as pq
+        return pq.read_table(path)
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_stream(source).read_all()
+
+
+def table_to_copy_csv(table) -> io.BytesIO:
+    """
+    Serializes an Arrow table as CSV with header, ready for `COPY ... FROM STDIN WITH CSV HEADER`.
+
+    The serialization runs in Arrow's native CSV writer rather than row by row in Python. Dictionary
+    columns are decoded first, and nulls are written as unquoted empty fields, which COPY reads as NULL.
+
+    Args:
+        table (pyarrow.Table): The table.
+
+    Returns:
+        io.BytesIO: The CSV content, positioned at its start.
+    """
+    pa = import_pyarrow()
+    import pyarrow.csv as pa_csv
+
+    columns = []
+    for column in table.columns:
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        columns.append(column)
+    table = pa.Table.from_arrays(columns, names=table.column_names)
+
+    buffer = io.BytesIO()
+    pa_csv.write_csv(table, buffer)
+    buffer.seek(0)
+    return buffer
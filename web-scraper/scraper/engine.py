@@ -0,0 +1,205 @@
+import contextlib
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import cloudscraper
+from cloudscraper import CloudScraper
+
+from scraper.cache import ResponseCache
+from scraper.fetcher import fetch_page
+from scraper.metrics import METRICS
+from scraper.retry import CircuitBreaker, RetryPolicy
+
+R = TypeVar('R')
+
+
+class RateLimiter:
+    """
+    A thread-safe limiter that spaces out calls so that at most `rate` of them start per second.
+    """
+    def __init__(self, rate: Optional[float] = None):
+        """
+        Initializes the RateLimiter.
+
+        Args:
+            rate (Optional[float], optional): Maximum number of calls per second. None or 0 disables the limit.
+        """
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        """
+        Blocks until the caller is allowed to proceed.
+        """
+        if self.interval <= 0:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class FetchEngine:
+    """
+    A bounded-concurrency fetcher that runs page requests on a thread pool.
+
+    Every worker thread owns its own CloudScraper session, and every request goes through a global
+    and a per-host rate limiter before being handed to `fetch_page`. At most `max_workers` requests
+    are in flight at once, including requests made from threads outside the pool. Failed requests are retried
+    according to the retry policy, and a per-host circuit breaker pauses all workers while a host
+    keeps failing.
+    """
+    def __init__(
+        self,
+        headers: Optional[dict] = None,
+        max_workers: int = 1,
+        global_rate: Optional[float] = None,
+        per_host_rate: Optional[float] = None,
+        cache: Optional[ResponseCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        breaker_config: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initializes the FetchEngine.
+
+        Args:
+            headers (Optional[dict], optional): HTTP headers to include in every request. Defaults to None.
+            max_workers (int, optional): Number of requests allowed in flight at once, and number of worker
+                threads. Defaults to 1.
+            global_rate (Optional[float], optional): Maximum requests per second across all hosts. Defaults to None.
+            per_host_rate (Optional[float], optional): Maximum requests per second to a single host. Defaults to None.
+            cache (Optional[ResponseCache], optional): Response cache passed on to `fetch_page`. Defaults to None.
+            retry_policy (Optional[RetryPolicy], optional): Retry policy passed on to `fetch_page`.
+                Defaults to a single attempt without retries.
+            breaker_config (Optional[Dict[str, Any]], optional): Keyword arguments of the per-host
+                CircuitBreaker. None disables the breakers. Defaults to None.
+        """
+        self.headers = headers
+        self.max_workers = max(1, max_workers)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.per_host_rate = per_host_rate
+        self.cache = cache
+
+        self._local = threading.local()
+        self._in_flight = threading.BoundedSemaphore(self.max_workers)
+        self._global_limiter = RateLimiter(global_rate)
+        self._host_limiters: Dict[str, RateLimiter] = {}
+        self._breaker_config = breaker_config
+        self._host_breakers: Dict[str, CircuitBreaker] = {}
+        self._host_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fetch')
+
+    def _get_scraper(self) -> CloudScraper:
+        """
+        Returns the CloudScraper session owned by the calling thread, creating it on first use.
+        """
+        scraper = getattr(self._local, 'scraper', None)
+        if scraper is None:
+            scraper = cloudscraper.create_scraper()
+            self._local.scraper = scraper
+        return scraper
+
+    def _get_host_limiter(self, url: str) -> RateLimiter:
+        """
+        Returns the rate limiter for the host of the given URL.
+        """
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            limiter = self._host_limiters.get(host)
+            if limiter is None:
+                limiter = RateLimiter(self.per_host_rate)
+                self._host_limiters[host] = limiter
+        return limiter
+
+    def _get_host_breaker(self, url: str) -> Optional[CircuitBreaker]:
+        """
+        Returns the circuit breaker for the host of the given URL, or None if breakers are disabled.
+        """
+        if self._breaker_config is None:
+            return None
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            breaker = self._host_breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(host, **self._breaker_config)
+                self._host_breakers[host] = breaker
+        return breaker
+
+    def fetch(self, url: str, params: Optional[dict] = None, stage: str = 'fetch') -> Optional[str]:
+        """
+        Fetches a page, waiting for the global and per-host rate limits before every attempt.
+
+        Every attempt holds an in-flight slot, which is released during the backoff before a retry.
+        Pages served from the response cache do not count against the rate limits or the in-flight limit.
+        The latency of the fetch, including the waits, is recorded in the histogram of `stage`.
+
+        Args:
+            url (str): The URL of the page to fetch.
+            params (Optional[dict], optional): Query parameters to include in the request. Defaults to None.
+            stage (str, optional): The metrics stage of the fetch, e.g. 'search_paging'. Defaults to 'fetch'.
+
+        Returns:
+            Optional[str]: The content of the page as a string, or None if the request fails.
+        """
+        with METRICS.timer(stage):
+            if self.cache is not None and (self.cache.replay_only or self.cache.contains(url, params)):
+                return self._fetch_page(url, params, stage, attempt_slot=None)
+            return self._fetch_page(url, params, stage, attempt_slot=functools.partial(self._attempt_slot, url))
+
+    @contextlib.contextmanager
+    def _attempt_slot(self, url: str) -> Iterator[None]:
+        """
+        Holds an in-flight slot for one request attempt, once the rate limits allow it.
+        """
+        with self._in_flight:
+            self._global_limiter.acquire()
+            self._get_host_limiter(url).acquire()
+            yield
+
+    def _fetch_page(self, url: str, params: Optional[dict], stage: str, attempt_slot: Optional[Callable] = None) -> Optional[str]:
+        return fetch_page(
+            scraper=self._get_scraper(),
+            url=url,
+            headers=self.headers,
+            params=params,
+            cache=self.cache,
+            policy=self.retry_policy,
+            breaker=self._get_host_breaker(url),
+            stage=stage,
+            attempt_slot=attempt_slot
+        )
+
+    def submit(self, func: Callable[..., R], *args: Any) -> 'Future[R]':
+        """
+        Schedules `func(*args)` on the worker pool.
+
+        Args:
+            func (Callable[..., R]): The function to run.
+            *args (Any): The arguments of the function.
+
+        Returns:
+            Future[R]: The future of the result.
+        """
+        return self._executor.submit(func, *args)
+
+    def close(self) -> None:
+        """
+        Waits for in-flight requests and shuts down the worker pool.
+        """
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'FetchEngine':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
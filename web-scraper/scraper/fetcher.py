@@ -1,42 +1,28 @@
 from cloudscraper import CloudScraper
+import contextlib
 import time
+from scraper.cache import ResponseCache
+from scraper.locations import LocationIndex
+from scraper.metrics import METRICS
+from scraper.retry import PERMANENT, RETRYABLE_OUTCOMES, SUCCESS, CircuitBreaker, RetryPolicy, parse_retry_after
 from scraper.utils import get_logger
-from typing import Optional, Tuple, List
-import requests
-import csv
+from typing import Callable, ContextManager, Optional, Tuple, List
 
 
 def fetch_location_data() -> Tuple[List[str], List[str], List[str]]:
     """
-    Fetches location data from a remote CSV file.
+    Returns the regions, cities, and districts of the location dimension.
 
-    The data includes regions, cities, and districts, which are extracted from the CSV file.
+    The data comes from the local copy of the ubigeo CSV, which is only downloaded when missing or
+    stale (see `scraper.locations.LocationIndex`).
 
     Returns:
         Tuple[List[str], List[str], List[str]]: A tuple containing three lists - regions, cities, and districts.
     """
-    logger = get_logger(__name__)
-    logger.info("Fetching location data ...")
-
-    response = requests.get(
-        "https://raw.githubusercontent.com/jmcastagnetto/ubigeo-peru-aumentado/refs/heads/main/ubigeo_distrito.csv"
-    )
-    response.raise_for_status()
-
-    lines = response.text.splitlines()
-    reader = csv.reader(lines)
-    header = next(reader)  # Skip the header row
-
-    regions: List[str] = []
-    cities: List[str] = []
-    districts: List[str] = []
-
-    for row in reader:
-        if row[0] != 'NA' and row[1] != 'NA':
-            regions.append(row[2])
-            cities.append(row[3])
-            districts.append(row[4])
-
+    location_index = LocationIndex.load()
+    regions = [location.region for location in location_index]
+    cities = [location.city for location in location_index]
+    districts = [location.district for location in location_index]
     return regions, cities, districts
 
 
@@ -45,29 +31,105 @@ def fetch_page(
     url: str,
     headers: Optional[dict] = None,
     params: Optional[dict] = None,
-    max_retries: int = 0
+    cache: Optional[ResponseCache] = None,
+    policy: Optional[RetryPolicy] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    stage: str = 'fetch',
+    attempt_slot: Optional[Callable[[], ContextManager[None]]] = None
 ) -> Optional[str]:
     """
     Fetches the content of a web page using a CloudScraper instance.
 
+    With a response cache, servable cached pages are returned without a request and fetched pages
+    are stored. In replay-only mode, a cache miss returns None without hitting the network.
+
+    Failed attempts are classified by the retry policy: permanent failures (e.g. 404) return at once,
+    other failures are retried after a jittered backoff or the server's `Retry-After`, and there is no
+    wait after the last attempt. With a circuit breaker, every attempt waits while the host is paused
+    and reports its outcome to the breaker. With an attempt slot, every attempt is made inside a fresh
+    slot, so rate limits apply to retries too and no slot is held during the backoff.
+
+    Requests, retries, outcomes, cache hits and downloaded bytes are counted under `stage` in the
+    process metrics.
+
     Args:
         scraper (CloudScraper): The CloudScraper instance to use for fetching the page.
         url (str): The URL of the page to fetch.
         headers (Optional[dict], optional): HTTP headers to include in the request. Defaults to None.
         params (Optional[dict], optional): Query parameters to include in the request. Defaults to None.
-        max_retries (int, optional): The maximum number of retry attempts in case of failure. Defaults to 0.
+        cache (Optional[ResponseCache], optional): The response cache to read from and write to. Defaults to None.
+        policy (Optional[RetryPolicy], optional): The retry policy. Defaults to a single attempt without retries.
+        breaker (Optional[CircuitBreaker], optional): The circuit breaker of the host. Defaults to None.
+        stage (str, optional): The metrics stage the request belongs to. Defaults to 'fetch'.
+        attempt_slot (Optional[Callable[[], ContextManager[None]]], optional): Returns the context every
+            attempt runs in, e.g. one that holds an in-flight slot after waiting for the rate limits.
+            Defaults to None.
 
     Returns:
         Optional[str]: The content of the page as a string, or None if the request fails.
     """
     logger = get_logger(__name__)
-    for i in range(max_retries + 1):
-        logger.info(f"Attempt #{i+1}: Fetching content from {url}...")
+
+    if cache is not None:
+        content = cache.get(url, params)
+        if content is not None:
+            logger.info(f"Cache hit: {url}")
+            METRICS.increment(stage, 'cache_hits')
+            return content
+        if cache.replay_only:
+            logger.error(f"Cache miss in replay-only mode: {url}")
+            return None
+
+    if policy is None:
+        policy = RetryPolicy()
+
+    for i in range(policy.max_retries + 1):
+        probe = breaker.before_request() if breaker is not None else False
+
+        response, error = None, None
         try:
-            response = scraper.get(url, headers=headers, params=params)
-            response.raise_for_status()  # Raise an error for bad responses
+            with attempt_slot() if attempt_slot is not None else contextlib.nullcontext():
+                logger.info(f"Attempt #{i+1}: Fetching content from {url}...")
+                METRICS.increment(stage, 'requests')
+                if i > 0:
+                    METRICS.increment(stage, 'retries')
+                try:
+                    response = scraper.get(url, headers=headers, params=params, timeout=policy.timeout)
+                except Exception as e:
+                    error = e
+            outcome = policy.classify(response, error)
+        except BaseException:
+            # An unfinished probe would keep every other request to the host waiting
+            if probe:
+                breaker.record(True, probe)
+            raise
+        METRICS.increment(stage, outcome)
+        if response is not None:
+            METRICS.add_bytes(stage, len(response.content))
+
+        if breaker is not None:
+            breaker.record(outcome in RETRYABLE_OUTCOMES, probe)
+
+        if outcome == SUCCESS:
+            if cache is not None:
+                cache.put(url, response.text, params)
             return response.text
-        except Exception as e:
-            logger.error(f"Error fetching {url}: {e}")
-            time.sleep(2 ** (i + 1))
-    return None
\ No newline at end of file
+
+        reason = error if error is not None else f"HTTP {response.status_code}"
+        if outcome == PERMANENT:
+            logger.error(f"Error fetching {url}: {reason}. Not retrying.")
+            METRICS.increment(stage, 'failed')
+            return None
+        if i == policy.max_retries:
+            logger.error(f"Error fetching {url}: {reason}. Giving up after {i + 1} attempts.")
+            METRICS.increment(stage, 'failed')
+            return None
+
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+        delay = policy.get_delay(i, retry_after)
+        if retry_after is not None and breaker is not None:
+            # The whole host is throttled, not just this request
+            breaker.hold(delay)
+        logger.error(f"Error fetching {url}: {reason} ({outcome}). Retrying in {delay:.1f}s...")
+        time.sleep(delay)
+    return None
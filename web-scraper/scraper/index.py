@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from scraper.record import PropertyRecord
+from scraper.utils import get_logger
+
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'index', 'property_index.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS properties (
+    property_id TEXT PRIMARY KEY,
+    link TEXT NOT NULL,
+    card_fingerprint TEXT,
+    content_fingerprint TEXT NOT NULL,
+    last_fetched TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    row TEXT NOT NULL
+);
+"""
+
+
+class PropertyIndex:
+    """
+    A persistent SQLite index of the listings seen across batches.
+
+    For every property it keeps the fingerprint of its search result card, the fingerprint of its
+    parsed details, the dates it was last fetched and last seen, and the last scraped row, so an
+    unchanged listing can be carried forward into a new batch without fetching its detail page.
+    """
+    def __init__(self, path: str = INDEX_PATH, refresh_days: int = 7):
+        """
+        Opens (and creates if needed) the index database.
+
+        Args:
+            path (str, optional): The path of the SQLite file. Defaults to `data/index/property_index.sqlite`.
+            refresh_days (int, optional): Listings are fetched again once their last fetch is older than
+                this many days, even if their card did not change. Defaults to 7.
+        """
+        self.path = path
+        self.refresh_days = refresh_days
+        self.logger = get_logger(__name__)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def get_unchanged_row(self, property_id: str, card_fingerprint: Optional[str]) -> Optional[dict]:
+        """
+        Returns the last scraped row of a property if its search result card did not change.
+
+        Args:
+            property_id (str): The property ID.
+            card_fingerprint (Optional[str]): The fingerprint of the current search result card.
+
+        Returns:
+            Optional[dict]: The last scraped row, or None if the detail page has to be fetched.
+        """
+        if card_fingerprint is None:
+            return None
+
+        row = self.conn.execute(
+            "SELECT card_fingerprint, last_fetched, row FROM properties WHERE property_id = ?", (property_id,)
+        ).fetchone()
+        if row is None or row[0] != card_fingerprint:
+            return None
+
+        last_fetched = datetime.strptime(row[1], "%Y-%m-%d")
+        if datetime.now() - last_fetched > timedelta(days=self.refresh_days):
+            return None
+
+        return json.loads(row[2])
+
+    def get_content_fingerprint(self, property_id: str) -> Optional[str]:
+        """
+        Returns the content fingerprint of the last scraped row of a property.
+        """
+        row = self.conn.execute(
+            "SELECT content_fingerprint FROM properties WHERE property_id = ?", (property_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def record_fetched(self, entries: Iterable[Tuple[str, str, Optional[str], str, PropertyRecord]], seen_date: str) -> None:
+        """
+        Stores freshly fetched properties.
+
+        Args:
+            entries (Iterable[Tuple[str, str, Optional[str], str, PropertyRecord]]): Tuples of property ID,
+                link, card fingerprint, content fingerprint and record.
+            seen_date (str): The date the properties were fetched (YYYY-MM-DD).
+        """
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO properties (property_id, link, card_fingerprint, content_fingerprint, last_fetched, last_seen, row)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (property_id) DO UPDATE SET
+                    link = excluded.link,
+                    card_fingerprint = excluded.card_fingerprint,
+                    content_fingerprint = excluded.content_fingerprint,
+                    last_fetched = excluded.last_fetched,
+                    last_seen = excluded.last_seen,
+                    row = excluded.row
+                """,
+                [
+                    (property_id, link, card_fingerprint, content_fingerprint, seen_date, seen_date, json.dumps(row.to_dict()))
+                    for property_id, link, card_fingerprint, content_fingerprint, row in entries
+                ]
+            )
+
+    def record_seen(self, property_ids: List[str], seen_date: str) -> None:
+        """
+        Updates the last-seen date of properties carried forward without fetching.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE properties SET last_seen = ? WHERE property_id = ?",
+                [(seen_date, property_id) for property_id in property_ids]
+            )
+
+    def close(self) -> None:
+        """
+        Closes the index database.
+        """
+        self.conn.close()
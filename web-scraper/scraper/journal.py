@@ -0,0 +1,207 @@
+import os
+import sqlite3
+from datetime import datetime
+from typing import Iterable, List, Optional, Set, Tuple
+
+from scraper.utils import get_logger
+
+
+JOURNAL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'journal', 'crawl_journal.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    batch_extraction_start TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS districts (
+    batch_id TEXT NOT NULL,
+    region TEXT NOT NULL,
+    city TEXT NOT NULL,
+    district TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (batch_id, region, city, district)
+);
+CREATE TABLE IF NOT EXISTS links (
+    batch_id TEXT NOT NULL,
+    region TEXT NOT NULL,
+    city TEXT NOT NULL,
+    district TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    link TEXT NOT NULL,
+    card_fingerprint TEXT,
+    PRIMARY KEY (batch_id, region, city, district, position)
+);
+CREATE TABLE IF NOT EXISTS properties (
+    batch_id TEXT NOT NULL,
+    property_id TEXT NOT NULL,
+    PRIMARY KEY (batch_id, property_id)
+);
+CREATE TABLE IF NOT EXISTS parts (
+    batch_id TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    part_number INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (batch_id, prefix, part_number)
+);
+"""
+
+
+class CrawlJournal:
+    """
+    A SQLite journal of crawl progress used to resume interrupted batches.
+
+    It records, per batch, the districts whose links were discovered or fully crawled, the discovered
+    link sets with the fingerprints of their search result cards, and the property IDs that were committed to a batch file. Property IDs are only
+    recorded when the part file containing them is committed, so the journal never claims more than
+    what is on disk.
+    """
+    def __init__(self, path: str = JOURNAL_PATH):
+        """
+        Opens (and creates if needed) the journal database.
+
+        Args:
+            path (str, optional): The path of the SQLite file. Defaults to `data/journal/crawl_journal.sqlite`.
+        """
+        self.path = path
+        self.logger = get_logger(__name__)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Shard processes share the journal, so wait on locks instead of failing
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        # Journals created before card fingerprints were journaled
+        if 'card_fingerprint' not in [row[1] for row in self.conn.execute("PRAGMA table_info(links)")]:
+            try:
+                self.conn.execute("ALTER TABLE links ADD COLUMN card_fingerprint TEXT")
+            except sqlite3.OperationalError:
+                # Another shard process added it first
+                pass
+        self.conn.commit()
+
+    def get_batch(self, batch_id: str) -> Optional[Tuple[str, str]]:
+        """
+        Returns the extraction start and status of a batch, or None if it is not journaled.
+        """
+        return self.conn.execute(
+            "SELECT batch_extraction_start, status FROM batches WHERE batch_id = ?", (batch_id,)
+        ).fetchone()
+
+    def start_batch(self, batch_id: str, batch_extraction_start: str) -> None:
+        """
+        Registers a batch as running. Registering an existing batch keeps its extraction start.
+        """
+        with self.conn:
+            self.conn.execute(
+                """
+                INSERT INTO batches (batch_id, batch_extraction_start, status, updated_at)
+                VALUES (?, ?, 'running', ?)
+                ON CONFLICT (batch_id) DO UPDATE SET status = 'running', updated_at = excluded.updated_at
+                """,
+                (batch_id, batch_extraction_start, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+
+    def finish_batch(self, batch_id: str) -> None:
+        """
+        Marks a batch as finished.
+        """
+        with self.conn:
+            self.conn.execute(
+                "UPDATE batches SET status = 'finished', updated_at = ? WHERE batch_id = ?",
+                (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), batch_id)
+            )
+
+    def get_district_status(self, batch_id: str, region: str, city: str, district: str) -> Optional[str]:
+        """
+        Returns the status of a district ('discovered' or 'completed'), or None if it was not started.
+        """
+        row = self.conn.execute(
+            "SELECT status FROM districts WHERE batch_id = ? AND region = ? AND city = ? AND district = ?",
+            (batch_id, region, city, district)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_district_links(self, batch_id: str, region: str, city: str, district: str) -> List[Tuple[str, Optional[str]]]:
+        """
+        Returns the discovered links of a district with their card fingerprints, in discovery order.
+        """
+        rows = self.conn.execute(
+            """
+            SELECT link, card_fingerprint FROM links
+            WHERE batch_id = ? AND region = ? AND city = ? AND district = ?
+            ORDER BY position
+            """,
+            (batch_id, region, city, district)
+        ).fetchall()
+        return [(link, card_fingerprint) for link, card_fingerprint in rows]
+
+    def record_district_links(
+        self, batch_id: str, region: str, city: str, district: str, links: List[Tuple[str, Optional[str]]]
+    ) -> None:
+        """
+        Stores the discovered links of a district with their card fingerprints and marks it as discovered.
+        """
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM links WHERE batch_id = ? AND region = ? AND city = ? AND district = ?",
+                (batch_id, region, city, district)
+            )
+            self.conn.executemany(
+                "INSERT INTO links (batch_id, region, city, district, position, link, card_fingerprint) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(batch_id, region, city, district, i, link, card_fingerprint) for i, (link, card_fingerprint) in enumerate(links)]
+            )
+            self._set_district_status(batch_id, region, city, district, 'discovered')
+
+    def complete_district(self, batch_id: str, region: str, city: str, district: str) -> None:
+        """
+        Marks a district as fully crawled.
+        """
+        with self.conn:
+            self._set_district_status(batch_id, region, city, district, 'completed')
+
+    def _set_district_status(self, batch_id: str, region: str, city: str, district: str, status: str) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO districts (batch_id, region, city, district, status) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (batch_id, region, city, district) DO UPDATE SET status = excluded.status
+            """,
+            (batch_id, region, city, district, status)
+        )
+
+    def get_committed_ids(self, batch_id: str) -> Set[str]:
+        """
+        Returns the property IDs already committed to a file of the batch.
+        """
+        rows = self.conn.execute("SELECT property_id FROM properties WHERE batch_id = ?", (batch_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    def get_next_part(self, batch_id: str, prefix: str) -> int:
+        """
+        Returns the number of the next part file to write for a file prefix.
+        """
+        row = self.conn.execute(
+            "SELECT MAX(part_number) FROM parts WHERE batch_id = ? AND prefix = ?", (batch_id, prefix)
+        ).fetchone()
+        return (row[0] or 0) + 1
+
+    def record_part(self, batch_id: str, prefix: str, part_number: int, path: str, property_ids: Iterable[str]) -> None:
+        """
+        Records a committed part file and the property IDs it contains.
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO parts (batch_id, prefix, part_number, path) VALUES (?, ?, ?, ?)",
+                (batch_id, prefix, part_number, path)
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO properties (batch_id, property_id) VALUES (?, ?)",
+                [(batch_id, property_id) for property_id in property_ids]
+            )
+
+    def close(self) -> None:
+        """
+        Closes the journal database.
+        """
+        self.conn.close()
@@ -0,0 +1,165 @@
+import json
+from typing import IO, Any, Dict, Iterator
+
+
+# Characters read from the file at a time; a value longer than the buffer doubles the next read
+CHUNK_SIZE = 1 << 16
+
+# Suffixes of newline-delimited JSON files, which hold one listing per line
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JsonRecordStream:
+    """
+    Iterates the listings of a raw JSON dump one at a time, without reading the whole file.
+
+    Three layouts are supported:
+
+    - Newline-delimited JSON, with one listing per line.
+    - A top-level array of listings.
+    - A top-level object holding the listings in an array under `items_key` (e.g. `{"batch_id": ...,
+      "properties": [...]}`). The other top-level fields are collected in `header` as they are read.
+      An object without that key is yielded whole, as a single listing.
+
+    Values are decoded with `json.JSONDecoder.raw_decode` over a sliding buffer, so only the listing
+    being decoded and one chunk of the file are held in memory, whatever the size of the dump.
+    """
+    def __init__(self, f: IO[str], items_key: str = 'properties', ndjson: bool = False):
+        """
+        Initializes the JsonRecordStream.
+
+        Args:
+            f (IO[str]): The dump, opened in text mode.
+            items_key (str, optional): The key of the listings array in a top-level object. Defaults to 'properties'.
+            ndjson (bool, optional): Whether the dump is newline-delimited JSON. Defaults to False.
+        """
+        self.f = f
+        self.items_key = items_key
+        self.ndjson = ndjson
+        self.header: Dict[str, Any] = {}
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    @classmethod
+    def open(cls, path: str, items_key: str = 'properties') -> 'JsonRecordStream':
+        """
+        Opens a dump, reading it as newline-delimited JSON if its suffix is '.ndjson' or '.jsonl'.
+        """
+        return cls(open(path, 'r', encoding='utf-8'), items_key, ndjson=path.endswith(NDJSON_SUFFIXES))
+
+    def close(self) -> None:
+        self.f.close()
+
+    def __enter__(self) -> 'JsonRecordStream':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Any]:
+        if self.ndjson:
+            for number, line in enumerate(self.f, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"Invalid JSON on line {number}: {e}") from e
+            return
+
+        first = self._peek()
+        if first == '[':
+            yield from self._iter_array()
+        elif first == '{':
+            yield from self._iter_object()
+        elif first is not None:
+            yield self._decode()
+        if self._peek() is not None:
+            raise ValueError(f"Unexpected data after the JSON document at offset {self._pos}.")
+
+    def _fill(self, size: int = CHUNK_SIZE) -> bool:
+        """
+        Appends the next characters of the file to the buffer, dropping the part already consumed.
+        """
+        if self._eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self) -> Any:
+        """
+        Skips whitespace and returns the next character, or None at the end of the file.
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if char is None or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self._pos}, found {char!r}.")
+        self._pos += 1
+        return char
+
+    def _decode(self) -> Any:
+        """
+        Decodes the value at the current position, reading more of the file until it is complete.
+
+        A value that ends exactly at the end of the buffer is only accepted at the end of the file,
+        since a number such as `12` could still continue in the next chunk.
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise ValueError(f"Invalid JSON at offset {self._pos}: {e}") from e
+            # Doubling the read keeps the decoding of a long value linear in its size
+            self._fill(max(CHUNK_SIZE, len(self._buffer) - self._pos))
+
+    def _iter_array(self) -> Iterator[Any]:
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._decode()
+            if self._expect(',]') == ']':
+                return
+
+    def _iter_object(self) -> Iterator[Any]:
+        self._expect('{')
+        found = False
+        if self._peek() != '}':
+            while True:
+                key = self._decode()
+                if not isinstance(key, str):
+                    raise ValueError(f"Expected an object key at offset {self._pos}.")
+                self._expect(':')
+                if key == self.items_key and self._peek() == '[':
+                    found = True
+                    yield from self._iter_array()
+                else:
+                    self.header[key] = self._decode()
+                if self._expect(',}') == '}':
+                    break
+        else:
+            self._pos += 1
+        if not found:
+            yield self.header
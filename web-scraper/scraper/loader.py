@@ -1,92 +1,539 @@
+import csv
+import io
 import json
-from psycopg2.extras import Json
+from concurrent.futures import ThreadPoolExecutor
 import psycopg2
+from scraper.columnar import read_table, table_to_copy_csv
+from scraper.jsonstream import JsonRecordStream
+from scraper.locations import LocationIndex
+from scraper.metrics import METRICS
 from scraper.utils import get_logger
 import os
-from typing import Dict
+import time
+import uuid
+from typing import IO, Dict, List, Optional, Tuple
 
 
-def load_json_to_db(path: str, db_config: Dict[str, str]) -> None:
+LOAD_MODES = ('transaction', 'savepoint')
+CONFLICT_ACTIONS = ('nothing', 'update')
+
+# The primary key of the landing table, which includes its partition key, and the columns filled in by the database
+LANDING_KEY = ('batch_id', 'property_id', 'batch_extraction_start')
+AUDIT_COLUMNS = ('created_at', 'created_by')
+
+
+def load_json_to_db(path: str, db_config: Dict[str, str], batch_size: int = 1000) -> int:
     """
-    Loads data from a JSON file into a PostgreSQL database.
+    Loads a raw JSON dump into the raw table, one row per listing, with bounded memory.
+
+    The dump is read incrementally by `JsonRecordStream` (NDJSON, a top-level array, or an object
+    holding the listings under `json_items_key`), and the listings are COPYed in batches of
+    `batch_size` rows as JSONB payloads, so no more than one batch is held in memory. The rows
+    previously loaded from a file with the same name are replaced in the same transaction, so a
+    dump can be reloaded safely.
 
     Args:
-        path (str): The path to the JSON file.
+        path (str): The path to the JSON or NDJSON file.
         db_config (Dict[str, str]): The database configuration.
+        batch_size (int, optional): Number of listings per COPY. Defaults to 1000.
+
+    Returns:
+        int: The number of listings loaded.
     """
     logger = get_logger(__name__)
-    logger.info("Reading JSON file ...")
 
-    with open(path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    target = f"{db_config['schema']}.{db_config.get('raw_table', 'properties_raw')}"
+    source_file = os.path.basename(path)
+    columns = ('source_file', 'item_number', 'batch_id', 'property_id', 'payload')
 
-    logger.info(f"JSON file read successfully: {path}")
     logger.info(f"Connecting to database: {db_config['dbname']}")
-    conn = psycopg2.connect(
+    conn = connect_db(db_config)
+    logger.info("Connected to the database successfully.")
+
+    logger.info(f"Streaming listings from {path} into {target} ...")
+    rows = 0
+    try:
+        with conn, conn.cursor() as cur, JsonRecordStream.open(path, db_config.get('json_items_key', 'properties')) as stream:
+            cur.execute(f"DELETE FROM {target} WHERE source_file = %s", (source_file,))
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            pending = 0
+            for item in stream:
+                fields = item if isinstance(item, dict) else {}
+                writer.writerow((
+                    source_file,
+                    rows,
+                    fields.get('batch_id', stream.header.get('batch_id')),
+                    fields.get('property_id'),
+                    json.dumps(item, ensure_ascii=False),
+                ))
+                rows += 1
+                pending += 1
+                if pending >= batch_size:
+                    _copy_raw_rows(cur, target, columns, buffer)
+                    buffer.seek(0)
+                    buffer.truncate()
+                    pending = 0
+            if pending:
+                _copy_raw_rows(cur, target, columns, buffer)
+
+            # A batch ID that follows the listings array in the dump is only known once it is read
+            if stream.header.get('batch_id') is not None:
+                cur.execute(
+                    f"UPDATE {target} SET batch_id = %s WHERE source_file = %s AND batch_id IS NULL",
+                    (str(stream.header['batch_id']), source_file)
+                )
+    except psycopg2.Error as e:
+        logger.error(f"Error loading {path}: {e.pgerror}")
+        raise
+    finally:
+        conn.close()
+
+    METRICS.increment('copy_load', 'files')
+    METRICS.add_bytes('copy_load', os.path.getsize(path))
+    logger.info(f"Loaded {rows} listings from {path}.")
+    return rows
+
+
+def _copy_raw_rows(cur: 'psycopg2.extensions.cursor', target: str, columns: Tuple[str, ...], buffer: io.StringIO) -> None:
+    buffer.seek(0)
+    with METRICS.timer('copy_load'):
+        cur.copy_expert(f"COPY {target} ({', '.join(columns)}) FROM STDIN WITH CSV", buffer)
+    METRICS.increment('copy_load', 'rows', cur.rowcount)
+
+
+def connect_db(db_config: Dict[str, str]) -> 'psycopg2.extensions.connection':
+    """
+    Opens a connection to the database of the configuration.
+    """
+    return psycopg2.connect(
         dbname=db_config['dbname'],
         user=db_config['user'],
         password=db_config['password'],
         host=db_config['host'],
         port=db_config['port']
     )
-    logger.info("Connected to the database successfully.")
-    conn.autocommit = True
-    cur = conn.cursor()
-
-    batch_id = data.get('batch_id')
-    logger.info(f"Inserting data into raw_data table with batch_id={batch_id} ...")
-    cur.execute(
-        f"""
-        INSERT INTO {db_config['schema']}.{db_config['table']} (batch_id, payload)
-        VALUES (%s, %s);
-        """,
-        (batch_id, Json(data))
-    )
 
-    logger.info("Data inserted successfully.")
 
-    cur.close()
-    conn.close()
+def read_csv_header(f: IO[str]) -> List[str]:
+    """
+    Reads the header line of an open CSV file and rewinds it, without reading the rest of the file.
+    """
+    header = next(csv.reader(f))
+    f.seek(0)
+    return header
 
 
-def load_csv_to_db(path: str, db_config: Dict[str, str]) -> None:
+def copy_file(cur: 'psycopg2.extensions.cursor', path: str, target: str) -> int:
     """
-    Loads data from a CSV file into a PostgreSQL database.
+    COPYs one batch file into a table through an open cursor.
+
+    CSV files are streamed to the server as they are read. Parquet and Arrow files are read with
+    pyarrow and serialized to CSV by Arrow's native writer, so no value is converted row by row in
+    Python. The COPY latency, the rows loaded and the size of the file are recorded in the
+    'copy_load' stage of the process metrics.
 
     Args:
-        path (str): The path to the CSV file.
+        cur (psycopg2.extensions.cursor): The cursor, whose transaction the rows are loaded in.
+        path (str): The path of the batch file.
+        target (str): The table to COPY into.
+
+    Returns:
+        int: The number of rows loaded.
+    """
+    with METRICS.timer('copy_load'):
+        if path.endswith('.csv'):
+            f = open(path, 'r', encoding='utf-8', newline='')
+            columns = read_csv_header(f)
+        else:
+            table = read_table(path)
+            columns = table.column_names
+            f = table_to_copy_csv(table)
+
+        with f:
+            cur.copy_expert(
+                f"""
+                COPY {target} ({', '.join(columns)})
+                FROM STDIN WITH CSV HEADER
+                """,
+                f
+            )
+
+    METRICS.increment('copy_load', 'files')
+    METRICS.increment('copy_load', 'rows', cur.rowcount)
+    METRICS.add_bytes('copy_load', os.path.getsize(path))
+    return cur.rowcount
+
+
+class BulkLoader:
+    """
+    Loads batch files into the landing table through a staged, idempotent merge.
+
+    Files are COPYed into an unlogged staging table, which has no primary key, so duplicate rows
+    never abort a COPY. The staged rows are then deduplicated in SQL, keeping the latest extraction of
+    every (batch_id, property_id), and merged with `INSERT ... ON CONFLICT`. Rows already in the
+    landing table are skipped, or updated from a later extraction when `on_conflict` is 'update', so a
+    retried load is safe.
+
+    With several workers the files are COPYed in parallel streams, one connection each, into the same
+    staging table. The merge then runs once, on a single connection, in one transaction that also
+    drops the staging table, so every call to `load` commits all of its files or none of them. In
+    'transaction' mode a failing file rolls the whole call back. In 'savepoint' mode every file is
+    staged in a savepoint, so a failing file is rolled back alone and the other files are still merged.
+    """
+    def __init__(
+        self,
+        db_config: Dict[str, str],
+        mode: str = 'transaction',
+        workers: int = 1,
+        on_conflict: str = 'nothing'
+    ):
+        """
+        Initializes the BulkLoader.
+
+        Args:
+            db_config (Dict[str, str]): The database configuration.
+            mode (str, optional): 'transaction' or 'savepoint'. Defaults to 'transaction'.
+            workers (int, optional): Number of parallel COPY streams, hence connections. Defaults to 1.
+            on_conflict (str, optional): 'nothing' keeps the rows already loaded, 'update' overwrites
+                them when they differ. Defaults to 'nothing'.
+        """
+        if mode not in LOAD_MODES:
+            raise ValueError(f"Unknown load mode '{mode}'. Expected one of {LOAD_MODES}.")
+        if on_conflict not in CONFLICT_ACTIONS:
+            raise ValueError(f"Unknown conflict action '{on_conflict}'. Expected one of {CONFLICT_ACTIONS}.")
+        self.db_config = db_config
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.on_conflict = on_conflict
+        self.target = f"{db_config['schema']}.{db_config['table']}"
+        self.stage: Optional[str] = None
+        self.logger = get_logger(__name__)
+        self._connections: List['psycopg2.extensions.connection'] = []
+        self._columns: Optional[List[str]] = None
+
+    def _get_connections(self, count: int) -> List['psycopg2.extensions.connection']:
+        while len(self._connections) < count:
+            self.logger.info(f"Connecting to database: {self.db_config['dbname']}")
+            self._connections.append(connect_db(self.db_config))
+        return self._connections[:count]
+
+    def _create_partitions(self, conn: 'psycopg2.extensions.connection') -> None:
+        """
+        Creates the missing monthly landing partitions for the range of `batch_extraction_start` in the staging table.
+
+        The partitions are created and committed before the merge, so rows of any age find their
+        partition. Creating a partition locks the landing table exclusively, so it is only done once
+        every stream has committed and released its locks.
+        """
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT {self.db_config['schema']}.create_{self.db_config['table']}_partitions(
+                    MIN(batch_extraction_start)::DATE, MAX(batch_extraction_start)::DATE
+                )
+                FROM {self.stage}
+                HAVING COUNT(batch_extraction_start) > 0
+                """
+            )
+            row = cur.fetchone()
+        if row is not None and row[0]:
+            self.logger.info(f"Created {row[0]} partitions of {self.target}.")
+
+    def _get_columns(self, cur: 'psycopg2.extensions.cursor') -> List[str]:
+        """
+        Returns the landing table columns that batch files provide, i.e. all but the audit columns.
+        """
+        if self._columns is None:
+            cur.execute(
+                """
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = %s AND table_name = %s
+                ORDER BY ordinal_position
+                """,
+                (self.db_config['schema'], self.db_config['table'])
+            )
+            self._columns = [name for (name,) in cur.fetchall() if name not in AUDIT_COLUMNS]
+        return self._columns
+
+    def _load_stream(self, conn: 'psycopg2.extensions.connection', paths: List[str]) -> Tuple[Dict[str, int], Dict[str, Exception]]:
+        """
+        COPYs files one after the other into the staging table, and commits the staged rows.
+
+        Staged rows only become part of the landing table through the merge, so committing them
+        is what lets the merge connection see the rows of every stream.
+        """
+        loaded: Dict[str, int] = {}
+        failed: Dict[str, Exception] = {}
+        try:
+            with conn.cursor() as cur:
+                for path in paths:
+                    self.logger.info(f"Staging data from file {os.path.basename(path)} ...")
+                    if self.mode == 'savepoint':
+                        cur.execute("SAVEPOINT load_file")
+                    try:
+                        loaded[path] = copy_file(cur, path, self.stage)
+                    except Exception as e:
+                        # Also catches unreadable Parquet and Arrow files, which fail in pyarrow before the COPY
+                        METRICS.increment('copy_load', 'failed_files')
+                        if isinstance(e, psycopg2.Error):
+                            self.logger.error(f"Error staging data from {os.path.basename(path)}: {e.pgerror}")
+                            if e.diag.message_detail:
+                                self.logger.error(f"Diagnostics: {e.diag.message_detail}")
+                        else:
+                            self.logger.error(f"Error staging data from {os.path.basename(path)}: {e}")
+                        if self.mode != 'savepoint':
+                            raise
+                        cur.execute("ROLLBACK TO SAVEPOINT load_file")
+                        failed[path] = e
+                        continue
+                    if self.mode == 'savepoint':
+                        cur.execute("RELEASE SAVEPOINT load_file")
+                    self.logger.info(f"Staged {loaded[path]} rows from {os.path.basename(path)}.")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return loaded, failed
+
+    def _sweep_stages(self, conn: 'psycopg2.extensions.connection') -> None:
+        """
+        Drops the staging tables left behind by loads that were killed or lost their connection.
+
+        Staging tables are named after their creation time, so only tables older than
+        `stage_max_age_hours` are dropped; those of loads still running are left alone.
+        """
+        cutoff = time.time() - self.db_config.get('stage_max_age_hours', 24) * 3600
+        prefix = f"{self.db_config['table']}_stage_"
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT tablename FROM pg_tables WHERE schemaname = %s AND starts_with(tablename, %s)",
+                (self.db_config['schema'], prefix)
+            )
+            for (name,) in cur.fetchall():
+                created = name[len(prefix):].split('_')[0]
+                if created.isdigit() and int(created) < cutoff:
+                    self.logger.info(f"Dropping the staging table {name} left by an interrupted load.")
+                    cur.execute(f"DROP TABLE IF EXISTS {self.db_config['schema']}.{name}")
+
+    def _create_stage(self, conn: 'psycopg2.extensions.connection') -> None:
+        """
+        Creates the staging table of a load, visible to every stream.
+        """
+        # Unlogged tables skip the WAL; the name is unique so concurrent loaders never share a table,
+        # and starts with the creation time so that orphaned tables can be swept by age
+        self.stage = f"{self.target}_stage_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        with conn, conn.cursor() as cur:
+            cur.execute(f"CREATE UNLOGGED TABLE {self.stage} (LIKE {self.target} INCLUDING DEFAULTS)")
+
+    def _drop_stage(self, conn: 'psycopg2.extensions.connection') -> None:
+        """
+        Drops the staging table after a failed load, logging rather than raising any error so the
+        error of the load is not hidden. A table that cannot be dropped is swept by a later load.
+        """
+        try:
+            conn.rollback()
+            with conn, conn.cursor() as cur:
+                cur.execute(f"DROP TABLE IF EXISTS {self.stage}")
+        except psycopg2.Error as e:
+            self.logger.error(f"Could not drop the staging table {self.stage}: {e}")
+        self.stage = None
+
+    def _merge(self, conn: 'psycopg2.extensions.connection') -> Dict[str, int]:
+        """
+        Deduplicates the staging table and merges it into the landing table, in the open transaction of the connection.
+
+        Returns:
+            Dict[str, int]: The number of staged, duplicate, inserted, conflicting and updated rows.
+        """
+        with conn.cursor() as cur, METRICS.timer('merge'):
+            columns = self._get_columns(cur)
+            column_list = ', '.join(columns)
+            key_list = ', '.join(LANDING_KEY)
+            if self.on_conflict == 'update':
+                values = [name for name in columns if name not in LANDING_KEY]
+                action = f"""
+                    DO UPDATE SET {', '.join(f'{name} = EXCLUDED.{name}' for name in values)}
+                    WHERE landing.property_extraction_start <= EXCLUDED.property_extraction_start
+                    AND ({', '.join(f'landing.{name}' for name in values)})
+                        IS DISTINCT FROM ({', '.join(f'EXCLUDED.{name}' for name in values)})
+                """
+            else:
+                action = "DO NOTHING"
+
+            cur.execute(
+                f"""
+                WITH deduplicated AS (
+                    SELECT DISTINCT ON ({key_list}) {column_list}
+                    FROM {self.stage}
+                    ORDER BY {key_list}, property_extraction_start DESC
+                ),
+                merged AS (
+                    INSERT INTO {self.target} AS landing ({column_list})
+                    SELECT {column_list} FROM deduplicated
+                    ON CONFLICT ({key_list}) {action}
+                    RETURNING 1
+                )
+                -- Every part of the statement sees the landing table as it was before the insert;
+                -- partitioned tables cannot return xmax to tell inserted rows from updated ones
+                SELECT
+                    (SELECT count(*) FROM {self.stage}),
+                    (SELECT count(*) FROM deduplicated),
+                    (SELECT count(*) FROM deduplicated INNER JOIN {self.target} USING ({key_list})),
+                    (SELECT count(*) FROM merged)
+                """
+            )
+            staged, unique, conflicting, written = cur.fetchone()
+
+        counts = {
+            'staged': staged,
+            'duplicates': staged - unique,
+            'inserted': unique - conflicting,
+            'conflicting': conflicting,
+            'updated': written - (unique - conflicting),
+        }
+        for name, value in counts.items():
+            METRICS.increment('merge', name, value)
+        return counts
+
+    def load(self, paths: List[str]) -> Tuple[Dict[str, int], Dict[str, Exception], Dict[str, int]]:
+        """
+        Stages files and merges them into the landing table.
+
+        Args:
+            paths (List[str]): The batch files to load.
+
+        Returns:
+            Tuple[Dict[str, int], Dict[str, Exception], Dict[str, int]]: The rows staged per committed
+                file, the error of every file rolled back in 'savepoint' mode, and the merge counts:
+                'staged' rows, 'duplicates' within the files, 'inserted' rows, 'conflicting' rows that
+                were already loaded, and the conflicting rows 'updated' in place.
+
+        Raises:
+            Exception: In 'transaction' mode, the error of the first failing file; nothing is committed.
+        """
+        counts = dict.fromkeys(('staged', 'duplicates', 'inserted', 'conflicting', 'updated'), 0)
+        if not paths:
+            return {}, {}, counts
+
+        # Round-robin keeps the streams balanced when the parts have similar sizes
+        streams = [paths[i::self.workers] for i in range(min(self.workers, len(paths)))]
+        connections = self._get_connections(len(streams))
+
+        loaded: Dict[str, int] = {}
+        failed: Dict[str, Exception] = {}
+        self._sweep_stages(connections[0])
+        self._create_stage(connections[0])
+        try:
+            if len(streams) == 1:
+                results = [self._load_stream(connections[0], streams[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=len(streams)) as executor:
+                    futures = [executor.submit(self._load_stream, conn, stream) for conn, stream in zip(connections, streams)]
+                    results = [future.result() for future in futures]
+            for stream_loaded, stream_failed in results:
+                loaded.update(stream_loaded)
+                failed.update(stream_failed)
+
+            # A single transaction merges the rows of every stream and drops the staging table
+            conn = connections[0]
+            self._create_partitions(conn)
+            counts = self._merge(conn)
+            with conn.cursor() as cur:
+                cur.execute(f"DROP TABLE {self.stage}")
+            conn.commit()
+            self.stage = None
+        finally:
+            if self.stage is not None:
+                self._drop_stage(connections[0])
+
+        self.logger.info(
+            f"Merged {counts['staged']} staged rows: {counts['inserted']} inserted, "
+            f"{counts['duplicates']} duplicates skipped, {counts['conflicting']} already loaded "
+            f"({counts['updated']} updated)."
+        )
+        return loaded, failed, counts
+
+    def close(self) -> None:
+        """
+        Closes the connections.
+        """
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+    def __enter__(self) -> 'BulkLoader':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def load_csv_to_db(path: str, db_config: Dict[str, str]) -> int:
+    """
+    Loads data from a batch file (CSV, Parquet or Arrow) into a PostgreSQL database in one transaction.
+
+    Args:
+        path (str): The path to the file.
+        db_config (Dict[str, str]): The database configuration.
+
+    Returns:
+        int: The number of rows loaded.
+    """
+    with BulkLoader(db_config, on_conflict=db_config.get('on_conflict', 'nothing')) as loader:
+        loaded, _, _ = loader.load([path])
+    return loaded[path]
+
+
+def load_locations_to_db(location_index: LocationIndex, db_config: Dict[str, str]) -> None:
+    """
+    Reloads the location dimension tables from the location index in a single transaction.
+
+    The landing table receives the filtered ubigeo rows through COPY, and the clean table is rebuilt
+    from it, so readers never see a partially loaded dimension.
+
+    Args:
+        location_index (LocationIndex): The location dimension.
         db_config (Dict[str, str]): The database configuration.
     """
     logger = get_logger(__name__)
 
+    schema = db_config['schema']
+    landing_table = db_config.get('locations_landing_table', 'locations_landing')
+    clean_table = db_config.get('locations_clean_table', 'locations_clean')
+
     logger.info(f"Connecting to database: {db_config['dbname']}")
-    conn = psycopg2.connect(
-        dbname=db_config['dbname'],
-        user=db_config['user'],
-        password=db_config['password'],
-        host=db_config['host'],
-        port=db_config['port']
-    )
+    conn = connect_db(db_config)
     logger.info("Connected to the database successfully.")
-    conn.autocommit = True
-    cur = conn.cursor()
 
-    logger.info(f"Inserting data into landing table from file {os.path.basename(path)} ...")
+    logger.info(f"Loading {len(location_index)} locations into {schema}.{landing_table} and {schema}.{clean_table} ...")
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            reader = f.read()
-            header = reader.splitlines()[0].split(',')
-            columns = ', '.join(header)
-
-        with open(path, 'r', encoding='utf-8') as f:
-            sql_expr = f"""
-                COPY {db_config['schema']}.{db_config['table']} ({columns})
-                FROM STDIN WITH CSV HEADER
-            """
-            cur.copy_expert(sql_expr, f)
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(f"TRUNCATE TABLE {schema}.{landing_table}, {schema}.{clean_table}")
+                cur.copy_expert(
+                    f"""
+                    COPY {schema}.{landing_table} ({', '.join(location_index.header)})
+                    FROM STDIN WITH CSV HEADER
+                    """,
+                    location_index.to_csv()
+                )
+                cur.execute(
+                    f"""
+                    INSERT INTO {schema}.{clean_table}
+                    SELECT
+                        inei AS location_code,
+                        departamento AS region,
+                        provincia AS city,
+                        distrito AS district
+                    FROM {schema}.{landing_table}
+                    """
+                )
     except psycopg2.Error as e:
-        logger.error(f"Error inserting data: {e.pgerror}")
-        logger.error(f"Diagnostics: {e.diag.message_detail}")
+        logger.error(f"Error loading locations: {e.pgerror}")
         raise
+    finally:
+        conn.close()
 
-    logger.info("Data inserted successfully.")
\ No newline at end of file
+    logger.info("Locations loaded successfully.")
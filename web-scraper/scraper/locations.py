@@ -0,0 +1,218 @@
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import requests
+
+from scraper.metrics import METRICS
+from scraper.utils import get_logger
+
+
+LOCATIONS_URL = "https://raw.githubusercontent.com/jmcastagnetto/ubigeo-peru-aumentado/refs/heads/main/ubigeo_distrito.csv"
+LOCATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'locations')
+LOCATIONS_CSV = os.path.join(LOCATIONS_DIR, 'ubigeo_distrito.csv')
+
+# Districts whose name in the search URLs differs from the ubigeo name
+DISTRICT_SEARCH_MAPPING = {
+    "LIMA": "LIMA CERCADO",
+    "CARMEN DE LA LEGUA REYNOSO": "CARMEN DE LA LEGUA",
+    "ATE": "ATE VITARTE",
+    "BREÑA": "BRENA",
+    "MAGDALENA DEL MAR": "MAGDALENA",
+    "LURIGANCHO": "CHOSICA LURIGANCHO",
+}
+
+
+class Location(NamedTuple):
+    """
+    A district of the location dimension.
+    """
+    location_code: str
+    region: str
+    city: str
+    district: str
+    search_slug: str
+
+
+def get_search_slug(region: str, city: str, district: str) -> str:
+    """
+    Returns the `district--city--region` slug of the search URLs of a district.
+    """
+    district_search = DISTRICT_SEARCH_MAPPING.get(district, district)
+    return "--".join(name.lower().replace(' ', '-') for name in (district_search, city, region))
+
+
+def ensure_locations_csv(
+    url: str = LOCATIONS_URL,
+    path: str = LOCATIONS_CSV,
+    max_age_hours: Optional[float] = 168
+) -> str:
+    """
+    Returns the path of a local copy of the ubigeo CSV, downloading it only when needed.
+
+    A copy younger than `max_age_hours` is used as is, without any request. An older copy is revalidated
+    with its ETag and Last-Modified validators, so an unchanged file costs a single 304 response. If the
+    download fails, a stale copy is used rather than failing the run.
+
+    Args:
+        url (str, optional): The URL of the CSV. Defaults to the ubigeo-peru-aumentado district file.
+        path (str, optional): The path of the local copy. Defaults to `data/locations/ubigeo_distrito.csv`.
+        max_age_hours (Optional[float], optional): Age after which the copy is revalidated. None never
+            revalidates an existing copy. Defaults to 168 (one week).
+
+    Returns:
+        str: The path of the local copy.
+    """
+    logger = get_logger(__name__)
+    meta_path = path + '.meta.json'
+
+    meta = {}
+    if os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        age_hours = (time.time() - meta.get('checked_at', 0)) / 3600
+        if max_age_hours is None or age_hours <= max_age_hours:
+            logger.info(f"Using cached location data from {path}.")
+            return path
+
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    logger.info("Fetching location data ...")
+    try:
+        response = requests.get(url, headers=headers, timeout=(10, 60))
+        response.raise_for_status()
+    except requests.RequestException as e:
+        METRICS.increment('location_fetch', 'failed')
+        if os.path.exists(path):
+            logger.error(f"Could not revalidate location data ({e}). Using the cached copy.")
+            return path
+        raise
+
+    METRICS.increment('location_fetch', 'requests')
+    METRICS.add_bytes('location_fetch', len(response.content))
+    if response.status_code == 304:
+        METRICS.increment('location_fetch', 'not_modified')
+        logger.info("Location data did not change since the last download.")
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(response.content)
+        os.replace(tmp_path, path)
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'downloaded_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        logger.info(f"Location data downloaded to {path}.")
+
+    meta['checked_at'] = time.time()
+    tmp_meta_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta_path, meta_path)
+    return path
+
+
+class LocationIndex:
+    """
+    The district dimension, parsed once from the ubigeo CSV and indexed for lookups.
+
+    Districts are indexed by (region, city, district), by (region, city) and by region, and carry
+    their precomputed search URL slug.
+    """
+    def __init__(self, header: List[str], rows: List[List[str]]):
+        """
+        Initializes the LocationIndex from the parsed CSV.
+
+        Args:
+            header (List[str]): The CSV header.
+            rows (List[List[str]]): The CSV rows of districts with a known INEI and RENIEC code.
+        """
+        self.header = header
+        self.rows = rows
+
+        self.locations: List[Location] = []
+        self._by_key: Dict[Tuple[str, str, str], Location] = {}
+        self._by_city: Dict[Tuple[str, str], List[Location]] = {}
+        self._by_region: Dict[str, List[Location]] = {}
+        for row in rows:
+            location_code, region, city, district = row[0], row[2], row[3], row[4]
+            location = Location(location_code, region, city, district, get_search_slug(region, city, district))
+            self.locations.append(location)
+            self._by_key[(region, city, district)] = location
+            self._by_city.setdefault((region, city), []).append(location)
+            self._by_region.setdefault(region, []).append(location)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None, max_age_hours: Optional[float] = 168) -> 'LocationIndex':
+        """
+        Loads the index from the local copy of the ubigeo CSV, downloading it first if needed.
+
+        Args:
+            path (Optional[str], optional): A CSV file to load instead of the cached download. Defaults to None.
+            max_age_hours (Optional[float], optional): Age after which the cached download is revalidated.
+                Defaults to 168.
+
+        Returns:
+            LocationIndex: The index.
+        """
+        if path is None:
+            path = ensure_locations_csv(max_age_hours=max_age_hours)
+
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = [row for row in reader if row[0] != 'NA' and row[1] != 'NA']
+        return cls(header, rows)
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def __iter__(self) -> Iterator[Location]:
+        return iter(self.locations)
+
+    def get(self, region: str, city: str, district: str) -> Optional[Location]:
+        """
+        Returns a district, or None if it is not in the dimension.
+        """
+        return self._by_key.get((region, city, district))
+
+    def in_city(self, region: str, city: str) -> List[Location]:
+        """
+        Returns the districts of a city (province).
+        """
+        return self._by_city.get((region, city), [])
+
+    def in_region(self, region: str) -> List[Location]:
+        """
+        Returns the districts of a region (department).
+        """
+        return self._by_region.get(region, [])
+
+    def get_search_slug(self, region: str, city: str, district: str) -> str:
+        """
+        Returns the precomputed search URL slug of a district.
+        """
+        location = self.get(region, city, district)
+        return location.search_slug if location is not None else get_search_slug(region, city, district)
+
+    def to_csv(self) -> io.StringIO:
+        """
+        Returns the indexed rows as an in-memory CSV with header, ready for COPY.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.header)
+        writer.writerows(self.rows)
+        buffer.seek(0)
+        return buffer
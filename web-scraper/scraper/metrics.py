@@ -0,0 +1,316 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+
+METRICS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'metrics')
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """
+    A fixed-bucket latency histogram that also keeps the count, sum, minimum and maximum.
+    """
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket collects everything above the bounds
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Returns the upper bound of the bucket holding the q-quantile (the maximum for the last bucket).
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def merge(self, data: Dict[str, Any]) -> None:
+        """
+        Adds the observations of a histogram exported with `to_dict`.
+        """
+        for i, count in enumerate(data['buckets'].values()):
+            self.counts[i] += count
+        self.count += data['count']
+        self.sum += data['sum_seconds']
+        for attr, pick in (('min', min), ('max', max)):
+            value = data[f'{attr}_seconds']
+            if value is not None:
+                current = getattr(self, attr)
+                setattr(self, attr, value if current is None else pick(current, value))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'sum_seconds': round(self.sum, 6),
+            'mean_seconds': round(self.sum / self.count, 6) if self.count else None,
+            'min_seconds': self.min,
+            'max_seconds': self.max,
+            'p50_seconds': self.quantile(0.5),
+            'p95_seconds': self.quantile(0.95),
+            'p99_seconds': self.quantile(0.99),
+            'buckets': {
+                **{str(bound): count for bound, count in zip(self.buckets, self.counts)},
+                '+Inf': self.counts[-1],
+            },
+        }
+
+
+class MetricsRegistry:
+    """
+    A thread-safe registry of per-stage timings, counters and byte counts.
+
+    Every stage (e.g. 'detail_fetch' or 'copy_load') has a latency histogram fed by `timer` or
+    `observe`, free-form counters fed by `increment`, and a byte count fed by `add_bytes`.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._bytes: Dict[str, int] = {}
+
+    def reset(self) -> None:
+        """
+        Clears every metric and restarts the wall clock.
+        """
+        with self._lock:
+            self._started = time.time()
+            self._histograms.clear()
+            self._counters.clear()
+            self._bytes.clear()
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """
+        Times the enclosed block and records it in the histogram of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, stage: str, name: str, value: int = 1) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(stage, {})
+            counters[name] = counters.get(name, 0) + value
+
+    def add_bytes(self, stage: str, n_bytes: int) -> None:
+        with self._lock:
+            self._bytes[stage] = self._bytes.get(stage, 0) + n_bytes
+
+    def merge(self, summary: Dict[str, Any]) -> None:
+        """
+        Adds the stages of a summary produced by another registry, e.g. by a shard process.
+        """
+        with self._lock:
+            for stage, data in summary.get('stages', {}).items():
+                if data.get('latency'):
+                    self._histograms.setdefault(stage, Histogram()).merge(data['latency'])
+                counters = self._counters.setdefault(stage, {})
+                for name, value in data.get('counters', {}).items():
+                    counters[name] = counters.get(name, 0) + value
+                if data.get('bytes'):
+                    self._bytes[stage] = self._bytes.get(stage, 0) + data['bytes']
+
+    def summary(self, rows: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Returns the metrics of every stage, and the throughput of the run if the number of rows is given.
+
+        Args:
+            rows (Optional[int], optional): The number of rows produced by the run. Defaults to None.
+
+        Returns:
+            Dict[str, Any]: The summary.
+        """
+        with self._lock:
+            finished = time.time()
+            duration = finished - self._started
+            stages: Dict[str, Dict[str, Any]] = {}
+            for stage in sorted(set(self._histograms) | set(self._counters) | set(self._bytes)):
+                histogram = self._histograms.get(stage)
+                data: Dict[str, Any] = {
+                    'latency': histogram.to_dict() if histogram else None,
+                    'counters': dict(sorted(self._counters.get(stage, {}).items())),
+                    'bytes': self._bytes.get(stage, 0),
+                }
+                if histogram and histogram.count:
+                    # Throughput over the wall clock of the run, which includes concurrency
+                    data['per_second'] = round(histogram.count / duration, 3) if duration > 0 else None
+                stages[stage] = data
+
+        summary: Dict[str, Any] = {
+            'started_at': datetime.fromtimestamp(self._started).strftime("%Y-%m-%d %H:%M:%S"),
+            'finished_at': datetime.fromtimestamp(finished).strftime("%Y-%m-%d %H:%M:%S"),
+            'duration_seconds': round(duration, 3),
+        }
+        if rows is not None:
+            summary['rows'] = rows
+            summary['rows_per_second'] = round(rows / duration, 3) if duration > 0 else None
+        summary['stages'] = stages
+        return summary
+
+
+# The registry of the current process
+METRICS = MetricsRegistry()
+
+
+def get_summary_path(batch_id: str, metrics_dir: str = METRICS_DIR) -> str:
+    return os.path.join(metrics_dir, f'{batch_id}.json')
+
+
+def read_summary(path: str) -> Dict[str, Any]:
+    """
+    Reads a summary file, or returns an empty summary if it does not exist.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_summary(batch_id: str, section: str, summary: Dict[str, Any], path: Optional[str] = None) -> str:
+    """
+    Stores the summary of one component (e.g. 'scrape' or 'load') in the JSON summary of a batch.
+
+    The summary file of a batch holds one section per component, so the loader adds its numbers next
+    to the scraper's.
+
+    Args:
+        batch_id (str): The ID of the batch.
+        section (str): The component the summary belongs to.
+        summary (Dict[str, Any]): The summary returned by `MetricsRegistry.summary`.
+        path (Optional[str], optional): The summary file. Defaults to `data/metrics/<batch_id>.json`.
+
+    Returns:
+        str: The path of the summary file.
+    """
+    path = path or get_summary_path(batch_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    data = read_summary(path)
+    data['batch_id'] = batch_id
+    data[section] = summary
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _labels(**labels: str) -> str:
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def write_prometheus_textfile(path: str, batch_id: str, section: str, summary: Dict[str, Any]) -> None:
+    """
+    Writes a summary in the Prometheus text exposition format, for the node_exporter textfile collector.
+
+    The file is replaced atomically, so the collector never reads a partial file.
+
+    Args:
+        path (str): The `.prom` file to write.
+        batch_id (str): The ID of the batch.
+        section (str): The component the summary belongs to, used as the `component` label.
+        summary (Dict[str, Any]): The summary returned by `MetricsRegistry.summary`.
+    """
+    lines: List[str] = [
+        '# HELP reap_batch_info The last batch processed by the component.',
+        '# TYPE reap_batch_info gauge',
+        f'reap_batch_info{_labels(component=section, batch_id=batch_id)} 1',
+        '# HELP reap_batch_duration_seconds Wall-clock duration of the last batch.',
+        '# TYPE reap_batch_duration_seconds gauge',
+        f'reap_batch_duration_seconds{_labels(component=section)} {summary["duration_seconds"]}',
+    ]
+    if summary.get('rows') is not None:
+        lines += [
+            '# HELP reap_batch_rows Rows produced by the last batch.',
+            '# TYPE reap_batch_rows gauge',
+            f'reap_batch_rows{_labels(component=section)} {summary["rows"]}',
+            '# HELP reap_batch_rows_per_second Rows per second of the last batch.',
+            '# TYPE reap_batch_rows_per_second gauge',
+            f'reap_batch_rows_per_second{_labels(component=section)} {summary["rows_per_second"] or 0}',
+        ]
+
+    lines += ['# HELP reap_stage_seconds Latency of the operations of each stage.', '# TYPE reap_stage_seconds histogram']
+    for stage, data in summary['stages'].items():
+        latency = data.get('latency')
+        if not latency:
+            continue
+        cumulative = 0
+        for bound, count in latency['buckets'].items():
+            cumulative += count
+            lines.append(f'reap_stage_seconds_bucket{_labels(component=section, stage=stage, le=bound)} {cumulative}')
+        lines.append(f'reap_stage_seconds_sum{_labels(component=section, stage=stage)} {latency["sum_seconds"]}')
+        lines.append(f'reap_stage_seconds_count{_labels(component=section, stage=stage)} {latency["count"]}')
+
+    lines += ['# HELP reap_stage_events Events counted in each stage.', '# TYPE reap_stage_events gauge']
+    for stage, data in summary['stages'].items():
+        for name, value in data.get('counters', {}).items():
+            lines.append(f'reap_stage_events{_labels(component=section, stage=stage, event=name)} {value}')
+
+    lines += ['# HELP reap_stage_bytes Bytes transferred in each stage.', '# TYPE reap_stage_bytes gauge']
+    for stage, data in summary['stages'].items():
+        if data.get('bytes'):
+            lines.append(f'reap_stage_bytes{_labels(component=section, stage=stage)} {data["bytes"]}')
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+
+def emit_batch_metrics(
+    batch_id: str,
+    section: str,
+    summary: Dict[str, Any],
+    textfile_dir: Optional[str] = None
+) -> str:
+    """
+    Writes the JSON summary of a batch and, if a textfile directory is configured, the Prometheus textfile.
+
+    Args:
+        batch_id (str): The ID of the batch.
+        section (str): The component the summary belongs to ('scrape' or 'load').
+        summary (Dict[str, Any]): The summary returned by `MetricsRegistry.summary`.
+        textfile_dir (Optional[str], optional): The directory of `reap_<section>.prom`. Defaults to None.
+
+    Returns:
+        str: The path of the JSON summary.
+    """
+    path = write_summary(batch_id, section, summary)
+    if textfile_dir:
+        write_prometheus_textfile(os.path.join(textfile_dir, f'reap_{section}.prom'), batch_id, section, summary)
+    return path
@@ -1,6 +1,93 @@
+import math
+import re
 from bs4 import BeautifulSoup
+from lxml import etree
+from scraper.record import PropertyRecord
 from scraper.utils import get_logger
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple, Union
+
+
+SCOPES = ('property',)
+
+
+def _is_property_anchor(element: etree._Element) -> bool:
+    element_class = element.get('class')
+    if element.tag == 'div':
+        return (
+            element.get('id') == 'article-container'
+            or element_class == 'section-location-property section-location-property-classified'
+            or element_class == 'section-location no-location'
+        )
+    return element.tag == 'ul' and element.get('id') == 'section-icon-features-property'
+
+
+def scope_html(content: Union[str, bytes], scope: str) -> str:
+    """
+    Cuts a page down to the subtrees its parser reads.
+
+    The page is parsed once with lxml, which is much cheaper than building a full BeautifulSoup
+    tree, and only the relevant subtrees of a property page are serialized into a small document:
+    the article container, the parents of the price containers (so `:last-child` still sees their
+    siblings), the location sections and the feature list. Nested subtrees are only kept once, in
+    document order.
+
+    Search pages are not scoped: their result cards make up most of the page, so the second parse
+    costs more than the smaller tree saves.
+
+    Args:
+        content (Union[str, bytes]): The HTML content of the page.
+        scope (str): 'property'.
+
+    Returns:
+        str: The scoped HTML document.
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown scope '{scope}'. Expected one of {SCOPES}.")
+
+    try:
+        root = etree.HTML(content)
+    except ValueError:
+        # Unicode strings with an XML encoding declaration have to be parsed as bytes
+        root = etree.HTML(content.encode('utf-8'))
+    if root is None:
+        return ""
+
+    positions: Dict[etree._Element, int] = {}
+    anchors = []
+    for position, element in enumerate(root.iter()):
+        if not isinstance(element.tag, str):
+            continue
+        positions[element] = position
+        if _is_property_anchor(element):
+            anchors.append(element)
+        elif element.get('class') == 'price-item-container':
+            anchors.append(element.getparent())
+
+    anchor_set = set(anchors)
+    kept = [
+        anchor for anchor in anchor_set
+        if not any(ancestor in anchor_set for ancestor in anchor.iterancestors())
+    ]
+    kept.sort(key=positions.__getitem__)
+
+    body = "".join(etree.tostring(anchor, encoding='unicode', method='html', with_tail=False) for anchor in kept)
+    return f"<html><body>{body}</body></html>"
+
+
+def make_soup(content: Union[str, bytes], scope: Optional[str] = None) -> BeautifulSoup:
+    """
+    Builds the BeautifulSoup tree of a page, optionally scoped to the subtrees its parser reads.
+
+    Args:
+        content (Union[str, bytes]): The HTML content of the page.
+        scope (Optional[str], optional): 'property', or None to parse the whole page. Defaults to None.
+
+    Returns:
+        BeautifulSoup: The parsed page.
+    """
+    if scope is None:
+        return BeautifulSoup(content, 'lxml')
+    return BeautifulSoup(scope_html(content, scope), 'lxml')
 
 
 class SearchPageParser:
@@ -17,6 +104,59 @@ class SearchPageParser:
         self.soup = soup
         self.logger = get_logger(__name__)
 
+    def get_total_results(self) -> Optional[int]:
+        """
+        Extracts the total number of results from the results title (e.g. "1.234 Departamentos en alquiler").
+
+        Returns:
+            Optional[int]: The total number of results, or None if not found.
+        """
+        self.logger.info("Parsing total results ...")
+        element = self.soup.select_one("h1")
+        if element is None:
+            self.logger.error("Results title not found.")
+            return None
+        match = re.match(r"\s*(\d[\d.,]*)", element.get_text())
+        if match is None:
+            self.logger.error("Total results not found in the results title.")
+            return None
+        return int(re.sub(r"[.,]", "", match.group(1)))
+
+    def get_last_page_number(self) -> Optional[int]:
+        """
+        Extracts the highest page number linked from the paging module.
+
+        The paging module only links the pages around the current one, so this is a lower bound of the
+        number of pages.
+
+        Returns:
+            Optional[int]: The highest linked page number, or None if the page has no paging module.
+        """
+        self.logger.info("Parsing last page number ...")
+        numbers = [
+            int(text) for text in (
+                element.get_text(strip=True) for element in self.soup.select("a[class^='paging-module__page-item']")
+            ) if text.isdigit()
+        ]
+        return max(numbers) if numbers else None
+
+    def get_total_pages(self) -> Tuple[Optional[int], bool]:
+        """
+        Estimates the number of result pages from the first search page.
+
+        The total number of results divided by the number of cards on the page gives the exact number of
+        pages. Without a result count, the highest linked page number is used as a lower bound.
+
+        Returns:
+            Tuple[Optional[int], bool]: The number of pages (None if it cannot be estimated), and whether
+                it is exact rather than a lower bound.
+        """
+        total_results = self.get_total_results()
+        page_size = len(self.soup.select("h3[class='postingCard-module__posting-description'] > a"))
+        if total_results is not None and page_size > 0:
+            return max(1, math.ceil(total_results / page_size)), True
+        return self.get_last_page_number(), False
+
     def get_current_page_number(self) -> int:
         """
         Extracts the current page number from the search results.
@@ -56,8 +196,80 @@ class SearchPageParser:
         elements = self.soup.select("h3[class='postingCard-module__posting-description'] > a")
         return [element['href'] for element in elements]
 
+    def get_cards(self) -> List[Tuple[str, Optional[str]]]:
+        """
+        Extracts all property links together with the text of their search result card.
+
+        The card text summarizes the listing (price, features, location) and is used to detect
+        listings that did not change since the last crawl.
 
-class PropertyPageParser:
+        Returns:
+            List[Tuple[str, Optional[str]]]: A list of (link, card text) tuples. The card text is None
+                if the card container is not found.
+        """
+        self.logger.info("Parsing cards ...")
+        elements = self.soup.select("h3[class='postingCard-module__posting-description'] > a")
+        cards = []
+        for element in elements:
+            card = element.find_parent(attrs={"data-qa": "posting PROPERTY"})
+            cards.append((element['href'], card.get_text(" ", strip=True) if card is not None else None))
+        return cards
+
+
+class PropertyRecordMixin:
+    """
+    Builds the PropertyRecord of a property detail page from the field methods of a parser.
+    """
+    def to_record(
+        self,
+        batch_id: str,
+        batch_extraction_start: str,
+        property_id: str,
+        property_extraction_start: str,
+        property_type: str,
+        region: str,
+        city: str,
+        district: str,
+        link: str
+    ) -> PropertyRecord:
+        """
+        Extracts the remaining fields of the page into a record.
+
+        The property type is passed in because callers read it first to skip buildings.
+
+        Returns:
+            PropertyRecord: The record of the listing.
+        """
+        price_type, price_pen, price_usd = self.get_price()
+        additional_expense = self.get_additional_expense()
+        address = self.get_address()
+        total_size, covered_size, bedrooms, bathrooms, half_bathrooms, parking_spaces, age = self.get_main_features()
+        return PropertyRecord(
+            batch_id=batch_id,
+            batch_extraction_start=batch_extraction_start,
+            property_id=property_id,
+            property_extraction_start=property_extraction_start,
+            property_type=property_type,
+            price_type=price_type,
+            price_pen=price_pen,
+            price_usd=price_usd,
+            additional_expense=additional_expense,
+            address=address,
+            region=region,
+            city=city,
+            district=district,
+            total_size=total_size,
+            covered_size=covered_size,
+            bedrooms=bedrooms,
+            bathrooms=bathrooms,
+            half_bathrooms=half_bathrooms,
+            parking_spaces=parking_spaces,
+            age=age,
+            link=link
+        )
+
+
+class PropertyPageParser(PropertyRecordMixin):
     """
     A parser for extracting data from property detail pages.
     """
@@ -175,3 +387,205 @@ class PropertyPageParser:
                     age = int(quantity)
         # self.logger.info(f"Main Features - Total Size: {total_size}, Covered Size: {covered_size}, Bedrooms: {bedrooms}, Bathrooms: {bathrooms}, Half Bathrooms: {half_bathrooms}, Parking Spaces: {parking_spaces}, Age: {age}")
         return total_size, covered_size, bedrooms, bathrooms, half_bathrooms, parking_spaces, age
+
+
+# Precompiled XPath expressions used by LxmlPropertyPageParser. Each one runs relative to an anchor
+# element found during the single traversal of the document, never over the whole tree.
+_TEXT_NODES = etree.XPath(".//text()")
+_STRING_VALUE = etree.XPath("string()")
+_HAS_NEXT_ELEMENT = etree.XPath("boolean(following-sibling::*)")
+_FIRST_CHILD = etree.XPath("*[1]")
+_PRICE_HEADER = etree.XPath("div[@class='price-value']/span")
+_PRICE_DETAILS = etree.XPath("div[@class='price-value']/span[not(preceding-sibling::*)]/span")
+_PRICE_EXTRA = etree.XPath("div[@class='price-extra']/span")
+_LOCATION_TITLE = etree.XPath("h4")
+_NO_LOCATION_TITLE = etree.XPath("b")
+_FEATURE_ITEMS = etree.XPath("li")
+_FIRST_ICON = etree.XPath("(.//i)[1]")
+
+
+def _get_text(element: etree._Element, strip: bool = False) -> str:
+    """
+    Returns the text of an element the way BeautifulSoup's `get_text` does.
+    """
+    if strip:
+        return "".join(text.strip() for text in _TEXT_NODES(element))
+    return _STRING_VALUE(element)
+
+
+class LxmlPropertyPageParser(PropertyRecordMixin):
+    """
+    A single-pass parser for property detail pages built directly on the lxml tree.
+
+    The document is traversed once to locate the few elements the fields live in (the article
+    container, the price containers, the location section and the feature list). Every field is
+    then read with precompiled XPath expressions relative to those elements. The public methods
+    return the same values as PropertyPageParser, so both engines are interchangeable.
+    """
+    def __init__(self, content: Union[str, bytes]):
+        """
+        Initializes the LxmlPropertyPageParser with the raw HTML of the page.
+
+        Args:
+            content (Union[str, bytes]): The HTML content of the page.
+        """
+        self.logger = get_logger(__name__)
+
+        self.article: Optional[etree._Element] = None
+        self.price_containers: List[etree._Element] = []
+        self.location: Optional[etree._Element] = None
+        self.no_location: Optional[etree._Element] = None
+        self.feature_lists: List[etree._Element] = []
+
+        try:
+            root = etree.HTML(content)
+        except ValueError:
+            # Unicode strings with an XML encoding declaration have to be parsed as bytes
+            root = etree.HTML(content.encode('utf-8'))
+        if root is not None:
+            self._locate(root)
+
+    def _locate(self, root: etree._Element) -> None:
+        """
+        Finds the anchor elements of every field in a single traversal of the document.
+        """
+        for element in root.iter('div', 'ul'):
+            element_id = element.get('id')
+            element_class = element.get('class')
+            if element.tag == 'ul':
+                if element_id == 'section-icon-features-property':
+                    self.feature_lists.append(element)
+            elif element_id == 'article-container':
+                if self.article is None:
+                    self.article = element
+            elif element_class == 'price-item-container':
+                if not _HAS_NEXT_ELEMENT(element):
+                    self.price_containers.append(element)
+            elif element_class == 'section-location-property section-location-property-classified':
+                if self.location is None and _LOCATION_TITLE(element):
+                    self.location = element
+            elif element_class == 'section-location no-location':
+                if self.no_location is None and _NO_LOCATION_TITLE(element):
+                    self.no_location = element
+
+    def _select_price(self, xpath: etree.XPath) -> List[etree._Element]:
+        return [match for container in self.price_containers for match in xpath(container)]
+
+    def validate_link(self) -> bool:
+        self.logger.info("Validating link ...")
+        if self.article is None:
+            self.logger.error("No article found.")
+            return False
+        else:
+            return True
+
+    def get_property_type(self) -> str:
+        self.logger.info("Parsing building type ...")
+        property_header = _get_text(_FIRST_CHILD(self.article)[0]).strip()
+        if "edificio" in property_header.lower():
+            property_type = "Edificio"
+        else:
+            property_type = property_header.split("·")[0].strip().title()
+        return property_type
+
+    def get_price(self) -> tuple[str, int, Optional[int]]:
+        self.logger.info("Parsing price ...")
+
+        header_element = self._select_price(_PRICE_HEADER)[0]
+        header_strings = [header_element.text] + [child.tail for child in header_element]
+        price_type = [string for string in header_strings if string is not None][0].strip().title()
+
+        details_elements = self._select_price(_PRICE_DETAILS)
+        price_pen = int(_get_text(details_elements[0], strip=True).replace("S/ ", "").replace(",", "").strip())
+
+        if len(details_elements) == 3:
+            if _get_text(details_elements[2], strip=True) != '':
+                price_usd = int(_get_text(details_elements[2], strip=True).replace("USD ", "").replace(",", "").strip())
+            else:
+                price_usd = None
+        else:
+            price_usd = None
+
+        return price_type, price_pen, price_usd
+
+    def get_additional_expense(self) -> Optional[int]:
+        self.logger.info("Parsing additional expense ...")
+        elements = self._select_price(_PRICE_EXTRA)
+
+        if len(elements) == 0:
+            return None
+        additional_expense = _get_text(elements[0], strip=True)
+        return int(additional_expense.replace("S/ ", "").replace("Mantenimiento", "").replace(",", "").strip())
+
+    def get_address(self) -> Optional[str]:
+        self.logger.info("Parsing address ...")
+
+        if self.location is not None:
+            return _get_text(_LOCATION_TITLE(self.location)[0], strip=True)
+        if self.no_location is not None:
+            return _get_text(_NO_LOCATION_TITLE(self.no_location)[0], strip=True)
+        return None
+
+    def get_main_features(self) -> tuple[int, int, int, int, int, int, int]:
+        self.logger.info("Parsing main features ...")
+
+        total_size = 0
+        covered_size = 0
+        bedrooms = 0
+        bathrooms = 0
+        half_bathrooms = 0
+        parking_spaces = 0
+        age = 0
+
+        for feature_list in self.feature_lists:
+            for element in _FEATURE_ITEMS(feature_list):
+                quantity = _get_text(element, strip=True).replace("\n", "").replace("\t", " ").strip().split(" ")[0].strip()
+                classes = _FIRST_ICON(element)[0].get('class', '').split()
+                if "icon-stotal" in classes:
+                    total_size = int(quantity)
+                elif "icon-scubierta" in classes:
+                    covered_size = int(quantity)
+                elif "icon-dormitorio" in classes:
+                    bedrooms = int(quantity)
+                elif "icon-bano" in classes:
+                    bathrooms = int(quantity)
+                elif "icon-toilete" in classes:
+                    half_bathrooms = int(quantity)
+                elif "icon-cochera" in classes:
+                    parking_spaces = int(quantity)
+                elif "icon-antiguedad" in classes:
+                    if "a" in quantity.lower():
+                        age = -1
+                    elif "en" in quantity.lower():
+                        age = -2
+                    else:
+                        age = int(quantity)
+        return total_size, covered_size, bedrooms, bathrooms, half_bathrooms, parking_spaces, age
+
+
+PARSER_ENGINES = ('bs4', 'lxml')
+
+
+def make_property_parser(
+    content: str,
+    engine: str = 'bs4',
+    scoped: bool = False
+) -> Union[PropertyPageParser, LxmlPropertyPageParser]:
+    """
+    Builds a property detail page parser for the selected extraction engine.
+
+    Args:
+        content (str): The HTML content of the page.
+        engine (str, optional): 'bs4' for the BeautifulSoup parser or 'lxml' for the single-pass
+            lxml parser. Defaults to 'bs4'.
+        scoped (bool, optional): Build the BeautifulSoup tree of the parsed sections only. The lxml
+            engine never builds a BeautifulSoup tree, so it ignores this. Defaults to False.
+
+    Returns:
+        Union[PropertyPageParser, LxmlPropertyPageParser]: The parser.
+    """
+    if engine == 'lxml':
+        return LxmlPropertyPageParser(content)
+    elif engine == 'bs4':
+        return PropertyPageParser(make_soup(content, 'property' if scoped else None))
+    raise ValueError(f"Unknown parser engine '{engine}'. Expected one of {PARSER_ENGINES}.")
@@ -0,0 +1,72 @@
+import sys
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass(slots=True)
+class PropertyRecord:
+    """
+    A scraped listing, with the columns of the `properties_landing` table in order.
+
+    Records use `__slots__`, so a row costs a fixed-size object rather than a 21-key dict. The batch
+    and location columns repeat on every row of a batch; their strings are interned so all rows share
+    a single copy, including rows rebuilt from the property index.
+    """
+    batch_id: str
+    batch_extraction_start: str
+    property_id: str
+    property_extraction_start: str
+    property_type: Optional[str]
+    price_type: Optional[str]
+    price_pen: Optional[int]
+    price_usd: Optional[int]
+    additional_expense: Optional[int]
+    address: Optional[str]
+    region: str
+    city: str
+    district: str
+    total_size: Optional[int]
+    covered_size: Optional[int]
+    bedrooms: Optional[int]
+    bathrooms: Optional[int]
+    half_bathrooms: Optional[int]
+    parking_spaces: Optional[int]
+    age: Optional[int]
+    link: str
+
+    def __post_init__(self):
+        for name in INTERNED_FIELDS:
+            value = getattr(self, name)
+            if type(value) is str:
+                setattr(self, name, sys.intern(value))
+
+    @classmethod
+    def from_dict(cls, row: Dict[str, Any], **overrides: Any) -> 'PropertyRecord':
+        """
+        Builds a record from a row dict, e.g. a row stored in the property index.
+
+        Args:
+            row (Dict[str, Any]): The row, with one key per field.
+            **overrides (Any): Fields to replace, e.g. the batch columns of the current batch.
+
+        Returns:
+            PropertyRecord: The record.
+        """
+        return cls(**{name: overrides[name] if name in overrides else row.get(name) for name in PROPERTY_FIELDS})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in PROPERTY_FIELDS}
+
+    def values(self) -> Tuple[Any, ...]:
+        """
+        Returns the field values in column order.
+        """
+        return tuple(getattr(self, name) for name in PROPERTY_FIELDS)
+
+
+PROPERTY_FIELDS: Tuple[str, ...] = tuple(field.name for field in fields(PropertyRecord))
+
+# Low-cardinality columns that repeat across the rows of a batch
+INTERNED_FIELDS = (
+    'batch_id', 'batch_extraction_start', 'property_type', 'price_type', 'region', 'city', 'district'
+)
@@ -0,0 +1,256 @@
+import collections
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Deque, Optional, Tuple
+
+import requests
+
+from scraper.utils import get_logger
+
+
+# Outcomes of a single request attempt
+SUCCESS = 'success'          # The page was fetched
+PERMANENT = 'permanent'      # The page does not exist or the request is invalid; retrying cannot help
+THROTTLED = 'throttled'      # The server asked us to slow down (429)
+CHALLENGE = 'challenge'      # An anti-bot challenge was not solved (403 or a cloudscraper error)
+TRANSIENT = 'transient'      # Server errors, timeouts and connection errors
+
+RETRYABLE_OUTCOMES = (THROTTLED, CHALLENGE, TRANSIENT)
+
+# Statuses worth retrying; any other 4xx is permanent
+TRANSIENT_STATUSES = frozenset({408, 425, 500, 502, 503, 504, 520, 521, 522, 523, 524})
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a `Retry-After` header, given either in seconds or as an HTTP date.
+
+    Args:
+        value (Optional[str]): The header value.
+
+    Returns:
+        Optional[float]: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """
+    Decides which failed requests are retried and how long to wait before the next attempt.
+
+    Responses are classified by status: 404-style client errors are permanent and never retried,
+    while throttling, unsolved challenges, server errors, timeouts and connection errors are retried
+    with jittered exponential backoff. A `Retry-After` header takes precedence over the backoff.
+    """
+    def __init__(
+        self,
+        max_retries: int = 0,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        max_retry_after: float = 300.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 30.0
+    ):
+        """
+        Initializes the RetryPolicy.
+
+        Args:
+            max_retries (int, optional): The maximum number of retries after the first attempt. Defaults to 0.
+            base_delay (float, optional): The backoff ceiling of the first retry, in seconds. Defaults to 1.0.
+            max_delay (float, optional): The maximum backoff ceiling, in seconds. Defaults to 30.0.
+            max_retry_after (float, optional): The longest `Retry-After` honored, in seconds. Defaults to 300.0.
+            connect_timeout (float, optional): The connect timeout of every request, in seconds. Defaults to 10.0.
+            read_timeout (float, optional): The read timeout of every request, in seconds. Defaults to 30.0.
+        """
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """
+        The (connect, read) timeout passed to every request.
+        """
+        return self.connect_timeout, self.read_timeout
+
+    def classify(self, response: Optional[requests.Response] = None, error: Optional[Exception] = None) -> str:
+        """
+        Classifies the outcome of a request attempt.
+
+        Args:
+            response (Optional[requests.Response], optional): The response, if one was received. Defaults to None.
+            error (Optional[Exception], optional): The exception raised by the request, if any. Defaults to None.
+
+        Returns:
+            str: One of SUCCESS, PERMANENT, THROTTLED, CHALLENGE or TRANSIENT.
+        """
+        if error is not None:
+            if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+                return TRANSIENT
+            if isinstance(error, requests.exceptions.RequestException):
+                return PERMANENT if isinstance(error, (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema)) else TRANSIENT
+            # cloudscraper raises its own exceptions when it cannot solve a challenge
+            return CHALLENGE
+
+        status = response.status_code
+        if status < 400:
+            return SUCCESS
+        if status == 429:
+            return THROTTLED
+        if status == 403:
+            return CHALLENGE
+        if status in TRANSIENT_STATUSES or status >= 500:
+            return TRANSIENT
+        return PERMANENT
+
+    def get_delay(self, retry: int, retry_after: Optional[float] = None) -> float:
+        """
+        Returns how long to wait before a retry.
+
+        Args:
+            retry (int): The 0-based number of the upcoming retry.
+            retry_after (Optional[float], optional): The wait requested by the server, in seconds. Defaults to None.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        if retry_after is not None:
+            # A little jitter keeps the workers that were throttled together from retrying together
+            return min(retry_after, self.max_retry_after) + random.uniform(0, self.base_delay)
+        # Full jitter: a uniform delay up to the exponential ceiling
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+class CircuitBreaker:
+    """
+    A per-host circuit breaker that pauses requests while the error rate of a host is too high.
+
+    The outcomes of the last `window_size` requests are tracked. Once at least `min_requests` of them
+    were made and the share of failures reaches `error_rate`, the breaker opens and every request to
+    the host waits for `cooldown` seconds. A single probe request is then let through: if it succeeds
+    the breaker closes, otherwise it opens again with a doubled cooldown (up to `max_cooldown`).
+    Only the outcome of the probe itself decides this: requests that were already in flight when the
+    breaker opened report late, and are ignored while the probe runs.
+    """
+    def __init__(
+        self,
+        host: str,
+        window_size: int = 20,
+        min_requests: int = 10,
+        error_rate: float = 0.5,
+        cooldown: float = 30.0,
+        max_cooldown: float = 600.0
+    ):
+        """
+        Initializes the CircuitBreaker.
+
+        Args:
+            host (str): The host guarded by the breaker, used in log messages.
+            window_size (int, optional): Number of recent outcomes tracked. Defaults to 20.
+            min_requests (int, optional): Outcomes needed before the breaker can open. Defaults to 10.
+            error_rate (float, optional): Share of failures that opens the breaker. Defaults to 0.5.
+            cooldown (float, optional): Initial pause when the breaker opens, in seconds. Defaults to 30.0.
+            max_cooldown (float, optional): Maximum pause after repeated failed probes, in seconds. Defaults to 600.0.
+        """
+        self.host = host
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.logger = get_logger(__name__)
+
+        self._outcomes: Deque[bool] = collections.deque(maxlen=window_size)
+        self._condition = threading.Condition()
+        self._cooldown = cooldown
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    def before_request(self) -> bool:
+        """
+        Blocks while the breaker is open, and while another thread probes the host after a pause.
+
+        Returns:
+            bool: Whether the request is the probe, to be passed back to `record`.
+        """
+        with self._condition:
+            while True:
+                wait = self._open_until - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(wait)
+                elif self._probing:
+                    self._condition.wait()
+                else:
+                    break
+            if self._open_until > 0:
+                # First request after a pause: it probes the host while the others wait
+                self._probing = True
+                self._open_until = 0.0
+                return True
+            return False
+
+    def record(self, failed: bool, probe: bool = False) -> None:
+        """
+        Records the outcome of a request and opens or closes the breaker accordingly.
+
+        Args:
+            failed (bool): Whether the request failed in a way that suggests the host is unhealthy.
+            probe (bool, optional): Whether the request is the probe, as returned by `before_request`. Defaults to False.
+        """
+        with self._condition:
+            if self._probing and not probe:
+                # A request started before the pause; the host's health is decided by the probe
+                return
+            if probe:
+                self._probing = False
+                if failed:
+                    self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                    self._open(self._cooldown, "probe request failed")
+                else:
+                    self.logger.info(f"Circuit breaker for {self.host} closed. Resuming requests.")
+                    self._cooldown = self.base_cooldown
+                    self._outcomes.clear()
+                self._condition.notify_all()
+                return
+
+            self._outcomes.append(failed)
+            n_failed = sum(self._outcomes)
+            if (
+                not self.is_open
+                and len(self._outcomes) >= self.min_requests
+                and n_failed >= self.error_rate * len(self._outcomes)
+            ):
+                self._open(self._cooldown, f"{n_failed} of the last {len(self._outcomes)} requests failed")
+                self._outcomes.clear()
+
+    def hold(self, seconds: float) -> None:
+        """
+        Pauses every request to the host for at least `seconds`, e.g. when the server sent `Retry-After`.
+        """
+        with self._condition:
+            if time.monotonic() + seconds > self._open_until:
+                self._open(seconds, "the server asked to retry later")
+
+    def _open(self, seconds: float, reason: str) -> None:
+        self._open_until = time.monotonic() + seconds
+        self.logger.error(f"Circuit breaker for {self.host} opened: {reason}. Pausing requests for {seconds:.0f}s.")
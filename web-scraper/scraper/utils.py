@@ -1,7 +1,11 @@
+import atexit
 import json
 import logging
+import logging.handlers
 import os
-from typing import Any
+import queue
+import threading
+from typing import Any, Optional
 
 
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json')
@@ -15,9 +19,92 @@ LOG_TO_FILE = CONFIG.get('log_to_file', True)
 LOG_TO_CONSOLE = CONFIG.get('log_to_console', True)
 
 
+# Per-logger levels, e.g. {"scraper.parser": "WARNING"}; the most specific dotted prefix wins
+LOG_LEVEL = CONFIG.get('log_level', 'INFO')
+LOG_LEVELS: dict[str, str] = CONFIG.get('log_levels', {})
+
+_logging_lock = threading.Lock()
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+_loggers: dict[str, logging.Logger] = {}
+
+
+def configure_logging() -> logging.handlers.QueueHandler:
+    """
+    Sets up the shared logging pipeline once per process.
+
+    Loggers only put records on an in-memory queue; a QueueListener thread formats them and does the
+    file and console I/O, so logging never blocks the crawl on disk writes. The listener is stopped
+    (and the queue drained) at interpreter exit.
+
+    Returns:
+        logging.handlers.QueueHandler: The handler shared by every logger.
+    """
+    global _queue_handler, _queue_listener
+
+    with _logging_lock:
+        if _queue_handler is not None:
+            return _queue_handler
+
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        handlers: list[logging.Handler] = []
+
+        if LOG_TO_FILE:
+            # Ensure log file directory exists
+            log_dir = os.path.dirname(LOG_FILE)
+            if log_dir and not os.path.exists(log_dir):
+                os.makedirs(log_dir, exist_ok=True)
+            file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+        if LOG_TO_CONSOLE:
+            stream_handler = logging.StreamHandler()
+            stream_handler.setFormatter(formatter)
+            handlers.append(stream_handler)
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _queue_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _queue_listener.start()
+        atexit.register(shutdown_logging)
+
+        _queue_handler = logging.handlers.QueueHandler(log_queue)
+        return _queue_handler
+
+
+def shutdown_logging() -> None:
+    """
+    Stops the listener thread after writing out every queued record.
+    """
+    global _queue_listener
+
+    with _logging_lock:
+        if _queue_listener is not None:
+            _queue_listener.stop()
+            for handler in _queue_listener.handlers:
+                handler.close()
+            _queue_listener = None
+
+
+def get_log_level(name: str) -> int:
+    """
+    Returns the configured level of a logger: the level of its most specific prefix in `log_levels`,
+    or `log_level`.
+    """
+    parts = name.split('.')
+    for i in range(len(parts), 0, -1):
+        level = LOG_LEVELS.get('.'.join(parts[:i]))
+        if level is not None:
+            return logging.getLevelName(level.upper())
+    return logging.getLevelName(LOG_LEVEL.upper())
+
+
 def get_logger(name: str) -> logging.Logger:
     """
-    Configures and returns a logger instance.
+    Returns a configured logger instance.
+
+    Loggers are configured on first use and cached, so calling this on hot paths (e.g. in parser
+    constructors) costs a dictionary lookup.
 
     Args:
         name (str): The name of the logger.
@@ -25,26 +112,18 @@ def get_logger(name: str) -> logging.Logger:
     Returns:
         logging.Logger: Configured logger instance.
     """
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
-
-    # Remove all handlers if already set (to avoid duplicate logs)
-    if logger.hasHandlers():
-        logger.handlers.clear()
-
-    if LOG_TO_FILE:
-        # Ensure log file directory exists
-        log_dir = os.path.dirname(LOG_FILE)
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir, exist_ok=True)
-        file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-
-    if LOG_TO_CONSOLE:
-        stream_handler = logging.StreamHandler()
-        stream_handler.setFormatter(formatter)
-        logger.addHandler(stream_handler)
-
-    return logger
\ No newline at end of file
+    logger = _loggers.get(name)
+    if logger is not None:
+        return logger
+
+    queue_handler = configure_logging()
+    with _logging_lock:
+        logger = _loggers.get(name)
+        if logger is None:
+            logger = logging.getLogger(name)
+            logger.setLevel(get_log_level(name))
+            logger.handlers.clear()
+            logger.addHandler(queue_handler)
+            logger.propagate = False
+            _loggers[name] = logger
+    return logger
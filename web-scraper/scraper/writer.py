@@ -0,0 +1,244 @@
+import abc
+import csv
+import operator
+import os
+from typing import Callable, List, Optional, Sequence
+
+from scraper.columnar import get_landing_schema, import_pyarrow, rows_to_table
+from scraper.record import PropertyRecord
+from scraper.utils import get_logger
+
+
+class StreamingPartWriter(abc.ABC):
+    """
+    A writer that streams rows to disk in fixed-size chunks and rotates the output into part files.
+
+    Each part is written under a temporary `.tmp` name and atomically renamed to its final name once
+    it is complete, so readers never see a half-written file. At most `chunk_size` rows are held in
+    memory at any time. Subclasses implement the file format in `_open_file` and `_write_rows`, and
+    may extend `_close_file`.
+    """
+    def __init__(
+        self,
+        output_dir: str,
+        prefix: str,
+        fieldnames: Sequence[str],
+        chunk_size: int = 500,
+        rotate_rows: int = 10000,
+        suffix: str = '.csv',
+        start_part: int = 1,
+        key_field: Optional[str] = None,
+        on_commit: Optional[Callable[[int, str, List[str]], None]] = None
+    ):
+        """
+        Initializes the writer.
+
+        Args:
+            output_dir (str): The directory the part files are written to.
+            prefix (str): The file name prefix of every part, e.g. `properties_listing_<batch_id>`.
+            fieldnames (Sequence[str]): The columns.
+            chunk_size (int, optional): Number of buffered rows that triggers a flush. Defaults to 500.
+            rotate_rows (int, optional): Number of rows after which a part is committed. Defaults to 10000.
+            suffix (str, optional): The suffix of committed parts. Defaults to '.csv'.
+            start_part (int, optional): The number of the first part. Defaults to 1.
+            key_field (Optional[str], optional): A record field whose values are reported to `on_commit`. Defaults to None.
+            on_commit (Optional[Callable[[int, str, List[str]], None]], optional): Called with the part number,
+                path and row keys of every committed part. Defaults to None.
+        """
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.fieldnames = list(fieldnames)
+        self.chunk_size = max(1, chunk_size)
+        self.rotate_rows = max(self.chunk_size, rotate_rows)
+        self.suffix = suffix
+        self.key_field = key_field
+        self.on_commit = on_commit
+        self.logger = get_logger(__name__)
+
+        self.parts: List[str] = []
+        self.rows_written = 0
+
+        self._part_number = start_part
+        self._buffer: List[PropertyRecord] = []
+        self._file = None
+        self._part_rows = 0
+        self._part_keys: List[str] = []
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _part_path(self, part_number: int) -> str:
+        return os.path.join(self.output_dir, f'{self.prefix}_part{part_number:04d}{self.suffix}')
+
+    @abc.abstractmethod
+    def _open_file(self, path: str) -> None:
+        """
+        Opens a new part file at `path` and sets `self._file`.
+        """
+
+    @abc.abstractmethod
+    def _write_rows(self, rows: List[PropertyRecord]) -> None:
+        """
+        Appends rows to the current part file.
+        """
+
+    def _close_file(self) -> None:
+        """
+        Finishes the current file; the base implementation makes it durable and closes it.
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def _open_part(self) -> None:
+        self._open_file(self._part_path(self._part_number) + '.tmp')
+        self._part_rows = 0
+        self._part_keys = []
+
+    def _commit_part(self) -> None:
+        """
+        Closes the current part and renames it to its final name.
+        """
+        self._close_file()
+
+        final_path = self._part_path(self._part_number)
+        os.replace(final_path + '.tmp', final_path)
+        self.logger.info(f"Committed {self._part_rows} rows to {final_path}")
+
+        self.parts.append(final_path)
+        if self.on_commit is not None:
+            self.on_commit(self._part_number, final_path, self._part_keys)
+        self._part_number += 1
+        self._file = None
+
+    def write(self, row: PropertyRecord) -> None:
+        """
+        Buffers a row, flushing the buffer once it reaches `chunk_size` rows.
+
+        Args:
+            row (PropertyRecord): The row to write.
+        """
+        self._buffer.append(row)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the buffered rows to the current part, committing it when it reaches `rotate_rows` rows.
+        """
+        while self._buffer:
+            if self._file is None:
+                self._open_part()
+
+            n_rows = min(len(self._buffer), self.rotate_rows - self._part_rows)
+            self._write_rows(self._buffer[:n_rows])
+            if self.key_field is not None:
+                self._part_keys.extend(getattr(row, self.key_field) for row in self._buffer[:n_rows])
+            del self._buffer[:n_rows]
+            self._part_rows += n_rows
+            self.rows_written += n_rows
+
+            if self._part_rows >= self.rotate_rows:
+                self._commit_part()
+
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> List[str]:
+        """
+        Flushes the remaining rows and commits the last part.
+
+        Returns:
+            List[str]: The paths of all parts committed by this writer.
+        """
+        self.flush()
+        if self._file is not None:
+            self._commit_part()
+        return self.parts
+
+    def abort(self) -> None:
+        """
+        Discards the buffered rows and the part being written. Parts already committed are kept.
+        """
+        self._buffer = []
+        if self._file is None:
+            return
+        tmp_path = self._part_path(self._part_number) + '.tmp'
+        try:
+            self._close_file()
+        except Exception as e:
+            self.logger.error(f"Error closing the discarded part {tmp_path}: {e}")
+            self._file.close()
+        os.remove(tmp_path)
+        self.logger.error(f"Discarded {self._part_rows} rows of the incomplete part {tmp_path}")
+        self.rows_written -= self._part_rows
+        self._file = None
+        self._part_rows = 0
+        self._part_keys = []
+
+    def __enter__(self) -> 'StreamingPartWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        # After a failure the open part is discarded rather than committed, so the loader never takes a
+        # truncated part for a complete one; its rows are not journaled and are fetched again on resume
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class StreamingCsvWriter(StreamingPartWriter):
+    """
+    Streams rows into rotating CSV part files with a header line.
+
+    The values of every record are read in column order with a single attribute getter.
+    """
+    def _open_file(self, path: str) -> None:
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.fieldnames)
+        self._get_values = operator.attrgetter(*self.fieldnames)
+
+    def _write_rows(self, rows: List[PropertyRecord]) -> None:
+        self._writer.writerows(map(self._get_values, rows))
+
+
+class StreamingArrowWriter(StreamingPartWriter):
+    """
+    Streams rows into rotating Parquet or Arrow IPC part files with the typed landing schema.
+
+    Every flushed chunk becomes a Parquet row group or an IPC record batch. Parquet parts are
+    compressed with zstd; dictionary-encoded columns keep their Arrow type when read back. Arrow parts
+    use the IPC stream format, which allows every record batch to carry its own dictionaries.
+    """
+    def __init__(self, *args, file_format: str = 'parquet', **kwargs):
+        """
+        Initializes the StreamingArrowWriter.
+
+        Args:
+            *args: The arguments of `StreamingPartWriter`.
+            file_format (str, optional): 'parquet' or 'arrow' (IPC stream format). Defaults to 'parquet'.
+            **kwargs: The keyword arguments of `StreamingPartWriter`.
+        """
+        if file_format not in ('parquet', 'arrow'):
+            raise ValueError(f"Unknown columnar format '{file_format}'. Expected 'parquet' or 'arrow'.")
+        self.file_format = file_format
+        self.schema = get_landing_schema()
+        super().__init__(*args, **kwargs)
+
+    def _open_file(self, path: str) -> None:
+        pa = import_pyarrow()
+        self._file = open(path, 'wb')
+        if self.file_format == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self._file, self.schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_stream(self._file, self.schema)
+
+    def _write_rows(self, rows: List[PropertyRecord]) -> None:
+        self._writer.write_table(rows_to_table(rows, self.schema))
+
+    def _close_file(self) -> None:
+        # Writes the Parquet footer or the IPC end-of-stream marker; the file object is left open for the base class
+        self._writer.close()
+        super()._close_file()
@@ -1,196 +1,1085 @@
-import cloudscraper
-from bs4 import BeautifulSoup
+import argparse
+import collections
+import queue
+import threading
 import time
 import random
 import json
 import os
+import glob
+import re
 import hashlib
-import csv
-from typing import List, Tuple
+from concurrent.futures import Future, ProcessPoolExecutor
+import multiprocessing
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
 
-from scraper.fetcher import fetch_page, fetch_location_data
-from scraper.parser import SearchPageParser, PropertyPageParser
-from scraper.utils import get_logger
+from scraper.cache import CACHE_MODES, ResponseCache
+from scraper.columnar import FORMAT_SUFFIXES, OUTPUT_FORMATS
+from scraper.engine import FetchEngine
+from scraper.index import PropertyIndex
+from scraper.journal import CrawlJournal
+from scraper.locations import LocationIndex, ensure_locations_csv, get_search_slug
+from scraper.metrics import METRICS, METRICS_DIR, emit_batch_metrics, read_summary, write_summary
+from scraper.parser import SearchPageParser, PARSER_ENGINES, make_property_parser, make_soup
+from scraper.record import PROPERTY_FIELDS, PropertyRecord
+from scraper.retry import RetryPolicy
+from scraper.utils import get_logger, CONFIG
+from scraper.writer import StreamingArrowWriter, StreamingCsvWriter, StreamingPartWriter
 
 import uuid
 from datetime import datetime
 
 
-def main() -> None:
+BASE_DOMAIN = "https://urbania.pe"
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), 'data', 'processed')
+MAX_PAGES = 1000  # Set a maximum page limit to avoid infinite loops
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/126.0.0.0 Safari/537.36"
+    )
+}
+
+FIELDNAMES = list(PROPERTY_FIELDS)
+
+# Fields describing the listing itself, as opposed to the batch and search that found it
+CONTENT_FIELDS = [
+    "property_type",
+    "price_type",
+    "price_pen",
+    "price_usd",
+    "additional_expense",
+    "address",
+    "total_size",
+    "covered_size",
+    "bedrooms",
+    "bathrooms",
+    "half_bathrooms",
+    "parking_spaces",
+    "age",
+    "link",
+]
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
     """
-    Main function to run the web scraper.
+    Parses a shard specification of the form `i/N` (1-based).
 
-    This function initializes the scraping process, fetches location data, and iterates through
-    search result pages to extract property details.
+    Args:
+        value (str): The shard specification.
+
+    Returns:
+        Tuple[int, int]: The shard index and the total number of shards.
     """
-    # if os.getenv('ENVIRONMENT') == 'local':
-    #     logger.info("Running in local environment.")
-    # elif os.getenv('ENVIRONMENT') == 'production':
-    #     logger.info("Running in production environment.")
-    # else:
-    #     logger.error("Environment variable 'ENVIRONMENT' is not set. Exiting...")
-    #     return
-    
-    batch_extraction_start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    batch_id = str(uuid.uuid4())
+    match = re.fullmatch(r"(\d+)/(\d+)", value)
+    if match is None:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}'. Expected the form i/N, e.g. 2/4.")
+    shard_index, shard_count = int(match.group(1)), int(match.group(2))
+    if not 1 <= shard_index <= shard_count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{value}'. The index must be between 1 and {shard_count}.")
+    return shard_index, shard_count
 
+
+def parse_args(default_scraper_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parses command-line arguments and merges them with the default scraper configuration.
+
+    Args:
+        default_scraper_config (Dict[str, Any]): The default scraper configuration.
+
+    Returns:
+        Dict[str, Any]: The merged scraper configuration.
+    """
+    parser = argparse.ArgumentParser(description='Scrape rental listings into a processed batch.')
+    parser.add_argument('--workers', type=int, help='Number of property detail fetches in flight')
+    parser.add_argument('--rate-limit', type=float, help='Maximum requests per second across all hosts')
+    parser.add_argument('--host-rate-limit', type=float, help='Maximum requests per second to a single host')
+    parser.add_argument('--max-retries', type=int, help='Retries per failed request')
+    parser.add_argument('--processes', type=int, help='Number of worker processes, each crawling a shard of the districts')
+    parser.add_argument('--shard', type=parse_shard, help='Only crawl shard i of N (e.g. 2/4) and write a partial file')
+    parser.add_argument('--batch-id', help='Batch ID to use instead of a new one (required with --shard and --merge)')
+    parser.add_argument('--batch-start', help='Batch extraction start (YYYY-MM-DD HH:MM:SS) shared by all shards')
+    parser.add_argument('--merge', action='store_true', help='Merge the partial shard files of --batch-id and exit')
+    parser.add_argument('--resume', metavar='BATCH_ID', help='Resume an interrupted batch from the crawl journal')
+    parser.add_argument('--run-key', help='Derive the batch ID from a run key (e.g. an Airflow run_id) and resume it if journaled')
+    parser.add_argument('--incremental', action='store_true', help='Carry forward listings whose search card did not change')
+    parser.add_argument('--cache-mode', choices=CACHE_MODES, help='Response cache mode: off, read-through or replay-only (offline)')
+    parser.add_argument('--parser-engine', choices=PARSER_ENGINES, help='Property page extraction engine: bs4 or lxml (single pass)')
+    parser.add_argument('--scoped-parse', action='store_true', help='Build the BeautifulSoup tree of only the parsed sections of property pages')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, help='Batch file format: csv, parquet or arrow (typed, requires pyarrow)')
+    args = parser.parse_args()
+
+    if (args.shard or args.merge) and not (args.batch_id or args.resume):
+        parser.error('--shard and --merge require --batch-id')
+    if args.shard and not (args.batch_start or args.resume):
+        # Shards run separately would each stamp the batch with their own start time
+        parser.error('--shard requires --batch-start, shared by all shards of the batch')
+    if sum(bool(value) for value in (args.batch_id, args.resume, args.run_key)) > 1:
+        parser.error('--batch-id, --resume and --run-key are mutually exclusive')
+
+    scraper_cfg = default_scraper_config.copy()
+    scraper_cfg['max_workers'] = args.workers or scraper_cfg.get('max_workers', 1)
+    scraper_cfg['global_rate_limit'] = args.rate_limit or scraper_cfg.get('global_rate_limit')
+    scraper_cfg['per_host_rate_limit'] = args.host_rate_limit or scraper_cfg.get('per_host_rate_limit')
+    scraper_cfg['max_retries'] = args.max_retries if args.max_retries is not None else scraper_cfg.get('max_retries', 2)
+    scraper_cfg['processes'] = args.processes or scraper_cfg.get('processes', 1)
+    scraper_cfg['shard'] = args.shard
+    scraper_cfg['batch_id'] = args.batch_id or args.resume
+    scraper_cfg['resume'] = bool(args.resume)
+    scraper_cfg['run_key'] = args.run_key
+    scraper_cfg['incremental'] = args.incremental or scraper_cfg.get('incremental', False)
+    scraper_cfg['refresh_days'] = scraper_cfg.get('refresh_days', 7)
+    scraper_cfg['cache_mode'] = args.cache_mode or scraper_cfg.get('cache_mode', 'off')
+    scraper_cfg['parser_engine'] = args.parser_engine or scraper_cfg.get('parser_engine', 'bs4')
+    scraper_cfg['scoped_parsing'] = args.scoped_parse or scraper_cfg.get('scoped_parsing', False)
+    scraper_cfg['batch_start'] = args.batch_start
+    scraper_cfg['merge'] = args.merge
+    scraper_cfg['chunk_size'] = scraper_cfg.get('chunk_size', 500)
+    scraper_cfg['rotate_rows'] = scraper_cfg.get('rotate_rows', 10000)
+    scraper_cfg['output_format'] = args.output_format or scraper_cfg.get('output_format', 'csv')
+
+    return scraper_cfg
+
+
+def get_property_id(link: str) -> str:
+    """
+    Returns the deterministic property ID of a listing link.
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, link))
+
+
+def get_card_fingerprint(card_text: Optional[str]) -> Optional[str]:
+    """
+    Returns the fingerprint of a search result card, ignoring its relative publication date.
+
+    Args:
+        card_text (Optional[str]): The text of the card.
+
+    Returns:
+        Optional[str]: The SHA-1 hex digest of the normalized card text, or None if there is no card.
+    """
+    if card_text is None:
+        return None
+    # "Publicado hace 3 días" changes every day without the listing changing
+    normalized = re.sub(r"publicado\s+(hoy|ayer|hace\s+\S+\s+\S+)", "", card_text, flags=re.IGNORECASE)
+    normalized = " ".join(normalized.split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def get_content_fingerprint(property_details: PropertyRecord) -> str:
+    """
+    Returns the fingerprint of the listing fields of a row.
+    """
+    content = json.dumps([getattr(property_details, field) for field in CONTENT_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def scrape_property(
+    engine: FetchEngine,
+    link: str,
+    region: str,
+    city: str,
+    district: str,
+    batch_id: str,
+    batch_extraction_start: str,
+    progress: str,
+    parser_engine: str = 'bs4',
+    scoped_parsing: bool = False
+) -> Optional[PropertyRecord]:
+    """
+    Fetches and parses a single property detail page.
+
+    Args:
+        engine (FetchEngine): The engine used to fetch the page.
+        link (str): The URL of the property detail page.
+        region (str): The region the property was found in.
+        city (str): The city the property was found in.
+        district (str): The district the property was found in.
+        batch_id (str): The ID of the current batch.
+        batch_extraction_start (str): The start timestamp of the current batch.
+        progress (str): Progress prefix used in log messages.
+        parser_engine (str, optional): The extraction engine, 'bs4' or 'lxml'. Defaults to 'bs4'.
+        scoped_parsing (bool, optional): Only build the BeautifulSoup tree of the parsed sections. Defaults to False.
+
+    Returns:
+        Optional[PropertyRecord]: The property details, or None if the link is skipped.
+    """
     logger = get_logger(__name__)
-    logger.info(f"Starting data extraction with batch ID: {batch_id}")
 
-    base_domain = "https://urbania.pe"
-    regions, cities, districts = fetch_location_data()
+    property_extraction_start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    property_id = get_property_id(link)
+    logger.info(f"{progress} Fetching details from link ...")
+    content = engine.fetch(link, stage='detail_fetch')
+
+    if content is None:
+        logger.error(f"Failed to fetch or parse link {link}. Skipping...")
+        return None
+
+    with METRICS.timer('parse'):
+        property_parser = make_property_parser(content, parser_engine, scoped=scoped_parsing)
+
+        if not property_parser.validate_link():
+            logger.error(f"Invalid link: {link}. Article not active. Skipping...")
+            METRICS.increment('parse', 'inactive')
+            return None
 
-    max_pages = 1000  # Set a maximum page limit to avoid infinite loops
-    property_details_list: List[dict] = []
+        property_type = property_parser.get_property_type()
+        if property_type == "Edificio":
+            logger.error(f"Property type is 'Edificio', skipping link {link}.")
+            METRICS.increment('parse', 'buildings')
+            return None
 
-    scraper = cloudscraper.create_scraper()
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/126.0.0.0 Safari/537.36"
+        return property_parser.to_record(
+            batch_id=batch_id,
+            batch_extraction_start=batch_extraction_start,
+            property_id=property_id,
+            property_extraction_start=property_extraction_start,
+            property_type=property_type,
+            region=region,
+            city=city,
+            district=district,
+            link=link
         )
-    }
 
-    district_search_mapping = {
-        "LIMA": "LIMA CERCADO",
-        "CARMEN DE LA LEGUA REYNOSO": "CARMEN DE LA LEGUA",
-        "ATE": "ATE VITARTE",
-        "BREÑA": "BRENA",
-        "MAGDALENA DEL MAR": "MAGDALENA",
-        "LURIGANCHO": "CHOSICA LURIGANCHO",
+
+def get_target_locations(location_index: LocationIndex) -> List[Tuple[str, str, str]]:
+    """
+    Returns the Lima and Callao districts to crawl.
+
+    Args:
+        location_index (LocationIndex): The location dimension.
+
+    Returns:
+        List[Tuple[str, str, str]]: A list of (region, city, district) tuples.
+    """
+    targets = location_index.in_city("LIMA", "LIMA") + location_index.in_region("CALLAO")
+    return [(location.region, location.city, location.district) for location in targets]
+
+
+def fetch_search_page(
+    engine: FetchEngine,
+    url: str,
+    page: int
+) -> Optional[SearchPageParser]:
+    """
+    Fetches and parses one search result page.
+
+    Args:
+        engine (FetchEngine): The engine used to fetch the page.
+        url (str): The search URL of the district.
+        page (int): The page number.
+
+    Returns:
+        Optional[SearchPageParser]: The parser of the page, or None if the page could not be fetched.
+    """
+    logger = get_logger(__name__)
+
+    params = {
+        "page": page,
+        "priceMin": 1,
+        "currencyId": 6,
     }
 
-    for region, city, district in zip(regions, cities, districts):
-        if region.lower() + "-" + city.lower() != "lima-lima" and region.lower() != "callao":
-            continue
-
-        # Apply district mapping
-        district_search = district_search_mapping.get(district, district)
-
-        logger.info(f"Fetching properties in {district}, {region}, {city}...")
-
-        url = f"https://urbania.pe/buscar/alquiler-de-propiedades-en-{district_search.lower().replace(' ', '-')}--{city.lower().replace(' ', '-')}--{region.lower().replace(' ', '-')}"
-        links_combined = []
-    
-        for page in range(1, max_pages + 1):
-            # time.sleep(random.uniform(0.25, 0.75))  # Random sleep to avoid being blocked
-
-            params = {
-                "page": page,
-                "priceMin": 1,
-                "currencyId": 6,
-            }
-
-            logger.info(f"Fetching page {page}...")
-            content = fetch_page(scraper=scraper, url=url, headers=headers, params=params, max_retries=2)
-
-            if content is None:
-                logger.error(f"Failed to fetch or parse page {page}. Stopping...")
-                break
-        
-            soup = BeautifulSoup(content, 'lxml')
-            search_parser = SearchPageParser(soup)
-
-            current_page = search_parser.get_current_page_number()
-            if current_page != page:
-                logger.info(f"Reached the end of available pages at page {current_page - 1}. Stopping...")
-                break
-
-            if not search_parser.validate_links():
-                logger.error(f"No valid links found on page {page}. Stopping...")
-                break
-
-            links = search_parser.get_links()
-            links = [base_domain + link for link in links]
-            
-            logger.info(f"Found {len(links)} links on page {page}.")
-            links_combined.extend(links)
-
-        logger.info(f"Total links found: {len(links_combined)}")
-        links_combined = list(set(links_combined))
-        logger.info(f"Total unique links found: {len(links_combined)}")
-
-        n_links = len(links_combined)
-        max_digits = len(str(n_links))
-
-        for i, link in enumerate(links_combined):
-            # time.sleep(random.uniform(0.25, 0.75))  # Random sleep to avoid being blocked
-            property_extraction_start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            property_id = str(uuid.uuid5(uuid.NAMESPACE_URL, link))
-            pct = ((i + 1) / n_links) * 100
-            logger.info(f"[{(i + 1):{max_digits}}/{n_links} | {pct:6.2f}%] Fetching details from link ...")
-            content = fetch_page(scraper=scraper, url=link, headers=headers, max_retries=2)
-
-            if content is None:
-                logger.error(f"Failed to fetch or parse link {link}. Skipping...")
+    logger.info(f"Fetching page {page}...")
+    content = engine.fetch(url, params=params, stage='search_paging')
+    if content is None:
+        return None
+    with METRICS.timer('parse'):
+        return SearchPageParser(make_soup(content))
+
+
+def discover_links(
+    engine: FetchEngine,
+    region: str,
+    city: str,
+    district: str,
+    search_slug: Optional[str] = None
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Walks the search result pages of a district and yields the property links as they are found.
+
+    The number of pages is estimated from the first page, and the remaining pages are fetched
+    concurrently on the engine's worker pool, at most `max_workers` pages ahead of the page being read.
+    Pages are still read in order. When the estimate is only a lower bound (or the district grew
+    since the first page), the following pages are walked one by one until the end of the results.
+
+    Args:
+        engine (FetchEngine): The engine used to fetch pages.
+        region (str): The region of the district.
+        city (str): The city of the district.
+        district (str): The district to crawl.
+        search_slug (Optional[str], optional): The precomputed search URL slug of the district. Defaults to None.
+
+    Yields:
+        Tuple[str, Optional[str]]: The unique property links, in discovery order, with the fingerprint of
+            their search result card. A link found on several pages is yielded with its first card.
+    """
+    logger = get_logger(__name__)
+
+    if search_slug is None:
+        search_slug = get_search_slug(region, city, district)
+    url = f"https://urbania.pe/buscar/alquiler-de-propiedades-en-{search_slug}"
+    seen_links: Set[str] = set()
+    n_links = 0
+
+    def read_page(page: int, search_parser: Optional[SearchPageParser]) -> Optional[List[Tuple[str, Optional[str]]]]:
+        """
+        Returns the cards of a fetched page, or None if the page is past the end of the results.
+        """
+        if search_parser is None:
+            logger.error(f"Failed to fetch or parse page {page}. Stopping...")
+            return None
+
+        current_page = search_parser.get_current_page_number()
+        if current_page != page:
+            logger.info(f"Reached the end of available pages at page {current_page - 1}. Stopping...")
+            return None
+
+        if not search_parser.validate_links():
+            logger.error(f"No valid links found on page {page}. Stopping...")
+            return None
+
+        cards = search_parser.get_cards()
+        logger.info(f"Found {len(cards)} links on page {page}.")
+        return cards
+
+    def new_links(cards: List[Tuple[str, Optional[str]]]) -> Iterator[Tuple[str, Optional[str]]]:
+        nonlocal n_links
+        n_links += len(cards)
+        for link, card_text in cards:
+            link = BASE_DOMAIN + link
+            if link not in seen_links:
+                seen_links.add(link)
+                yield link, get_card_fingerprint(card_text)
+
+    first_page = fetch_search_page(engine, url, 1)
+    cards = read_page(1, first_page)
+    page = 1
+    if cards is not None:
+        yield from new_links(cards)
+        page_size = len(cards)
+        total_results = first_page.get_total_results()
+        total_pages, exact = first_page.get_total_pages()
+        last_page = min(total_pages or 1, MAX_PAGES)
+        if total_pages is not None:
+            logger.info(f"Expecting {total_pages} pages ({total_results} results). Fetching pages 2 to {last_page} concurrently.")
+
+        pending: Deque[Tuple[int, Future]] = collections.deque()
+        next_page = 2
+        try:
+            while cards is not None and (pending or next_page <= last_page):
+                while next_page <= last_page and len(pending) < engine.max_workers:
+                    pending.append((next_page, engine.submit(fetch_search_page, engine, url, next_page)))
+                    next_page += 1
+                page, future = pending.popleft()
+                cards = read_page(page, future.result())
+                if cards is not None:
+                    yield from new_links(cards)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+        # Only walk past the estimate when it may have fallen short
+        if cards is not None and (not exact or (total_results is not None and n_links < total_results and len(cards) >= page_size)):
+            while cards is not None and page < MAX_PAGES:
+                page += 1
+                cards = read_page(page, fetch_search_page(engine, url, page))
+                if cards is not None:
+                    yield from new_links(cards)
+
+    if page == MAX_PAGES:
+        raise ValueError("Reached maximum page limit without finding valid properties.")
+
+    logger.info(f"Total links found: {n_links}")
+    logger.info(f"Total unique links found: {len(seen_links)}")
+
+
+# Messages sent from the discovery stage to the detail stage
+_LINK = 'link'
+_DISTRICT_DONE = 'district_done'
+_ERROR = 'error'
+_END = 'end'
+
+
+def produce_links(
+    engine: FetchEngine,
+    locations: List[Tuple[str, str, str]],
+    journaled_links: Dict[Tuple[str, str, str], List[Tuple[str, Optional[str]]]],
+    link_queue: queue.Queue,
+    stop: threading.Event,
+    search_slugs: Optional[Dict[Tuple[str, str, str], str]] = None
+) -> None:
+    """
+    Runs the discovery stage of the crawl pipeline.
+
+    Walks the search pages of every district in turn and puts each link on the bounded link queue as
+    soon as it is found, followed by a marker when a district is fully discovered. Districts whose
+    links are already journaled are replayed without fetching. Putting blocks while the queue is full,
+    so discovery never runs further ahead of the detail stage than the queue allows.
+
+    Args:
+        engine (FetchEngine): The engine used to fetch pages.
+        locations (List[Tuple[str, str, str]]): The (region, city, district) tuples to discover.
+        journaled_links (Dict[Tuple[str, str, str], List[Tuple[str, Optional[str]]]]): Links and card
+            fingerprints of districts discovered by an earlier attempt of the batch.
+        link_queue (queue.Queue): The queue feeding the detail stage.
+        stop (threading.Event): Set by the detail stage to abandon discovery.
+        search_slugs (Optional[Dict[Tuple[str, str, str], str]], optional): Precomputed search URL slugs. Defaults to None.
+    """
+    logger = get_logger(__name__)
+    search_slugs = search_slugs or {}
+
+    def put(message: tuple) -> bool:
+        while not stop.is_set():
+            try:
+                link_queue.put(message, timeout=0.5)
+                return True
+            except queue.Full:
                 continue
+        return False
+
+    try:
+        for location in locations:
+            region, city, district = location
+            logger.info(f"Fetching properties in {district}, {region}, {city}...")
+
+            if location in journaled_links:
+                links = journaled_links[location]
+                logger.info(f"District already discovered. Reusing {len(links)} journaled links.")
+            else:
+                links = discover_links(
+                    engine, region, city, district, search_slug=search_slugs.get(location)
+                )
+
+            for link, card_fingerprint in links:
+                if not put((_LINK, location, link, card_fingerprint)):
+                    return
+            if not put((_DISTRICT_DONE, location, None, None)):
+                return
+    except Exception as e:
+        put((_ERROR, None, e, None))
+    finally:
+        # Always wake up the detail stage, even if it stopped waiting for more links
+        try:
+            link_queue.put_nowait((_END, None, None, None))
+        except queue.Full:
+            put((_END, None, None, None))
+
+
+def crawl_districts(
+    engine: FetchEngine,
+    locations: List[Tuple[str, str, str]],
+    batch_id: str,
+    batch_extraction_start: str,
+    journal: Optional[CrawlJournal] = None,
+    committed_ids: Optional[Set[str]] = None,
+    index: Optional[PropertyIndex] = None,
+    parser_engine: str = 'bs4',
+    scoped_parsing: bool = False,
+    link_queue_size: int = 200,
+    search_slugs: Optional[Dict[Tuple[str, str, str], str]] = None
+) -> Iterator[PropertyRecord]:
+    """
+    Crawls districts as a two-stage pipeline of link discovery and detail fetching.
+
+    A discovery thread walks the search pages and feeds a bounded link queue, while detail fetches are
+    submitted to the engine's worker pool as soon as links arrive, so the pagination of a district
+    overlaps with the detail fetches of the previous ones. The engine bounds the requests in flight
+    across both stages. At most twice the worker count of detail fetches are pending at once; when they
+    are, links back up in the queue and discovery pauses.
+
+    With a journal, the links of every fully discovered district are recorded and reused on resume,
+    and links whose property was already committed to a batch file are not fetched again. With a
+    property index, listings whose search result card did not change are carried forward from the
+    index instead of being fetched. Journal and index are only used from the calling thread.
+
+    Args:
+        engine (FetchEngine): The engine used to fetch pages.
+        locations (List[Tuple[str, str, str]]): The (region, city, district) tuples to crawl.
+        batch_id (str): The ID of the current batch.
+        batch_extraction_start (str): The start timestamp of the current batch.
+        journal (Optional[CrawlJournal], optional): The crawl journal of the batch. Defaults to None.
+        committed_ids (Optional[Set[str]], optional): Property IDs already committed to the batch. Defaults to None.
+        index (Optional[PropertyIndex], optional): The cross-batch property index. Defaults to None.
+        parser_engine (str, optional): The property page extraction engine. Defaults to 'bs4'.
+        scoped_parsing (bool, optional): Only build the BeautifulSoup tree of the parsed sections of property pages. Defaults to False.
+        link_queue_size (int, optional): Capacity of the queue between the two stages. Defaults to 200.
+        search_slugs (Optional[Dict[Tuple[str, str, str], str]], optional): Precomputed search URL slugs. Defaults to None.
+
+    Yields:
+        PropertyRecord: The property details, in discovery order.
+    """
+    logger = get_logger(__name__)
+
+    journaled_links: Dict[Tuple[str, str, str], List[Tuple[str, Optional[str]]]] = {}
+    if journal is not None:
+        for region, city, district in locations:
+            if journal.get_district_status(batch_id, region, city, district) is not None:
+                journaled_links[(region, city, district)] = journal.get_district_links(batch_id, region, city, district)
+
+    link_queue: queue.Queue = queue.Queue(maxsize=max(1, link_queue_size))
+    stop = threading.Event()
+    producer = threading.Thread(
+        target=produce_links,
+        args=(engine, locations, journaled_links, link_queue, stop, search_slugs),
+        name='discovery',
+        daemon=True
+    )
+
+    seen_date = batch_extraction_start[:10]
+    district_links: Dict[Tuple[str, str, str], List[Tuple[str, Optional[str]]]] = {}
+    district_stats: Dict[Tuple[str, str, str], Dict[str, int]] = {}
+    fetched_entries = []
+    carried_ids: List[str] = []
+
+    def update_index() -> None:
+        for property_id, _, _, content_fingerprint, row in fetched_entries:
+            stats = district_stats[(row.region, row.city, row.district)]
+            stats['fetched'] += 1
+            if index.get_content_fingerprint(property_id) not in (None, content_fingerprint):
+                stats['changed'] += 1
+        index.record_fetched(fetched_entries, seen_date)
+        fetched_entries.clear()
 
-            soup = BeautifulSoup(content, 'lxml')
-            property_parser = PropertyPageParser(soup)
+    def scrape(location: Tuple[str, str, str], position: int, link: str) -> Optional[PropertyRecord]:
+        region, city, district = location
+        return scrape_property(
+            engine=engine,
+            link=link,
+            region=region,
+            city=city,
+            district=district,
+            batch_id=batch_id,
+            batch_extraction_start=batch_extraction_start,
+            progress=f"[{district} #{position}]",
+            parser_engine=parser_engine,
+            scoped_parsing=scoped_parsing
+        )
+
+    def accept(message: tuple) -> Optional[tuple]:
+        """
+        Turns a message of the discovery stage into an entry of the pending deque.
+        """
+        kind, location, link, card_fingerprint = message
+        if kind == _ERROR:
+            return (_ERROR, None, link, None)
+        if kind == _DISTRICT_DONE:
+            links = district_links.pop(location, [])
+            if journal is not None and location not in journaled_links:
+                journal.record_district_links(batch_id, *location, links)
+            return (_DISTRICT_DONE, location, None, None)
+
+        links = district_links.setdefault(location, [])
+        links.append((link, card_fingerprint))
+        stats = district_stats.setdefault(location, {'fetched': 0, 'changed': 0, 'skipped': 0, 'carried': 0})
+
+        property_id = get_property_id(link)
+        if committed_ids and property_id in committed_ids:
+            stats['skipped'] += 1
+            return None
+        if index is not None:
+            row = index.get_unchanged_row(property_id, card_fingerprint)
+            if row is not None:
+                region, city, district = location
+                stats['carried'] += 1
+                # The row keeps the property_extraction_start of the fetch it was extracted by
+                carried = PropertyRecord.from_dict(
+                    row,
+                    batch_id=batch_id,
+                    batch_extraction_start=batch_extraction_start,
+                    region=region,
+                    city=city,
+                    district=district
+                )
+                return (_LINK, location, carried, None)
+        return (_LINK, location, engine.submit(scrape, location, len(links), link), card_fingerprint)
+
+    def finish_district(location: Tuple[str, str, str]) -> None:
+        region, city, district = location
+        if index is not None:
+            update_index()
+            index.record_seen(carried_ids, seen_date)
+            carried_ids.clear()
+        stats = district_stats.pop(location, {'fetched': 0, 'changed': 0, 'skipped': 0, 'carried': 0})
+        if stats['skipped']:
+            logger.info(f"Skipped {stats['skipped']} properties already saved in this batch for {district}.")
+        if index is not None:
+            logger.info(
+                f"Carried forward {stats['carried']} unchanged properties in {district}. "
+                f"Fetched {stats['fetched']}, {stats['changed']} of them changed since their last fetch."
+            )
+        if journal is not None:
+            journal.complete_district(batch_id, region, city, district)
+
+    max_pending = 2 * engine.max_workers
+    pending: Deque[tuple] = collections.deque()
+    discovery_done = False
+
+    producer.start()
+    try:
+        while pending or not discovery_done:
+            head = pending[0] if pending else None
+            head_ready = head is not None and not (isinstance(head[2], Future) and not head[2].done())
 
-            if not property_parser.validate_link():
-                logger.error(f"Invalid link: {link}. Article not active. Skipping...")
+            if not head_ready and not discovery_done and len(pending) < max_pending:
+                try:
+                    message = link_queue.get(timeout=0.05 if pending else None)
+                except queue.Empty:
+                    continue
+                if message[0] == _END:
+                    discovery_done = True
+                    continue
+                entry = accept(message)
+                if entry is not None:
+                    pending.append(entry)
                 continue
 
-            property_type = property_parser.get_property_type()
-            if property_type == "Edificio":
-                logger.error(f"Property type is 'Edificio', skipping link {link}.")
+            kind, location, value, card_fingerprint = pending.popleft()
+            if kind == _ERROR:
+                raise value
+            if kind == _DISTRICT_DONE:
+                finish_district(location)
                 continue
 
-            price_type, price_pen, price_usd = property_parser.get_price()
-            additional_expense = property_parser.get_additional_expense()
-            address = property_parser.get_address()
-            total_size, covered_size, bedrooms, bathrooms, half_bathrooms, parking_spaces, age = property_parser.get_main_features()
-
-            property_details = {
-                "batch_id": batch_id,
-                "batch_extraction_start": batch_extraction_start,
-                "property_id": property_id,
-                "property_extraction_start": property_extraction_start,
-                "property_type": property_type,
-                "price_type": price_type,
-                "price_pen": price_pen,
-                "price_usd": price_usd,
-                "additional_expense": additional_expense,
-                "address": address,
-                "region": region,
-                "city": city,
-                "district": district,
-                "total_size": total_size,
-                "covered_size": covered_size,
-                "bedrooms": bedrooms,
-                "bathrooms": bathrooms,
-                "half_bathrooms": half_bathrooms,
-                "parking_spaces": parking_spaces,
-                "age": age,
-                "link": link
-            }
-
-            property_details_list.append(property_details)
-        
-        if page == max_pages:
-            raise ValueError("Reached maximum page limit without finding valid properties.")
-
-    extraction_end = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    logger.info(f"Total properties processed: {len(property_details_list)}. Saving results...")
+            if isinstance(value, Future):
+                property_details = value.result()
+                if property_details is None:
+                    continue
+                if index is not None:
+                    fetched_entries.append((
+                        property_details.property_id,
+                        property_details.link,
+                        card_fingerprint,
+                        get_content_fingerprint(property_details),
+                        property_details
+                    ))
+                    if len(fetched_entries) >= 500:
+                        update_index()
+                yield property_details
+            else:
+                # Carried forward from the index
+                carried_ids.append(value.property_id)
+                yield value
+    finally:
+        stop.set()
+        for entry in pending:
+            if isinstance(entry[2], Future):
+                entry[2].cancel()
+        producer.join()
+
+
+def crawl(
+    scraper_cfg: Dict[str, Any],
+    batch_id: str,
+    batch_extraction_start: str,
+    journal: Optional[CrawlJournal] = None,
+    shard: Optional[Tuple[int, int]] = None
+) -> Iterator[PropertyRecord]:
+    """
+    Crawls the target districts, or only the districts of one shard.
+
+    Districts are assigned to shards round-robin, so `--shard i/N` crawls every N-th district starting
+    at the i-th one.
+
+    Args:
+        scraper_cfg (Dict[str, Any]): The scraper configuration.
+        batch_id (str): The ID of the current batch.
+        batch_extraction_start (str): The start timestamp of the current batch.
+        journal (Optional[CrawlJournal], optional): The crawl journal of the batch. Defaults to None.
+        shard (Optional[Tuple[int, int]], optional): The 1-based shard index and shard count. Defaults to None.
+
+    Yields:
+        PropertyRecord: The property details found, as soon as they are scraped.
+    """
+    logger = get_logger(__name__)
+
+    with METRICS.timer('location_fetch'):
+        location_index = LocationIndex.load(max_age_hours=scraper_cfg.get('locations_max_age_hours', 168))
+    locations = get_target_locations(location_index)
+    if shard is not None:
+        shard_index, shard_count = shard
+        locations = locations[shard_index - 1::shard_count]
+        logger.info(f"Crawling shard {shard_index}/{shard_count} with {len(locations)} districts.")
+
+    cache = None
+    if scraper_cfg['cache_mode'] != 'off':
+        cache_ttl_hours = scraper_cfg.get('cache_ttl_hours')
+        cache_max_mb = scraper_cfg.get('cache_max_mb')
+        cache = ResponseCache(
+            mode=scraper_cfg['cache_mode'],
+            ttl_seconds=cache_ttl_hours * 3600 if cache_ttl_hours else None,
+            max_bytes=cache_max_mb * 1024 * 1024 if cache_max_mb else None
+        )
+        logger.info(f"Using the response cache in {cache.mode} mode.")
+
+    engine = FetchEngine(
+        headers=HEADERS,
+        max_workers=scraper_cfg['max_workers'],
+        global_rate=scraper_cfg['global_rate_limit'],
+        per_host_rate=scraper_cfg['per_host_rate_limit'],
+        cache=cache,
+        retry_policy=RetryPolicy(
+            max_retries=scraper_cfg['max_retries'],
+            base_delay=scraper_cfg.get('backoff_base_seconds', 1.0),
+            max_delay=scraper_cfg.get('backoff_max_seconds', 30.0),
+            connect_timeout=scraper_cfg.get('connect_timeout', 10.0),
+            read_timeout=scraper_cfg.get('read_timeout', 30.0)
+        ),
+        breaker_config={
+            'window_size': scraper_cfg.get('breaker_window', 20),
+            'error_rate': scraper_cfg.get('breaker_error_rate', 0.5),
+            'cooldown': scraper_cfg.get('breaker_cooldown_seconds', 30.0)
+        } if scraper_cfg.get('circuit_breaker', True) else None
+    )
+    logger.info(f"Fetching property details with {engine.max_workers} concurrent workers.")
+
+    committed_ids = journal.get_committed_ids(batch_id) if journal else set()
+    if committed_ids:
+        logger.info(f"Resuming batch {batch_id} with {len(committed_ids)} properties already saved.")
+
+    index = PropertyIndex(refresh_days=scraper_cfg['refresh_days']) if scraper_cfg['incremental'] else None
+
+    try:
+        with engine:
+            yield from crawl_districts(
+                engine, locations, batch_id, batch_extraction_start,
+                journal=journal, committed_ids=committed_ids, index=index,
+                parser_engine=scraper_cfg['parser_engine'],
+                scoped_parsing=scraper_cfg['scoped_parsing'],
+                link_queue_size=scraper_cfg.get('link_queue_size', 200),
+                search_slugs={location: location_index.get_search_slug(*location) for location in locations}
+            )
+    finally:
+        # Also runs when the crawl fails or its consumer stops early, so the index connection is never leaked
+        if index is not None:
+            index.close()
+
+
+def write_batch(
+    scraper_cfg: Dict[str, Any],
+    property_details: Iterator[PropertyRecord],
+    batch_id: str,
+    journal: CrawlJournal,
+    prefix: str,
+    suffix: Optional[str] = None
+) -> StreamingPartWriter:
+    """
+    Streams property details into rotating part files under the processed directory.
+
+    Every committed part is recorded in the journal together with its property IDs, and part
+    numbering continues after the parts committed by an earlier attempt of the batch. Parts are
+    written as CSV, or as typed Parquet or Arrow files depending on the `output_format` setting.
+
+    Args:
+        scraper_cfg (Dict[str, Any]): The scraper configuration.
+        property_details (Iterator[PropertyRecord]): The property details to write.
+        batch_id (str): The ID of the current batch.
+        journal (CrawlJournal): The crawl journal of the batch.
+        prefix (str): The file name prefix of the part files.
+        suffix (Optional[str], optional): The suffix of the committed part files. Defaults to the suffix
+            of the output format.
+
+    Returns:
+        StreamingPartWriter: The closed writer, with the committed parts and the number of rows written.
+    """
+    def on_commit(part_number: int, path: str, property_ids: List[str]) -> None:
+        journal.record_part(batch_id, prefix, part_number, path, property_ids)
+
+    output_format = scraper_cfg.get('output_format', 'csv')
+    writer_kwargs = dict(
+        output_dir=OUTPUT_DIR,
+        prefix=prefix,
+        fieldnames=FIELDNAMES,
+        chunk_size=scraper_cfg['chunk_size'],
+        rotate_rows=scraper_cfg['rotate_rows'],
+        suffix=suffix or FORMAT_SUFFIXES[output_format],
+        start_part=journal.get_next_part(batch_id, prefix),
+        key_field='property_id',
+        on_commit=on_commit
+    )
+    if output_format == 'csv':
+        writer = StreamingCsvWriter(**writer_kwargs)
+    else:
+        writer = StreamingArrowWriter(file_format=output_format, **writer_kwargs)
+
+    with writer:
+        for row in property_details:
+            with METRICS.timer('write'):
+                writer.write(row)
+    METRICS.increment('write', 'rows', writer.rows_written)
+    METRICS.increment('write', 'parts', len(writer.parts))
+    return writer
+
+
+def get_shard_prefix(batch_id: str, shard_index: int, shard_count: int) -> str:
+    """
+    Returns the file name prefix of the partial files written by one shard.
+    """
+    return f'properties_listing_{batch_id}.shard-{shard_index}-of-{shard_count}'
+
+
+def run_shard(
+    scraper_cfg: Dict[str, Any],
+    batch_id: str,
+    batch_extraction_start: str,
+    shard_index: int,
+    shard_count: int
+) -> List[str]:
+    """
+    Crawls one shard and writes its partial files.
+
+    This is the entry point of every worker process, so each one creates its own scraper sessions.
+    Partial files end in `.partial` after the format suffix, so `db_loader.py` never picks them up, and a
+    `.done` marker is written once the shard has finished.
+
+    Args:
+        scraper_cfg (Dict[str, Any]): The scraper configuration.
+        batch_id (str): The ID of the shared batch.
+        batch_extraction_start (str): The start timestamp of the shared batch.
+        shard_index (int): The 1-based index of the shard.
+        shard_count (int): The total number of shards.
+
+    Returns:
+        List[str]: The paths of the partial files.
+    """
+    logger = get_logger(__name__)
+
+    prefix = get_shard_prefix(batch_id, shard_index, shard_count)
+    journal = CrawlJournal()
+    property_details = crawl(scraper_cfg, batch_id, batch_extraction_start, journal=journal, shard=(shard_index, shard_count))
+    try:
+        journal.start_batch(batch_id, batch_extraction_start)
+        writer = write_batch(
+            scraper_cfg,
+            property_details,
+            batch_id=batch_id,
+            journal=journal,
+            prefix=prefix,
+            suffix=FORMAT_SUFFIXES[scraper_cfg.get('output_format', 'csv')] + '.partial'
+        )
+    finally:
+        # Closing the crawl first stops its pipeline and closes the property index before the journal
+        property_details.close()
+        journal.close()
+
+    # The driver adds the metrics of every shard to the batch summary when it merges the partial files
+    write_summary(batch_id, 'scrape', METRICS.summary(rows=writer.rows_written), path=os.path.join(METRICS_DIR, prefix + '.json'))
+
+    with open(os.path.join(OUTPUT_DIR, prefix + '.done'), 'w', encoding='utf-8') as f:
+        f.write(f"{writer.rows_written}\n")
+
+    logger.info(f"Shard {shard_index}/{shard_count} processed {writer.rows_written} properties in {len(writer.parts)} partial files.")
+    return writer.parts
+
+
+def merge_partials(batch_id: str) -> List[str]:
+    """
+    Promotes the partial files of all shards of a batch to batch files.
+
+    Partial files are renamed in shard order, so merging is a metadata-only operation regardless of
+    the batch size.
+
+    Args:
+        batch_id (str): The ID of the batch.
+
+    Returns:
+        List[str]: The paths of the batch files.
+    """
+    logger = get_logger(__name__)
+
+    pattern = re.compile(rf"properties_listing_{re.escape(batch_id)}\.shard-(\d+)-of-(\d+)\.done")
+    done: Dict[int, str] = {}
+    shard_counts = set()
+    for path in glob.glob(os.path.join(OUTPUT_DIR, f'properties_listing_{batch_id}.shard-*.done')):
+        match = pattern.fullmatch(os.path.basename(path))
+        if match is not None:
+            done[int(match.group(1))] = path
+            shard_counts.add(int(match.group(2)))
+
+    if len(shard_counts) != 1:
+        raise ValueError(f"Expected finished shards from a single shard layout for batch {batch_id}, found {sorted(shard_counts)}.")
+    shard_count = shard_counts.pop()
+    missing = [i for i in range(1, shard_count + 1) if i not in done]
+    if missing:
+        raise ValueError(f"Shards {missing} of batch {batch_id} have not finished.")
+
+    output_paths: List[str] = []
+    for shard_index in range(1, shard_count + 1):
+        prefix = get_shard_prefix(batch_id, shard_index, shard_count)
+        for path in sorted(glob.glob(os.path.join(OUTPUT_DIR, f'{glob.escape(prefix)}_part*.partial'))):
+            # Partial files keep the suffix of their format in front of `.partial`
+            stem = path[:-len('.partial')]
+            file_suffix = next((sfx for sfx in FORMAT_SUFFIXES.values() if stem.endswith(sfx)), '.csv')
+            output_path = os.path.join(OUTPUT_DIR, f'properties_listing_{batch_id}_part{len(output_paths) + 1:04d}{file_suffix}')
+            os.replace(path, output_path)
+            output_paths.append(output_path)
+        os.remove(done[shard_index])
+
+    logger.info(f"Merged the partial files of {shard_count} shards into {len(output_paths)} batch files.")
+    return output_paths
+
+
+def merge_shard_metrics(batch_id: str) -> int:
+    """
+    Adds the metrics written by the shards of a batch to the metrics of the current process.
+
+    Args:
+        batch_id (str): The ID of the batch.
+
+    Returns:
+        int: The total number of rows written by the shards.
+    """
+    rows = 0
+    for path in sorted(glob.glob(os.path.join(METRICS_DIR, f'properties_listing_{glob.escape(batch_id)}.shard-*.json'))):
+        summary = read_summary(path).get('scrape', {})
+        METRICS.merge(summary)
+        rows += summary.get('rows') or 0
+        os.remove(path)
+    return rows
+
+
+def resolve_batch(scraper_cfg: Dict[str, Any], journal: CrawlJournal) -> Tuple[str, str, Optional[str]]:
+    """
+    Resolves the batch ID and extraction start of the run, resuming journaled batches.
+
+    Args:
+        scraper_cfg (Dict[str, Any]): The scraper configuration.
+        journal (CrawlJournal): The crawl journal.
+
+    Returns:
+        Tuple[str, str, Optional[str]]: The batch ID, the batch extraction start, and the journaled
+            status of the batch (None for a new batch).
+    """
+    if scraper_cfg['run_key']:
+        # A retried task gets the same run key, hence the same batch ID
+        batch_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"reap-web-scraper/{scraper_cfg['run_key']}"))
+    else:
+        batch_id = scraper_cfg['batch_id'] or str(uuid.uuid4())
+
+    journaled = journal.get_batch(batch_id)
+    if journaled is None:
+        if scraper_cfg['resume']:
+            raise ValueError(f"Batch {batch_id} not found in the crawl journal. Cannot resume.")
+        batch_extraction_start = scraper_cfg['batch_start'] or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return batch_id, batch_extraction_start, None
+
+    batch_extraction_start, status = journaled
+    if scraper_cfg['batch_start'] and scraper_cfg['batch_start'] != batch_extraction_start:
+        raise ValueError(
+            f"Batch {batch_id} was journaled with extraction start {batch_extraction_start}, "
+            f"not {scraper_cfg['batch_start']}."
+        )
+    return batch_id, batch_extraction_start, status
+
+
+def run_batch(scraper_cfg: Dict[str, Any], journal: CrawlJournal) -> None:
+    """
+    Runs, resumes or merges the batch selected by the command-line arguments.
+
+    Args:
+        scraper_cfg (Dict[str, Any]): The scraper configuration.
+        journal (CrawlJournal): The crawl journal, closed by the caller.
+    """
+    logger = get_logger(__name__)
+
+    batch_id, batch_extraction_start, status = resolve_batch(scraper_cfg, journal)
+
+    if scraper_cfg['merge']:
+        merge_partials(batch_id)
+        journal.finish_batch(batch_id)
+        rows = merge_shard_metrics(batch_id)
+        emit_batch_metrics(batch_id, 'scrape', METRICS.summary(rows=rows), CONFIG.get('metrics_textfile_dir'))
+        return
+
+    if status == 'finished':
+        logger.info(f"Batch {batch_id} already finished. Nothing to do.")
+        return
+    elif status is not None:
+        logger.info(f"Resuming data extraction with batch ID: {batch_id}")
+    else:
+        logger.info(f"Starting data extraction with batch ID: {batch_id}")
+
+    journal.start_batch(batch_id, batch_extraction_start)
+
+    if scraper_cfg['shard'] is not None:
+        shard_index, shard_count = scraper_cfg['shard']
+        run_shard(scraper_cfg, batch_id, batch_extraction_start, shard_index, shard_count)
+        return
 
     # if os.getenv('ENVIRONMENT') == 'local':
     #     output_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'processed')
     # else:
     #     output_dir = os.path.join(os.path.dirname(__file__), 'data', 'processed')
 
-    output_dir = os.path.join(os.path.dirname(__file__), 'data', 'processed')
-    fieldnames = property_details_list[0].keys()
+    processes = scraper_cfg['processes']
+    if processes > 1:
+        # Refresh the location data once, so the worker processes all read the local copy
+        with METRICS.timer('location_fetch'):
+            ensure_locations_csv(max_age_hours=scraper_cfg.get('locations_max_age_hours', 168))
+        logger.info(f"Splitting districts across {processes} worker processes.")
+        # Spawn fresh interpreters so no thread or logging state leaks from the parent
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [
+                executor.submit(run_shard, scraper_cfg, batch_id, batch_extraction_start, shard_index, processes)
+                for shard_index in range(1, processes + 1)
+            ]
+            for future in futures:
+                future.result()
+
+        output_paths = merge_partials(batch_id)
+        journal.finish_batch(batch_id)
+        rows = merge_shard_metrics(batch_id)
+        metrics_path = emit_batch_metrics(batch_id, 'scrape', METRICS.summary(rows=rows), CONFIG.get('metrics_textfile_dir'))
+        logger.info(f"Data extraction completed. Results saved to {len(output_paths)} files in {OUTPUT_DIR}")
+        logger.info(f"Batch metrics saved to {metrics_path}.")
+        return
+
+    # Rows are flushed to disk while the crawl runs, so memory stays constant whatever the market size
+    property_details = crawl(scraper_cfg, batch_id, batch_extraction_start, journal=journal)
+    try:
+        writer = write_batch(
+            scraper_cfg,
+            property_details,
+            batch_id=batch_id,
+            journal=journal,
+            prefix=f'properties_listing_{batch_id}'
+        )
+    finally:
+        property_details.close()
+    journal.finish_batch(batch_id)
+
+    metrics_path = emit_batch_metrics(batch_id, 'scrape', METRICS.summary(rows=writer.rows_written), CONFIG.get('metrics_textfile_dir'))
+
+    logger.info(f"Total properties processed: {writer.rows_written}.")
+    logger.info(f"Data extraction completed. Results saved to {len(writer.parts)} files in {OUTPUT_DIR}")
+    logger.info(f"Batch metrics saved to {metrics_path}.")
+
+
+def main() -> None:
+    """
+    Main function to run the web scraper.
+
+    This function initializes the scraping process, fetches location data, and iterates through
+    search result pages to extract property details. With `--processes N` the districts are split
+    across N worker processes whose partial files are merged into a single batch file at the end.
+    """
+    # if os.getenv('ENVIRONMENT') == 'local':
+    #     logger.info("Running in local environment.")
+    # elif os.getenv('ENVIRONMENT') == 'production':
+    #     logger.info("Running in production environment.")
+    # else:
+    #     logger.error("Environment variable 'ENVIRONMENT' is not set. Exiting...")
+    #     return
 
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, f'properties_listing_{batch_id}.csv')
-    with open(output_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(property_details_list)
+    scraper_cfg = parse_args(CONFIG.get('scraper', {}))
 
-    logger.info(f"Data extraction completed. Results saved to {output_path}")
+    journal = CrawlJournal()
+    try:
+        run_batch(scraper_cfg, journal)
+    finally:
+        journal.close()
 
 
 if __name__ == "__main__":